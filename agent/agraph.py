@@ -1,18 +1,18 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import yaml
+import asyncio
+from typing import AsyncIterator
 
-from agent.memory import EntityMemory, Memory
-from agent.path import DESC_DIR
+from agent.memory import EntityMemory, Memory, using_memory
 
-from langchain_core.messages import (
-    HumanMessage,
-    AIMessage
-)
+from langchain_core.messages import AIMessage
 
-from agent.tool_registry import common_tool_registry as TOOL_REGISTRY, special_tool_registry as SPECIAL_TOOL_REGISTRY
-from agent.chains import PlanChain, ToolChain, ValidationChain, ResponseChain
+from agent.tool_registry import common_tool_registry as TOOL_REGISTRY, special_tool_registry as SPECIAL_TOOL_REGISTRY, tool_descriptor_index as TOOL_DESCRIPTORS, ToolInputError, ainvoke_tool
+from agent.runtime import AgentRuntime
+from agent.report import ChatReport, record_stage, reporting
+from agent.scratchpad import Scratchpad
+from agent.events import ChatEvent, ChatFinished, PlanCreated, ResponseToken, StepFinished, StepStarted, ValidationResult, aiterate_events, emit
 from agent.utils import load_locale_const
 const = load_locale_const()
 TOOL_VALIDATOR_MSG  = const.TOOL_VALIDATOR_MSG
@@ -20,26 +20,35 @@ SPECIAL_TOOL_MSG    = const.SPECIAL_TOOL_MSG
 CHAT_MSG            = const.CHAT_MSG
 
 class Agent:
-    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4):
+    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, token_counter=None, summary_chain=None):
         self.session_id = session_id
         self.recursion_limit = recursion_limit
-        self.memory = Memory(max_memory_tokens)
+        self.memory = Memory(max_memory_tokens, token_counter, session_id=session_id, summary_chain=summary_chain)
         self.chains = [] # Name of chains used in this agent, for debugging purposes
         
-    def chat(self, user_input: str, debug=False):
+    def chat(self, user_input: str, debug=False, is_report=False):
         raise NotImplementedError("This method should be implemented in subclasses.")
      
 class PlanAgent(Agent):
-    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, is_stream: bool=True):
-        super().__init__(session_id, recursion_limit, max_memory_tokens)
-        self.entity_memory = EntityMemory()
+    """
+    Args:
+        runtime (AgentRuntime | None): Chains, plan cache and token counter shared with other agents. Without one,
+            the agent builds its own from ``is_stream`` and ``use_plan_cache``, which a given
+            runtime overrides.
+    """
+    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, is_stream: bool=True, token_counter=None, use_plan_cache: bool=False,
+                 runtime: AgentRuntime | None=None):
+        self.runtime = runtime or AgentRuntime(is_stream=is_stream, use_plan_cache=use_plan_cache)
+        super().__init__(session_id, recursion_limit, max_memory_tokens, token_counter or self.runtime.token_counter, self.runtime.summary_chain)
+        self.entity_memory = EntityMemory(entity_memory_chain=self.runtime.entity_memory_chain)
+        self.plan_cache = self.runtime.plan_cache
 
         self.tools = TOOL_REGISTRY.values()
         self.special_tools = SPECIAL_TOOL_REGISTRY
-        self.plan_chain = PlanChain()
-        self.tool_chain = ToolChain()
-        self.validation_chain = ValidationChain()
-        self.response_chain = ResponseChain(is_stream=is_stream)
+        self.plan_chain = self.runtime.plan_chain
+        self.tool_chain = self.runtime.tool_chain
+        self.validation_chain = self.runtime.validation_chain
+        self.response_chain = self.runtime.response_chain
 
         self.chains = [
             self.plan_chain.name,
@@ -49,8 +58,13 @@ class PlanAgent(Agent):
         ]
 
         self.save_request = False
+        self.special_tool_handlers = {
+            "thought": lambda tool_message: tool_message,
+            "save_chat_memory": self._save_chat_memory,
+            "clear_chat_memory": self._clear_chat_memory,
+        }
 
-    def _add_buffer(self, buf: list, string: str, debug: bool=False):
+    def _add_buffer(self, buf: Scratchpad, string: str, debug: bool=False):
         buf.append(string)
         if debug:
             print(string)
@@ -60,9 +74,10 @@ class PlanAgent(Agent):
         Validate the provided tool_json dictionary.
 
         This function checks that the dictionary contains the required keys "tool" and "message"
-        and does not contain any unexpected keys (allowed keys are "tool", "message", and optionally "tool_input").
-        Additionally, if the "tool_input" key is present, the function loads the corresponding
-        YAML description from the descriptions directory (using the tool name) and compares its "args" key
+        and does not contain any unexpected keys (allowed keys are "tool", "message", and optionally "tool_input"
+        and "depends_on"). If "depends_on" is present, it must be a list of step numbers.
+        Additionally, if the "tool_input" key is present, the function looks up the tool's description
+        in the in-memory descriptor index (built when tools are registered) and compares its "args" key
         with the value of "tool_input". If they match exactly, it returns ("jump", "").
 
         Args:
@@ -74,7 +89,7 @@ class PlanAgent(Agent):
                 - "jump" and an empty message if "tool_input" is present and exactly matches the description's args,
                 - "false" and an error message if any validation errors occur.
         """
-        allowed_keys = {"tool", "message", "tool_input"}
+        allowed_keys = {"tool", "message", "tool_input", "depends_on"}
         required_keys = {"tool", "message"}
         
         json_keys = set(tool_json.keys())
@@ -88,21 +103,21 @@ class PlanAgent(Agent):
         missing_keys = required_keys - json_keys
         if missing_keys:
             return ("false", TOOL_VALIDATOR_MSG['missing_keys'].format(missing_keys=missing_keys))
+
+        # Check that 'depends_on' lists step numbers.
+        depends_on = tool_json.get("depends_on", [])
+        if not isinstance(depends_on, list) or not all(isinstance(d, int) for d in depends_on):
+            return ("false", TOOL_VALIDATOR_MSG['invalid_depends_on'].format(depends_on=depends_on))
         
-        # If 'tool_input' exists, try to perform YAML args comparison.
+        # If 'tool_input' exists, compare it with the args of the tool's description.
         if "tool_input" in tool_json:
             tool_name = tool_json["tool"]
-            yaml_path = DESC_DIR / f"{tool_name}.yaml"
-            if not yaml_path.exists():
+            desc = TOOL_DESCRIPTORS.get(tool_name)
+            if desc is None:
                 return ("false", TOOL_VALIDATOR_MSG['yaml_path_not_exist'].format(tool_name=tool_name))
-            try:
-                with open(yaml_path, "r", encoding="utf-8") as f:
-                    desc_yaml = yaml.safe_load(f)
-            except Exception as e:
-                return ("false", TOOL_VALIDATOR_MSG['yaml_load_error'].format(tool_name=tool_name, e=e))
             
-            # Get the 'args' section from the YAML.
-            expected_args = desc_yaml.get("args")
+            # Get the 'args' section from the description.
+            expected_args = desc.get("args")
             provided_args = tool_json["tool_input"]
             if provided_args == expected_args:
                 return ("jump", "")
@@ -110,68 +125,162 @@ class PlanAgent(Agent):
         # Validation passed.
         return ("true", "")
     
-    def _tool_use(self, tool: str, tool_input: dict):
-        for tool_candidate in self.tools:
-            if tool_candidate.name == tool:
-                tool_output = tool_candidate.invoke(tool_input)
-                return tool_output
-        return None
+    async def _tool_use(self, tool: str, tool_input: dict):
+        """
+        Validate ``tool_input`` against the tool's ``args_schema`` and run the tool.
+        Returns ``None`` if ``tool`` is not registered.
+
+        Raises:
+            ToolInputError: If ``tool_input`` does not match the tool's arguments.
+        """
+        entry = await TOOL_REGISTRY.adispatch(tool)
+        if entry is None:
+            return None
+        tool_input = entry.validate(tool_input)
+        with record_stage("ToolCall", tool=tool):
+            return await ainvoke_tool(entry.tool, tool_input, entry.cache)
 
     def _special_tool_use(self, tool_name: str, tool_message: str):
-        if tool_name == "thought":
-            tool_output = tool_message
-            return tool_output
-        elif tool_name == "save_chat_memory":
-            self.save_request = True
-            return SPECIAL_TOOL_MSG['save_chat_memory']
-        elif tool_name == "clear_chat_memory":
-            self.memory.clear_memory()
-            return SPECIAL_TOOL_MSG['clear_chat_memory']
-        return None
+        handler = self.special_tool_handlers.get(tool_name)
+        return handler(tool_message) if handler else None
+
+    def _save_chat_memory(self, tool_message: str):
+        self.save_request = True
+        return SPECIAL_TOOL_MSG['save_chat_memory']
+
+    def _clear_chat_memory(self, tool_message: str):
+        self.memory.clear_memory()
+        return SPECIAL_TOOL_MSG['clear_chat_memory']
     
+    # Cached plan of a previous turn with the same query, if any
+    def _cached_plan(self, user_input: str):
+        if self.plan_cache is None:
+            return None
+        return self.plan_cache.get(user_input, known_tools=TOOL_REGISTRY.names() | SPECIAL_TOOL_REGISTRY.keys(), entities=self.entity_memory.entity_memory)
+
     # Planning step: generate a plan from the current buffer
     async def _planning_step(self, buffer, is_debug):
-        _input = [HumanMessage(content="\n".join(buffer))]
+        _input = buffer.messages()
         plan = (await self.plan_chain.ainvoke({"memory": self.memory.memory, "input": _input})).plan
         self._add_buffer(buffer, CHAT_MSG['plan_message'].format(plan=plan), is_debug)
         return plan
 
-    # Tool step: validate and execute each tool in the plan
+    def _step_dependencies(self, step: int, tool_json: dict, dependencies: list[set[int]]) -> set[int]:
+        """
+        Resolve the steps a plan step depends on, as 0-based indices.
+
+        A step's "depends_on" lists earlier 1-based step numbers; without it the step depends on
+        the step right before it, which keeps plans without "depends_on" strictly sequential.
+        Dependencies are closed transitively, so a step sees every output it may indirectly rely on.
+
+        Args:
+            step (int): 0-based index of the step.
+            tool_json (dict): The validated step.
+            dependencies (list[set[int]]): Already resolved dependencies of the earlier steps.
+
+        Returns:
+            set[int]: Transitive dependencies of the step.
+
+        Raises:
+            ValueError: If the step refers to itself, a later step or a step that does not exist.
+        """
+        direct = {d - 1 for d in tool_json.get("depends_on", [step] if step else [])}
+        if any(not 0 <= d < step for d in direct):
+            raise ValueError(TOOL_VALIDATOR_MSG['invalid_depends_on'].format(depends_on=tool_json["depends_on"]))
+        closure = set(direct)
+        for d in direct:
+            closure |= dependencies[d]
+        return closure
+
+    # Special tools (e.g. clear_chat_memory) act on the agent's memory, so they never overlap another step
+    def _is_barrier(self, tool_json: dict) -> bool:
+        return tool_json['tool'] in self.special_tool_handlers
+
+    # Single plan step, once the steps it depends on are done
+    async def _run_step(self, buffer, step, tool_json, validation, dependencies, outputs, waits):
+        await asyncio.gather(*waits)
+        emit(StepStarted(step+1, tool_json['tool']))
+        with record_stage("ToolStep", step=step+1, tool=tool_json['tool']):
+            await self._execute_step(buffer, step, tool_json, validation, dependencies, outputs)
+        emit(StepFinished(step+1, tool_json['tool'], "\n".join(outputs[step])))
+
+    # Fill tool_input with ToolChain if needed, then run the tool; the buffer lines go to outputs[step]
+    async def _execute_step(self, buffer, step, tool_json, validation, dependencies, outputs):
+        lines = outputs[step]
+        tool_name, tool_message = tool_json['tool'], tool_json['message']
+        tool_output = None
+        # Special tool: no input required
+        tool_output = self._special_tool_use(tool_name, tool_message)
+        if tool_output:
+            lines.append(CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output))
+            return
+        # Common tool: input required. ToolChain sees the buffer plus the outputs of the steps this one depends on.
+        elif validation=='true':
+            context = [line for d in sorted(dependencies) for line in outputs[d]]
+            context.append(CHAT_MSG['current_tool_message'].format(tool_json=tool_json, entity_memory=self.entity_memory.entity_memory))
+            _input = buffer.messages(*context)
+            tool_json = await self.tool_chain.ainvoke(tool=tool_name, vars={"input": _input})
+        lines.append(CHAT_MSG['tool_complete_message'].format(step=step+1, tool_json=tool_json))
+        tool, tool_input = tool_json.tool, tool_json.tool_input
+        try:
+            tool_output = await self._tool_use(tool, tool_input)
+        except ToolInputError as e:
+            lines.append(CHAT_MSG['tool_input_error_message'].format(step=step+1, tool=tool, tool_input=tool_input, errors=e.errors))
+            return
+        if tool_output:
+            lines.append(CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output))
+            return
+        if tool_output is None:
+            raise ValueError(f"Tool '{tool}' not found in available tools.")
+
+    # Tool step: validate every step, then run independent steps concurrently and write their outputs in step order.
+    # A special tool step waits for every earlier step, and every later step waits for it.
     async def _tool_step(self, buffer, plan, is_debug):
         if not plan:
             raise ValueError("Plan is empty. Cannot proceed to validation.")
+        # As in the sequential agent, the plan is cut at the first step that fails validation.
+        steps, dependencies, error = [], [], None
         for step, tool_json in enumerate(plan):
             validation, message = self._tool_validator(tool_json)
+            if validation!='false':
+                try:
+                    dependencies.append(self._step_dependencies(step, tool_json, dependencies))
+                except ValueError as e:
+                    validation, message = 'false', str(e)
             if validation=='false':
-                self._add_buffer(buffer, CHAT_MSG['tool_validation_false_message'].format(step=step+1, message=message), is_debug)
+                error = CHAT_MSG['tool_validation_false_message'].format(step=step+1, message=message)
                 break
-            tool_name, tool_message = tool_json['tool'], tool_json['message']
-            tool_output = None
-            # Special tool: no input required
-            tool_output = self._special_tool_use(tool_name, tool_message)
-            if tool_output:
-                self._add_buffer(buffer, CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output), is_debug)
-                continue
-            # Common tool: input required
-            elif validation=='true':
-                self._add_buffer(buffer, CHAT_MSG['current_tool_message'].format(tool_json=tool_json, entity_memory=self.entity_memory.entity_memory))
-                _input = [HumanMessage(content="\n".join(buffer))]
-                tool_json = await self.tool_chain.ainvoke(tool=tool_name, vars={"input": _input})
-                buffer.pop()
-            self._add_buffer(buffer, CHAT_MSG['tool_complete_message'].format(step=step+1, tool_json=tool_json), is_debug)
-            tool, tool_input = tool_json.tool, tool_json.tool_input
-            tool_output = self._tool_use(tool, tool_input)
-            if tool_output:
-                self._add_buffer(buffer, CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output), is_debug)
-                continue
-            if tool_output is None:
-                raise ValueError(f"Tool '{tool}' not found in available tools.")
+            steps.append((tool_json, validation))
+
+        outputs = [[] for _ in steps]
+        tasks, barrier = [], None
+        for step, (tool_json, validation) in enumerate(steps):
+            if self._is_barrier(tool_json):
+                waits, barrier = list(tasks), step
+            else:
+                waits = [tasks[d] for d in sorted(dependencies[step] | ({barrier} if barrier is not None else set()))]
+            tasks.append(asyncio.create_task(
+                self._run_step(buffer, step, tool_json, validation, dependencies[step], outputs, waits)
+            ))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        for lines in outputs:
+            for line in lines:
+                self._add_buffer(buffer, line, is_debug)
+        if error:
+            self._add_buffer(buffer, error, is_debug)
 
     # Validation step: check if the output is valid
     async def _validation_step(self, buffer, is_debug):
-        _input = [HumanMessage(content="\n".join(buffer))]
+        _input = buffer.messages()
         validation = await self.validation_chain.ainvoke({"input": _input})
         validation_message = validation.message
+        emit(ValidationResult(validation.is_valid, validation_message))
         if validation.is_valid:
             self._add_buffer(buffer, CHAT_MSG['validation_true_message'].format(validation_message=validation_message), is_debug)
             return True
@@ -179,41 +288,63 @@ class PlanAgent(Agent):
             self._add_buffer(buffer, CHAT_MSG['validation_false_message'].format(validation_message=validation_message), is_debug)
             return False
 
-    # Response step: generate and print the final response, update memory, and handle save request
+    # Response step: generate the final response (streamed as events), update memory, and handle save request
     async def _response_step(self, buffer, is_debug, accepted):
         if not accepted:
             self._add_buffer(buffer, CHAT_MSG['max_attempt_exceeded_message'], is_debug)
-        input = [HumanMessage(content="\n".join(buffer))]
-        response = await self.response_chain.ainvoke({"memory": self.memory.memory, "input": input})
-        if type(response) == str:
-            print(f"Response:\n{response}")
+        vars = {"memory": self.memory.memory, "input": buffer.messages()}
+        if self.response_chain.is_stream:
+            tokens = []
+            async for token in self.response_chain.astream(vars):
+                emit(ResponseToken(token))
+                tokens.append(token)
+            response = "".join(tokens)
         else:
-            response_buffer = []
-            print("Response:")
-            for token in response:
-                print(token, end="", flush=True)
-                response_buffer.append(token)
-            response = "".join(response_buffer)
-        self.memory.extend([HumanMessage(content="\n".join(buffer)), AIMessage(content=response)])
+            response = await self.response_chain.ainvoke(vars)
+            emit(ResponseToken(response))
+        self.memory.extend([buffer.message(), AIMessage(content=response)])
         if self.save_request:
             self.memory.save_memory()
             self.save_request = False
         return response
     
     # Main chat loop: orchestrate planning, tool, validation, and response steps
-    async def chat(self, user_input: str, is_debug=False):
-        import asyncio
-        _buffer = []
-        recursion = 0
-        accepted = False
-        self._add_buffer(_buffer, CHAT_MSG['input_message'].format(user_input=user_input), is_debug)
-        while recursion < self.recursion_limit and not accepted:
-            self._add_buffer(_buffer, CHAT_MSG['attempt_message'].format(n_recursion=recursion+1), is_debug)
-            plan = await self._planning_step(_buffer, is_debug)
-            await self._tool_step(_buffer, plan, is_debug)
-            accepted = await self._validation_step(_buffer, is_debug)
-            if not accepted:
-                recursion += 1
-        response = await self._response_step(_buffer, is_debug, accepted)
-        await asyncio.to_thread(self.entity_memory.query, self.memory) # Entity Memory Update
-        return response
\ No newline at end of file
+    async def chat(self, user_input: str, is_debug=False, is_report=False):
+        report = ChatReport() if is_report else None
+        with reporting(report), using_memory(self.memory):
+            _buffer = Scratchpad()
+            recursion = 0
+            accepted = False
+            self._add_buffer(_buffer, CHAT_MSG['input_message'].format(user_input=user_input), is_debug)
+            while recursion < self.recursion_limit and not accepted:
+                self._add_buffer(_buffer, CHAT_MSG['attempt_message'].format(n_recursion=recursion+1), is_debug)
+                cached_plan = self._cached_plan(user_input) if recursion == 0 else None
+                with record_stage("Plan", attempt=recursion+1, cached=cached_plan is not None):
+                    if cached_plan is not None:
+                        plan = cached_plan
+                        self._add_buffer(_buffer, CHAT_MSG['plan_message'].format(plan=plan), is_debug)
+                    else:
+                        plan = await self._planning_step(_buffer, is_debug)
+                emit(PlanCreated(recursion+1, plan, cached_plan is not None))
+                with record_stage("Tool", attempt=recursion+1):
+                    await self._tool_step(_buffer, plan, is_debug)
+                with record_stage("Validation", attempt=recursion+1):
+                    accepted = await self._validation_step(_buffer, is_debug)
+                if not accepted:
+                    recursion += 1
+                elif recursion == 0 and cached_plan is None and self.plan_cache is not None:
+                    self.plan_cache.put(user_input, plan, entities=self.entity_memory.entity_memory)
+            with record_stage("Response"):
+                response = await self._response_step(_buffer, is_debug, accepted)
+            self.entity_memory.schedule(self.memory) # Entity Memory Update, in the background
+        emit(ChatFinished(response, report))
+        return (response, report) if is_report else response
+
+    def chat_stream(self, user_input: str, is_debug=False, is_report=False) -> AsyncIterator[ChatEvent]:
+        """
+        Run :meth:`chat` in a task and yield its events as they happen: :class:`PlanCreated`,
+        :class:`StepStarted`/:class:`StepFinished` (steps may interleave), :class:`ValidationResult`,
+        one :class:`ResponseToken` per response token and a final :class:`ChatFinished`.
+        Breaking out of the ``async for`` loop cancels the turn.
+        """
+        return aiterate_events(lambda: self.chat(user_input, is_debug, is_report))
\ No newline at end of file
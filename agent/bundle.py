@@ -0,0 +1,223 @@
+"""
+Compiled locale bundle: the prompt templates and tool descriptions of a locale, parsed once.
+
+Without it, every chain parses its prompt YAML when it is built (and the ToolChain once per
+tool), and the tool descriptions are parsed by each module that reads them. A
+:class:`LocaleBundle` holds all of them already parsed. It is built from the ``prompts/`` and
+``descriptions/`` directories of the locale and saved as JSON under ``MEMORY_DIR/bundle``,
+keyed by a hash of the source files. A process therefore only reads and hashes the files, and
+parses them again only after one of them changed.
+
+:func:`get_locale_bundle` loads the bundle on first use and, at most every
+``BUNDLE_CHECK_INTERVAL`` seconds (default: 2; ``0`` on every call, negative never), compares the
+size and modification time of the source files with those seen at load. When they differ, it
+hashes the files again and reloads the bundle if the key changed, so ``bundle.key`` follows
+in-process edits. :func:`reload_locale_bundle` reloads it at once.
+
+Prompt templates are parsed with their ``${PLACEHOLDER}`` variables in place, and
+:meth:`LocaleBundle.render_prompt` substitutes them in the parsed strings. That gives the same
+text as substituting in the YAML source and parsing it (see :func:`agent.utils.load_prompt`)
+when every placeholder sits alone on a line of a block scalar. This is checked for each
+template when the bundle is built, and a template that fails the check is kept as source and
+parsed on each render.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import textwrap
+import threading
+import time
+from pathlib import Path
+from string import Template
+from typing import Any, Optional
+
+import yaml
+
+from agent.path import DESC_DIR, LOCALE, MEMORY_DIR, PROMPT_DIR
+
+BUNDLE_DIR = MEMORY_DIR / "bundle"
+BUNDLE_VERSION = 1 # Bump when the bundle layout changes
+BUNDLE_CHECK_INTERVAL = float(os.getenv("BUNDLE_CHECK_INTERVAL", "2"))
+
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader) # libyaml if available
+
+def parse_yaml(text: str) -> Any:
+    return yaml.load(text, Loader=_Loader)
+
+def _source_vars(vars_: dict) -> dict:
+    # As in load_prompt: multiline values are indented so the YAML keeps its block structure
+    return {k: v if "\n" not in str(v) else textwrap.indent(str(v), "  ") for k, v in vars_.items()}
+
+def _parsed_value(value: str) -> str:
+    # A multiline value once the block scalar's indentation is stripped: only its first line keeps the added indent
+    if "\n" not in value or not value.splitlines()[0].strip():
+        return value
+    return "  " + value
+
+def _parsed_vars(vars_: dict) -> dict:
+    return {k: _parsed_value(str(v)) for k, v in vars_.items()}
+
+def _render(cfg: dict, vars_: dict) -> dict:
+    values = _parsed_vars(vars_)
+    sub = lambda s: Template(s).safe_substitute(values)
+    return {
+        "system": sub(cfg.get("system", "")),
+        "few_shot": [{**m, "content": sub(m["content"])} for m in cfg.get("few_shot", [])]
+    }
+
+def _render_source(raw: str, vars_: dict) -> dict:
+    cfg = parse_yaml(Template(raw).safe_substitute(**_source_vars(vars_)))
+    return {"system": cfg.get("system", ""), "few_shot": cfg.get("few_shot", [])}
+
+def _placeholders(raw: str) -> set[str]:
+    return {m.group("named") or m.group("braced") for m in Template.pattern.finditer(raw) if m.group("named") or m.group("braced")}
+
+def _is_compilable(raw: str, cfg: dict) -> bool:
+    """Whether substituting in the parsed template matches substituting in the source, for one- and multi-line values."""
+    names = _placeholders(raw)
+    if not names:
+        return True
+    for probe in ("value", "first line\nsecond line\n\nlast line"):
+        vars_ = {name: probe for name in names}
+        try:
+            if _render(cfg, vars_) != _render_source(raw, vars_):
+                return False
+        except yaml.YAMLError:
+            return False
+    return True
+
+def _source_files(prompt_dir: Path, desc_dir: Path) -> list[Path]:
+    return sorted(prompt_dir.glob("*.yaml")) + sorted(desc_dir.glob("*.yaml"))
+
+def source_stats(prompt_dir: Path = PROMPT_DIR, desc_dir: Path = DESC_DIR) -> tuple:
+    """Names, sizes and modification times of the prompt and description files: cheap to compare, unlike :func:`source_key`."""
+    stats = []
+    for path in _source_files(prompt_dir, desc_dir):
+        try:
+            st = path.stat()
+        except OSError:
+            continue # Removed since the listing; the next check sees it gone
+        stats.append((str(path), st.st_size, st.st_mtime_ns))
+    return tuple(stats)
+
+def source_key(prompt_dir: Path = PROMPT_DIR, desc_dir: Path = DESC_DIR) -> str:
+    """Hash of the names and contents of the prompt and description files."""
+    h = hashlib.sha1(str(BUNDLE_VERSION).encode())
+    for path in _source_files(prompt_dir, desc_dir):
+        h.update(f"{path.parent.name}/{path.name}\0".encode("utf-8"))
+        h.update(path.read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
+
+class LocaleBundle:
+    """
+    Parsed prompt templates (by file name) and tool descriptions of one locale. Read-only once built.
+
+    Args:
+        key (str): :func:`source_key` of the files it was built from.
+        prompts (dict): File name -> ``{"cfg": parsed template}``, or ``{"raw": source}`` for
+            templates that must be rendered from source.
+        tool_descs (list[dict]): The tool descriptions, as returned by :func:`agent.utils.load_tool_descs`.
+        sources (tuple | None): ``(prompt_dir, desc_dir, source_stats)`` it was loaded from, set by
+            :func:`load_locale_bundle`; :func:`get_locale_bundle` checks the files against them.
+    """
+    def __init__(self, key: str, prompts: dict[str, dict], tool_descs: list[dict], sources: Optional[tuple] = None):
+        self.key = key
+        self.prompts = prompts
+        self.tool_descs = tool_descs
+        self.sources = sources
+
+    def is_stale(self) -> bool:
+        """Whether the source files changed since the bundle was loaded. Hashes them only if their stats changed."""
+        if self.sources is None:
+            return False
+        prompt_dir, desc_dir, stats = self.sources
+        current = source_stats(prompt_dir, desc_dir)
+        if current == stats:
+            return False
+        if source_key(prompt_dir, desc_dir) != self.key:
+            return True
+        self.sources = (prompt_dir, desc_dir, current) # Touched, not changed
+        return False
+
+    @classmethod
+    def build(cls, prompt_dir: Path = PROMPT_DIR, desc_dir: Path = DESC_DIR) -> "LocaleBundle":
+        """Parse the prompt and description files."""
+        prompts = {}
+        for path in sorted(prompt_dir.glob("*.yaml")):
+            raw = path.read_text(encoding="utf-8")
+            cfg = parse_yaml(raw) or {}
+            prompts[path.name] = {"cfg": cfg} if _is_compilable(raw, cfg) else {"raw": raw}
+        tool_descs = [parse_yaml(path.read_text(encoding="utf-8")) for path in sorted(desc_dir.glob("*.yaml"))]
+        return cls(source_key(prompt_dir, desc_dir), prompts, tool_descs)
+
+    def has_prompt(self, name: str) -> bool:
+        return name in self.prompts
+
+    def render_prompt(self, name: str, **vars_: Any) -> dict:
+        """``{"system": str, "few_shot": [{"role", "content"}, ...]}`` of prompt file ``name`` with ``vars_`` substituted."""
+        prompt = self.prompts[name]
+        if "cfg" in prompt:
+            return _render(prompt["cfg"], vars_)
+        return _render_source(prompt["raw"], vars_)
+
+    def to_dict(self) -> dict:
+        return {"key": self.key, "prompts": self.prompts, "tool_descs": self.tool_descs}
+
+def load_locale_bundle(prompt_dir: Path = PROMPT_DIR, desc_dir: Path = DESC_DIR, cache_path: Optional[Path] = None) -> LocaleBundle:
+    """
+    The bundle of ``prompt_dir`` and ``desc_dir``: read from ``cache_path`` if its key matches
+    the current files, else built and written there.
+    """
+    cache_path = cache_path or BUNDLE_DIR / f"{LOCALE}.json"
+    sources = (prompt_dir, desc_dir, source_stats(prompt_dir, desc_dir)) # Before reading, so a concurrent edit reads as stale
+    key = source_key(prompt_dir, desc_dir)
+    try:
+        data = json.loads(cache_path.read_text(encoding="utf-8"))
+        if data.get("key") == key:
+            return LocaleBundle(key, data["prompts"], data["tool_descs"], sources)
+    except (OSError, ValueError, KeyError):
+        pass
+    bundle = LocaleBundle.build(prompt_dir, desc_dir)
+    bundle.sources = sources
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(bundle.to_dict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, cache_path) # Atomic, so concurrent processes never read a partial file
+    except OSError as e:
+        print("[bundle] could not write the locale bundle:", e)
+    return bundle
+
+_bundle: Optional[LocaleBundle] = None
+_bundle_checked = 0.0 # time.monotonic() of the last check of the source files
+_bundle_lock = threading.Lock()
+
+def get_locale_bundle() -> LocaleBundle:
+    """
+    The bundle of the current locale, shared by the whole process. Loaded on first use, and
+    loaded again when its source files changed (checked every ``BUNDLE_CHECK_INTERVAL`` seconds).
+    """
+    global _bundle, _bundle_checked
+    with _bundle_lock:
+        now = time.monotonic()
+        if _bundle is None:
+            _bundle, _bundle_checked = load_locale_bundle(), now
+        elif BUNDLE_CHECK_INTERVAL >= 0 and now - _bundle_checked >= BUNDLE_CHECK_INTERVAL:
+            _bundle_checked = now
+            try:
+                if _bundle.is_stale():
+                    _bundle = load_locale_bundle()
+            except (OSError, yaml.YAMLError) as e:
+                print("[bundle] reload failed, keeping the loaded bundle:", e)
+        return _bundle
+
+def reload_locale_bundle() -> LocaleBundle:
+    """Load the bundle of the current locale again, e.g. after a prompt file was edited, and share it from now on."""
+    global _bundle, _bundle_checked
+    bundle = load_locale_bundle()
+    with _bundle_lock:
+        _bundle, _bundle_checked = bundle, time.monotonic()
+    return bundle
@@ -5,7 +5,8 @@ from langchain_core.output_parsers import StrOutputParser, PydanticOutputParser
 from agent.model.chain_config import ChainConfig
 from agent.model.model import Entities, Plan, ToolDecision, Validation
 from agent.llm import get_llm
-from agent.utils import build_prompt, load_tool_descs, tool_desc_format
+from agent.bundle import get_locale_bundle, reload_locale_bundle
+from agent.utils import build_prompt, tool_desc_format
 from agent.path import PROMPT_DIR
 
 CHAINS = {
@@ -21,16 +22,14 @@ CHAINS = {
 }
 
 # Tool Description
-_tool_desc = load_tool_descs()
+_tool_desc = get_locale_bundle().tool_descs
 
 COMMON_TOOL_DESC_LIST   = [d for d in _tool_desc if d["kind"] == "common"]
 SPECIAL_TOOL_DESC_LIST  = [d for d in _tool_desc if d["kind"] == "special"]
 COMMON_TOOL_DESC        = "\n\n\n".join(tool_desc_format(d) for d in COMMON_TOOL_DESC_LIST)
 SPECIAL_TOOL_DESC       = "\n\n\n".join(tool_desc_format(d) for d in SPECIAL_TOOL_DESC_LIST)
-CURRENT_TOOL_DESC = lambda x: "".join(
-    tool_desc_format(t)
-    for t in COMMON_TOOL_DESC_LIST if t['name'] == x
-)
+COMMON_TOOL_DESC_MAP    = {d['name']: tool_desc_format(d) for d in COMMON_TOOL_DESC_LIST}
+CURRENT_TOOL_DESC = lambda x: COMMON_TOOL_DESC_MAP.get(x, "")
 
 class BaseChain():
     def __init__(self, name: str):
@@ -108,33 +107,62 @@ class ToolChain(BaseChain):
         ).with_structured_output(ToolDecision, method='function_calling')
         self.prompt = None
         self.chain = None
+        # tool -> (key, compiled runnable). Entries whose key is not the current one are recompiled.
+        self._chains = {}
 
-    def invoke(self, tool: str, vars):
-        self.prompt = build_prompt(
+    @staticmethod
+    def _key(tool: str) -> tuple:
+        # The tool's description can change at runtime (registration, ToolDescriptorIndex.watch), and the prompt when
+        # get_locale_bundle() finds its files edited
+        from agent.tool_registry import tool_descriptor_index
+
+        return (tool_descriptor_index.version_of(tool), get_locale_bundle().key)
+
+    @staticmethod
+    def _tool_desc(tool: str) -> str:
+        from agent.tool_registry import tool_descriptor_index
+
+        desc = tool_descriptor_index.get(tool)
+        return tool_desc_format(desc) if desc else ""
+
+    def _cached_chain(self, tool: str):
+        cached = self._chains.get(tool)
+        if cached is not None and cached[0] == self._key(tool):
+            return cached[1]
+        return None
+
+    def _compile(self, tool: str):
+        key = self._key(tool) # Read before the description, so a concurrent update leaves the entry stale
+        prompt = build_prompt(
             CHAINS[self.name],
-            {'TOOL_FOR_CURRENT_STEP': CURRENT_TOOL_DESC(tool)},
+            {'TOOL_FOR_CURRENT_STEP': self._tool_desc(tool)},
             ["input"]
         )
-        self.chain = (self.prompt | self.llm).with_retry(
+        chain = (prompt | self.llm).with_retry(
             retry_if_exception_type=(ValidationError, ValueError),
             stop_after_attempt=self.max_attempt,
             wait_exponential_jitter=True
         )
-        return self.chain.invoke(vars)
+        self._chains[tool] = (key, chain)
+        return chain
+
+    def warmup(self):
+        """Compile the runnable of every common tool ahead of the first plan step."""
+        for tool in COMMON_TOOL_DESC_MAP:
+            self._cached_chain(tool) or self._compile(tool)
+
+    def invalidate(self):
+        """Reload the locale bundle and drop every compiled runnable, without waiting for the next check of the files."""
+        reload_locale_bundle()
+        self._chains.clear()
+
+    def invoke(self, tool: str, vars):
+        chain = self._cached_chain(tool) or self._compile(tool)
+        return chain.invoke(vars)
     
     async def ainvoke(self, tool: str, vars):
-        self.prompt = await asyncio.to_thread(
-            build_prompt,
-            CHAINS[self.name],
-            {'TOOL_FOR_CURRENT_STEP': CURRENT_TOOL_DESC(tool)},
-            ["input"]
-        )
-        self.chain = (self.prompt | self.llm).with_retry(
-            retry_if_exception_type=(ValidationError, ValueError),
-            stop_after_attempt=self.max_attempt,
-            wait_exponential_jitter=True
-        )
-        return await self.chain.ainvoke(vars)
+        chain = self._cached_chain(tool) or await asyncio.to_thread(self._compile, tool)
+        return await chain.ainvoke(vars)
 
 class ValidationChain(BaseChain):
     def __init__(self, name: str = "ValidationChain"):
@@ -194,6 +222,20 @@ class ResponseChain(BaseChain):
         else:
             return self.chain.invoke(vars)
 
+    def astream(self, vars: dict):
+        """
+        Stream the response asynchronously.
+
+        Args:
+            vars: Variable dictionary required to invoke the chain.
+
+        Returns:
+            An async iterator of response tokens.
+        """
+        if self.chain is None:
+            raise NotImplementedError("Chain is not implemented.")
+        return self.chain.astream(vars)
+
 class VisionChain(BaseChain):
     def __init__(self, name: str = "VisionChain"):
         self.name = name
@@ -1,37 +1,124 @@
-from uuid import uuid4
-from datetime import datetime
+"""
+Image memory: image paths and their descriptions, stored as vectors in a persistent
+``chromadb`` collection under ``VECTOR_DIR``.
+
+Descriptions and queries are embedded by the same function, :func:`embed_many`, with the
+backend of :func:`agent.embeddings.get_embedding_backend`. The vectors are passed to Chroma
+explicitly, so writes and searches always share one model and dimension. Embeddings are
+cached by content (see :mod:`agent.embeddings`), so re-describing the same image or re-running
+a query embeds nothing. Writes are buffered and upserted in batches, at most
+``UPSERT_FLUSH_INTERVAL`` seconds after they were buffered, and a search flushes the buffer
+first. Entries stay buffered until their upsert succeeded, and a flush that is writing holds
+back the others, so a search always sees every entry buffered before it. Each image has one entry (its id is derived from the path), so
+describing an image again replaces its entry instead of growing the collection.
+"""
+import atexit
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
 import chromadb
-from openai import OpenAI
-client = OpenAI()
+from agent.embeddings import get_embedding_backend, get_embedding_cache
+from agent.path import VECTOR_DIR
+
+COLLECTION_NAME = "image_pairs"
+UPSERT_BATCH_SIZE = 64
+UPSERT_FLUSH_INTERVAL = float(os.getenv("UPSERT_FLUSH_INTERVAL", "1.0"))
+
+_collection = None
+_lock = threading.Lock()
+_flush_lock = threading.Lock() # Held through the upsert
+_pending: dict[str, tuple[list[float], dict]] = {} # Buffered upserts, keyed by id
+_flush_timer: threading.Timer | None = None
+
+def embed_many(texts: list[str]) -> list[list[float]]:
+    """Embed ``texts`` with the configured backend, through the embedding cache; only the texts not cached yet are embedded, in one batch."""
+    backend = get_embedding_backend()
+    vectors = get_embedding_cache().embed_many(texts, backend.model, backend.dimensions, backend.embed, backend.is_disk_cached)
+    return [v.tolist() for v in vectors]
 
 def embed_text(text: str) -> list[float]:
-    res = client.embeddings.create(
-        model="text-embedding-3-small",
-        dimensions=384,
-        input=text
-    )
-    return res.data[0].embedding
+    return embed_many([text])[0]
 
-chroma_client = chromadb.Client()
-collection = chroma_client.create_collection("image_pairs")
+def get_image_collection():
+    """The persistent image collection, opened (or created) on first use."""
+    global _collection
+    with _lock:
+        if _collection is None:
+            backend = get_embedding_backend()
+            space = f"{backend.model}:{backend.dimensions}"
+            chroma_client = chromadb.PersistentClient(path=str(VECTOR_DIR))
+            # Vectors are always supplied by embed_many, so Chroma never embeds anything itself.
+            # One collection per embedding space, so switching backends never mixes vectors.
+            _collection = chroma_client.get_or_create_collection(
+                f"{COLLECTION_NAME}-{hashlib.sha1(space.encode('utf-8')).hexdigest()[:12]}",
+                embedding_function=None,
+                metadata={"hnsw:space": "cosine", "embedding_model": space}
+            )
+        return _collection
+
+def flush() -> None:
+    """Upsert every buffered entry. Returns once they are written, also if another thread was writing them."""
+    with _flush_lock:
+        with _lock:
+            if not _pending:
+                return
+            batch = dict(_pending)
+        ids = list(batch)
+        vectors, metas = zip(*batch.values())
+        get_image_collection().upsert(ids=ids, embeddings=list(vectors), metadatas=list(metas))
+        with _lock:
+            for pair_id, entry in batch.items():
+                if _pending.get(pair_id) is entry: # Not replaced while upserting
+                    del _pending[pair_id]
+
+def _timed_flush():
+    global _flush_timer
+    with _lock:
+        _flush_timer = None
+    try:
+        flush()
+    except Exception as e:
+        print("[db] buffered upsert failed, retrying on the next flush:", e)
+
+atexit.register(flush)
 
 def upsert_pair(pair_id: str, vector: list[float], meta: dict):
-    collection.upsert(
-        ids=[pair_id],
-        embeddings=[vector],
-        metadatas=[meta]
-    )
+    """
+    Buffer an upsert; the buffer is written every ``UPSERT_BATCH_SIZE`` entries, at most
+    ``UPSERT_FLUSH_INTERVAL`` seconds later, and before searches.
+    """
+    global _flush_timer
+    with _lock:
+        _pending[pair_id] = (vector, meta)
+        is_full = len(_pending) >= UPSERT_BATCH_SIZE
+        if not is_full and _flush_timer is None:
+            _flush_timer = threading.Timer(UPSERT_FLUSH_INTERVAL, _timed_flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    if is_full:
+        flush()
 
 def query_by_text(query: str, k: int = 3):
-    return collection.query(query_texts=[query], n_results=k)
+    flush()
+    collection = get_image_collection()
+    return collection.query(
+        query_embeddings=[embed_text(query)],
+        n_results=k,
+        include=["metadatas", "distances"] # Vectors and documents are not loaded
+    )
+
+def image_id(image_path: str) -> str:
+    return hashlib.sha1(str(image_path).encode("utf-8")).hexdigest()
 
 def store_image_desc(image_path: str, description: str):
-    pair_id = uuid4().hex
+    pair_id = image_id(image_path)
     vec = embed_text(description)
     meta = {
-        "image_path": image_path,
+        "image_path": str(image_path),
         "description": description,
-        "added_at": datetime.utcnow().isoformat()
+        "added_at": datetime.now(timezone.utc).isoformat()
     }
     upsert_pair(pair_id, vec, meta)
-    return pair_id
\ No newline at end of file
+    return pair_id
@@ -0,0 +1,309 @@
+"""
+Text embedding backends and a content-addressed embedding cache.
+
+Backends (selected with the ``EMBEDDING_BACKEND`` env var, see :func:`get_embedding_backend`):
+
+- ``local`` (default): :class:`HashingEmbeddingBackend`, a feature-hashing vectorizer of words
+  and character n-grams run with NumPy on the CPU. No model download, no network.
+- ``openai``: :class:`OpenAIEmbeddingBackend` (``text-embedding-3-small``, 384 dimensions).
+- ``sentence-transformers:<model>``: :class:`SentenceTransformerBackend`, a local model.
+  Requires ``sentence-transformers``.
+
+Vectors are cached by ``sha256(model, dimensions, text)``. An in-process LRU sits in front of a
+SQLite table (``MEMORY_DIR/embeddings.db``) that stores each vector as a float32 blob, so a text
+is embedded once per model and dimension, across runs and processes. Rows expire after
+``EMBEDDING_CACHE_TTL`` seconds (unset: never) and the oldest are evicted past
+``EMBEDDING_CACHE_MAX_ENTRIES``. Vectors of backends with ``is_disk_cached = False`` (the local
+hashing backend, which computes a vector faster than SQLite reads one) are only kept in the LRU.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from agent.path import MEMORY_DIR
+
+EMBEDDING_CACHE_DB = MEMORY_DIR / "embeddings.db"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "local")
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "0")) or None # Seconds; unset or 0 never expires
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# --------------------------------------------------------------------------- #
+# Backends
+# --------------------------------------------------------------------------- #
+class EmbeddingBackend:
+    """
+    Base class. ``model`` and ``dimensions`` identify the vector space in caches and collections.
+    ``is_disk_cached`` is ``False`` for backends whose vectors are cheaper to recompute than to read from disk.
+    """
+    model: str = "base"
+    dimensions: int = 0
+    is_disk_cached: bool = True
+
+    def embed(self, texts: list[str]) -> list[Sequence[float]]:
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Signed feature hashing of lowercased words and character n-grams, L2-normalized.
+
+    Lexical rather than semantic, but deterministic, dependency-free and fast: a batch is a
+    single ``np.add.at`` into a ``(len(texts), dimensions)`` matrix. Character n-grams keep
+    Korean text and word variants matchable.
+
+    Args:
+        dimensions (int): Size of the vectors.
+        ngram_range (tuple[int, int]): Lengths of the character n-grams.
+    """
+    _WORD = re.compile(r"\w+")
+    is_disk_cached = False
+
+    def __init__(self, dimensions: int = 384, ngram_range: tuple[int, int] = (3, 4)):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.model = f"hashing-v1-{ngram_range[0]}{ngram_range[1]}"
+
+    def _features(self, text: str) -> list[str]:
+        words = self._WORD.findall(text.lower())
+        features = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f"<{w}>"
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                features.extend(f"c:{padded[i:i+n]}" for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        rows, cols, signs = [], [], []
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                rows.append(row)
+                cols.append(h % self.dimensions)
+                signs.append(1.0 if h & 0x80000000 else -1.0)
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(matrix, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), np.array(signs, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI embeddings API. The client is created on first use, on the shared connection pool."""
+    def __init__(self, model: str = "text-embedding-3-small", dimensions: int = 384):
+        self.model = model
+        self.dimensions = dimensions
+        self._client = None
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        if self._client is None:
+            from openai import OpenAI
+            from agent.http_clients import get_http_clients
+            self._client = OpenAI(http_client=get_http_clients().client)
+        res = self._client.embeddings.create(model=self.model, dimensions=self.dimensions, input=texts)
+        return [d.embedding for d in res.data]
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """A local ``sentence-transformers`` model, loaded once and run on the CPU."""
+    def __init__(self, model: str = "all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model, device="cpu")
+        self.model = f"sentence-transformers:{model}"
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        return self._model.encode(texts, batch_size=64, convert_to_numpy=True, normalize_embeddings=True)
+
+_backend_kind = EMBEDDING_BACKEND
+
+def get_embedding_backend(kind: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Shared backend of the given kind: ``local``, ``openai`` or ``sentence-transformers:<model>``.
+    Defaults to the kind selected with :func:`use_embedding_backend`, else ``EMBEDDING_BACKEND``.
+    """
+    return _load_backend(kind or _backend_kind)
+
+def use_embedding_backend(kind: str) -> EmbeddingBackend:
+    """Make ``kind`` the default backend of this process (e.g. of the image memory) and load it."""
+    global _backend_kind
+    backend = _load_backend(kind)
+    _backend_kind = kind
+    return backend
+
+@lru_cache(maxsize=None)
+def _load_backend(kind: str) -> EmbeddingBackend:
+    if kind == "local":
+        return HashingEmbeddingBackend()
+    if kind == "openai":
+        return OpenAIEmbeddingBackend()
+    if kind.startswith("sentence-transformers"):
+        _, _, model = kind.partition(":")
+        return SentenceTransformerBackend(model) if model else SentenceTransformerBackend()
+    raise ValueError(f"Unknown embedding backend: {kind}")
+
+# --------------------------------------------------------------------------- #
+# Cache
+# --------------------------------------------------------------------------- #
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key        TEXT PRIMARY KEY,
+    vector     BLOB NOT NULL,
+    created_at REAL NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+_INDEX = "CREATE INDEX IF NOT EXISTS embeddings_created_at ON embeddings (created_at);"
+_SQL_VARIABLE_LIMIT = 500 # Keys per `IN (...)` lookup
+_EVICT_EVERY = 64 # Batches written between two size checks of the table
+
+def embedding_key(model: str, dimensions: int, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{dimensions}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    LRU plus on-disk cache of embedding vectors.
+
+    Args:
+        path (Path): SQLite database file. Created if missing.
+        lru_size (int): Number of vectors kept in memory.
+        max_entries (int): Number of rows kept on disk; the oldest are deleted first.
+        ttl (float | None): Seconds a row stays valid. ``None`` never expires.
+    """
+    def __init__(self, path: Path = EMBEDDING_CACHE_DB, lru_size: int = 4096, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+                 ttl: Optional[float] = EMBEDDING_CACHE_TTL):
+        self.path = Path(path)
+        self.lru_size = lru_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(embeddings)")}
+            if "created_at" not in columns: # Table of an earlier version; its rows count as oldest
+                conn.execute("ALTER TABLE embeddings ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            conn.execute(_INDEX)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get_many(self, keys: Sequence[str], is_disk_cached: bool = True) -> dict[str, np.ndarray]:
+        """Cached vectors of ``keys``; missing or expired keys are left out. ``is_disk_cached=False`` only reads the LRU."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+        rest = [k for k in dict.fromkeys(keys) if k not in found] if is_disk_cached else []
+        conn = self._connect() if rest else None
+        min_created_at = time.time() - self.ttl if self.ttl is not None else 0.0
+        for i in range(0, len(rest), _SQL_VARIABLE_LIMIT):
+            chunk = rest[i:i + _SQL_VARIABLE_LIMIT]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))}) AND created_at >= ?",
+                (*chunk, min_created_at)
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, found[key])
+        return found
+
+    def put_many(self, items: dict[str, Sequence[float]], is_disk_cached: bool = True):
+        vectors = {key: np.asarray(v, dtype=np.float32) for key, v in items.items()}
+        for key, v in vectors.items():
+            self._remember(key, v)
+        if not is_disk_cached:
+            return
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                [(key, v.tobytes(), now) for key, v in vectors.items()]
+            )
+        with self._lock:
+            self._writes += 1
+            is_due = self._writes % _EVICT_EVERY == 1
+        if is_due:
+            self.evict()
+
+    def evict(self):
+        """Delete the expired rows and the oldest rows beyond ``max_entries``."""
+        conn = self._connect()
+        with conn:
+            deleted = 0
+            if self.ttl is not None:
+                deleted += conn.execute("DELETE FROM embeddings WHERE created_at < ?", (time.time() - self.ttl,)).rowcount
+            (n,) = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            excess = n - self.max_entries
+            if excess > 0:
+                deleted += conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created_at LIMIT ?)", (excess,)
+                ).rowcount
+        if deleted:
+            with self._lock:
+                self._lru.clear()
+                self.evictions += deleted
+
+    def embed_many(
+        self,
+        texts: Sequence[str],
+        model: str,
+        dimensions: int,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+        is_disk_cached: bool = True,
+    ) -> list[np.ndarray]:
+        """
+        Embeddings of ``texts``, in order. Only the distinct texts that are not cached are
+        passed to ``embed_fn``, in a single call. With ``is_disk_cached=False`` the vectors are
+        only kept in memory.
+        """
+        keys = [embedding_key(model, dimensions, t) for t in texts]
+        found = self.get_many(keys, is_disk_cached)
+        misses = {k: t for k, t in zip(keys, texts) if k not in found}
+        with self._lock:
+            self.hits += len(texts) - sum(1 for k in keys if k in misses)
+            self.misses += len(misses)
+        if misses:
+            vectors = embed_fn(list(misses.values()))
+            new = dict(zip(misses, vectors))
+            self.put_many(new, is_disk_cached)
+            found.update({k: np.asarray(v, dtype=np.float32) for k, v in new.items()})
+        return [found[k] for k in keys]
+
+_default_cache: Optional[EmbeddingCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    """The process-wide cache at :data:`EMBEDDING_CACHE_DB`, opened on first use."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = EmbeddingCache()
+        return _default_cache
@@ -0,0 +1,150 @@
+"""
+Typed progress events of a ``chat`` turn, for ``chat_stream``.
+
+While an event sink is active (:func:`streaming_events`), the agents :func:`emit` an event when
+a plan is made, when each plan step starts and finishes, when a validation is done and for
+each response token, and a final :class:`ChatFinished`. Like the report of
+:mod:`agent.report`, the sink lives in a context variable, so steps running in other tasks or
+in executor threads reach it without passing it around. Without a sink, :func:`emit` does nothing.
+
+:func:`iterate_events` and :func:`aiterate_events` turn a ``chat`` call into an iterator of its
+events. They are what ``PlanAgent.chat_stream`` returns.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, ClassVar, Iterator, Optional
+
+@dataclass(frozen=True)
+class ChatEvent:
+    """Base class. ``type`` names the event in :meth:`to_dict`."""
+    type: ClassVar[str] = "event"
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, **asdict(self)}
+
+@dataclass(frozen=True)
+class PlanCreated(ChatEvent):
+    """The plan of attempt ``attempt`` (1-based); ``is_cached`` if it came from the plan cache."""
+    type: ClassVar[str] = "plan"
+    attempt: int
+    plan: list
+    is_cached: bool = False
+
+@dataclass(frozen=True)
+class StepStarted(ChatEvent):
+    type: ClassVar[str] = "step_started"
+    step: int
+    tool: str
+
+@dataclass(frozen=True)
+class StepFinished(ChatEvent):
+    """``output``: the lines the step added to the working buffer (tool input, output or error)."""
+    type: ClassVar[str] = "step_finished"
+    step: int
+    tool: str
+    output: str
+
+@dataclass(frozen=True)
+class ValidationResult(ChatEvent):
+    type: ClassVar[str] = "validation"
+    is_valid: bool
+    message: str
+
+@dataclass(frozen=True)
+class ResponseToken(ChatEvent):
+    type: ClassVar[str] = "token"
+    token: str
+
+@dataclass(frozen=True)
+class ChatFinished(ChatEvent):
+    """The whole response; ``report`` if the turn was run with ``is_report=True``."""
+    type: ClassVar[str] = "done"
+    response: str
+    report: Any = None
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "response": self.response, "report": self.report.to_dict() if self.report else None}
+
+class StreamClosed(Exception):
+    """Raised inside a turn when the consumer of its events stopped iterating, to abort it."""
+
+_sink_var: ContextVar[Optional[Callable[[ChatEvent], None]]] = ContextVar("chat_event_sink", default=None)
+
+@contextmanager
+def streaming_events(sink: Callable[[ChatEvent], None]):
+    """Send the events emitted in the enclosed block to ``sink``."""
+    token = _sink_var.set(sink)
+    try:
+        yield
+    finally:
+        _sink_var.reset(token)
+
+def emit(event: ChatEvent) -> None:
+    sink = _sink_var.get()
+    if sink is not None:
+        sink(event)
+
+_DONE = object()
+
+def iterate_events(run: Callable[[], Any]) -> Iterator[ChatEvent]:
+    """
+    Call ``run`` in a thread with an active sink and yield its events as they are emitted.
+    Exceptions of ``run`` are re-raised by the iterator. Closing the iterator early aborts the
+    turn at its next event.
+    """
+    events: queue.Queue = queue.Queue()
+    is_closed = threading.Event()
+
+    def sink(event: ChatEvent):
+        if is_closed.is_set():
+            raise StreamClosed()
+        events.put(event)
+
+    def target():
+        try:
+            with streaming_events(sink):
+                run()
+        except StreamClosed:
+            pass
+        except BaseException as e:
+            events.put(e)
+        finally:
+            events.put(_DONE)
+
+    ctx = contextvars.copy_context()
+    threading.Thread(target=ctx.run, args=(target,), name="chat-stream", daemon=True).start()
+    try:
+        while (event := events.get()) is not _DONE:
+            if isinstance(event, BaseException):
+                raise event
+            yield event
+    finally:
+        is_closed.set()
+
+async def aiterate_events(run: Callable[[], Awaitable[Any]]) -> AsyncIterator[ChatEvent]:
+    """
+    Async :func:`iterate_events`: ``run()`` is awaited in a task. Closing the iterator early
+    cancels the task.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def target():
+        with streaming_events(events.put_nowait):
+            await run()
+
+    task = asyncio.create_task(target())
+    task.add_done_callback(lambda _: events.put_nowait(_DONE))
+    try:
+        while (event := await events.get()) is not _DONE:
+            yield event
+        task.result()
+    finally:
+        if not task.done():
+            task.cancel()
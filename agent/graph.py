@@ -1,18 +1,17 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import yaml
+from agent.memory import EntityMemory, Memory, using_memory
 
-from agent.memory import EntityMemory, Memory
-from agent.path import DESC_DIR
+from typing import Iterator
 
-from langchain_core.messages import (
-    HumanMessage,
-    AIMessage
-)
+from langchain_core.messages import AIMessage
 
-from agent.tool_registry import common_tool_registry as TOOL_REGISTRY, special_tool_registry as SPECIAL_TOOL_REGISTRY
-from agent.chains import PlanChain, ToolChain, ValidationChain, ResponseChain
+from agent.tool_registry import common_tool_registry as TOOL_REGISTRY, special_tool_registry as SPECIAL_TOOL_REGISTRY, tool_descriptor_index as TOOL_DESCRIPTORS, ToolInputError, invoke_tool
+from agent.runtime import AgentRuntime
+from agent.report import ChatReport, record_stage, reporting
+from agent.scratchpad import Scratchpad
+from agent.events import ChatEvent, ChatFinished, PlanCreated, ResponseToken, StepFinished, StepStarted, ValidationResult, emit, iterate_events
 from agent.utils import load_locale_const
 const = load_locale_const()
 TOOL_VALIDATOR_MSG  = const.TOOL_VALIDATOR_MSG
@@ -20,26 +19,35 @@ SPECIAL_TOOL_MSG    = const.SPECIAL_TOOL_MSG
 CHAT_MSG            = const.CHAT_MSG
 
 class Agent:
-    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4):
+    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, token_counter=None, summary_chain=None):
         self.session_id = session_id
         self.recursion_limit = recursion_limit
-        self.memory = Memory(max_memory_tokens)
+        self.memory = Memory(max_memory_tokens, token_counter, session_id=session_id, summary_chain=summary_chain)
         self.chains = [] # Name of chains used in this agent, for debugging purposes
         
-    def chat(self, user_input: str, debug=False):
+    def chat(self, user_input: str, debug=False, is_report=False):
         raise NotImplementedError("This method should be implemented in subclasses.")
      
 class PlanAgent(Agent):
-    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, is_stream: bool=True):
-        super().__init__(session_id, recursion_limit, max_memory_tokens)
-        self.entity_memory = EntityMemory()
+    """
+    Args:
+        runtime (AgentRuntime | None): Chains, plan cache and token counter shared with other agents. Without one,
+            the agent builds its own from ``is_stream`` and ``use_plan_cache``, which a given
+            runtime overrides.
+    """
+    def __init__(self, session_id, recursion_limit=5, max_memory_tokens=1e4, is_stream: bool=True, token_counter=None, use_plan_cache: bool=False,
+                 runtime: AgentRuntime | None=None):
+        self.runtime = runtime or AgentRuntime(is_stream=is_stream, use_plan_cache=use_plan_cache)
+        super().__init__(session_id, recursion_limit, max_memory_tokens, token_counter or self.runtime.token_counter, self.runtime.summary_chain)
+        self.entity_memory = EntityMemory(entity_memory_chain=self.runtime.entity_memory_chain)
+        self.plan_cache = self.runtime.plan_cache
 
         self.tools = TOOL_REGISTRY.values()
         self.special_tools = SPECIAL_TOOL_REGISTRY
-        self.plan_chain = PlanChain()
-        self.tool_chain = ToolChain()
-        self.validation_chain = ValidationChain()
-        self.response_chain = ResponseChain(is_stream=is_stream)
+        self.plan_chain = self.runtime.plan_chain
+        self.tool_chain = self.runtime.tool_chain
+        self.validation_chain = self.runtime.validation_chain
+        self.response_chain = self.runtime.response_chain
 
         self.chains = [
             self.plan_chain.name,
@@ -49,8 +57,13 @@ class PlanAgent(Agent):
         ]
 
         self.save_request = False
+        self.special_tool_handlers = {
+            "thought": lambda tool_message: tool_message,
+            "save_chat_memory": self._save_chat_memory,
+            "clear_chat_memory": self._clear_chat_memory,
+        }
 
-    def _add_buffer(self, buf: list, string: str, debug: bool=False):
+    def _add_buffer(self, buf: Scratchpad, string: str, debug: bool=False):
         buf.append(string)
         if debug:
             print(string)
@@ -60,9 +73,10 @@ class PlanAgent(Agent):
         Validate the provided tool_json dictionary.
 
         This function checks that the dictionary contains the required keys "tool" and "message"
-        and does not contain any unexpected keys (allowed keys are "tool", "message", and optionally "tool_input").
-        Additionally, if the "tool_input" key is present, the function loads the corresponding
-        YAML description from the descriptions directory (using the tool name) and compares its "args" key
+        and does not contain any unexpected keys (allowed keys are "tool", "message", and optionally "tool_input"
+        and "depends_on"). If "depends_on" is present, it must be a list of step numbers.
+        Additionally, if the "tool_input" key is present, the function looks up the tool's description
+        in the in-memory descriptor index (built when tools are registered) and compares its "args" key
         with the value of "tool_input". If they match exactly, it returns ("jump", "").
 
         Args:
@@ -74,7 +88,7 @@ class PlanAgent(Agent):
                 - "jump" and an empty message if "tool_input" is present and exactly matches the description's args,
                 - "false" and an error message if any validation errors occur.
         """
-        allowed_keys = {"tool", "message", "tool_input"}
+        allowed_keys = {"tool", "message", "tool_input", "depends_on"}
         required_keys = {"tool", "message"}
         
         json_keys = set(tool_json.keys())
@@ -88,21 +102,21 @@ class PlanAgent(Agent):
         missing_keys = required_keys - json_keys
         if missing_keys:
             return ("false", TOOL_VALIDATOR_MSG['missing_keys'].format(missing_keys=missing_keys))
+
+        # Check that 'depends_on' lists step numbers.
+        depends_on = tool_json.get("depends_on", [])
+        if not isinstance(depends_on, list) or not all(isinstance(d, int) for d in depends_on):
+            return ("false", TOOL_VALIDATOR_MSG['invalid_depends_on'].format(depends_on=depends_on))
         
-        # If 'tool_input' exists, try to perform YAML args comparison.
+        # If 'tool_input' exists, compare it with the args of the tool's description.
         if "tool_input" in tool_json:
             tool_name = tool_json["tool"]
-            yaml_path = DESC_DIR / f"{tool_name}.yaml"
-            if not yaml_path.exists():
+            desc = TOOL_DESCRIPTORS.get(tool_name)
+            if desc is None:
                 return ("false", TOOL_VALIDATOR_MSG['yaml_path_not_exist'].format(tool_name=tool_name))
-            try:
-                with open(yaml_path, "r", encoding="utf-8") as f:
-                    desc_yaml = yaml.safe_load(f)
-            except Exception as e:
-                return ("false", TOOL_VALIDATOR_MSG['yaml_load_error'].format(tool_name=tool_name, e=e))
             
-            # Get the 'args' section from the YAML.
-            expected_args = desc_yaml.get("args")
+            # Get the 'args' section from the description.
+            expected_args = desc.get("args")
             provided_args = tool_json["tool_input"]
             if provided_args == expected_args:
                 return ("jump", "")
@@ -111,67 +125,94 @@ class PlanAgent(Agent):
         return ("true", "")
     
     def _tool_use(self, tool: str, tool_input: dict):
-        for tool_candidate in self.tools:
-            if tool_candidate.name == tool:
-                tool_output = tool_candidate.invoke(tool_input)
-                return tool_output
-        return None
+        """
+        Validate ``tool_input`` against the tool's ``args_schema`` and run the tool.
+        Returns ``None`` if ``tool`` is not registered.
+
+        Raises:
+            ToolInputError: If ``tool_input`` does not match the tool's arguments.
+        """
+        entry = TOOL_REGISTRY.dispatch(tool)
+        if entry is None:
+            return None
+        tool_input = entry.validate(tool_input)
+        with record_stage("ToolCall", tool=tool):
+            return invoke_tool(entry.tool, tool_input, entry.cache)
 
     def _special_tool_use(self, tool_name: str, tool_message: str):
-        if tool_name == "thought":
-            tool_output = tool_message
-            return tool_output
-        elif tool_name == "save_chat_memory":
-            self.save_request = True
-            return SPECIAL_TOOL_MSG['save_chat_memory']
-        elif tool_name == "clear_chat_memory":
-            self.memory.clear_memory()
-            return SPECIAL_TOOL_MSG['clear_chat_memory']
-        return None
+        handler = self.special_tool_handlers.get(tool_name)
+        return handler(tool_message) if handler else None
+
+    def _save_chat_memory(self, tool_message: str):
+        self.save_request = True
+        return SPECIAL_TOOL_MSG['save_chat_memory']
+
+    def _clear_chat_memory(self, tool_message: str):
+        self.memory.clear_memory()
+        return SPECIAL_TOOL_MSG['clear_chat_memory']
     
+    # Cached plan of a previous turn with the same query, if any
+    def _cached_plan(self, user_input: str):
+        if self.plan_cache is None:
+            return None
+        return self.plan_cache.get(user_input, known_tools=TOOL_REGISTRY.names() | SPECIAL_TOOL_REGISTRY.keys(), entities=self.entity_memory.entity_memory)
+
     # Planning step: generate a plan from the current buffer
     def _planning_step(self, buffer, is_debug):
-        _input = [HumanMessage(content="\n".join(buffer))]
+        _input = buffer.messages()
         plan = self.plan_chain.invoke({"memory": self.memory.memory, "input": _input}).plan
         self._add_buffer(buffer, CHAT_MSG['plan_message'].format(plan=plan), is_debug)
         return plan
 
+    # Single plan step: fill tool_input with ToolChain if needed, then run the tool. Returns the lines to add to the buffer.
+    def _run_step(self, buffer, step, tool_json, validation):
+        tool_name, tool_message = tool_json['tool'], tool_json['message']
+        tool_output = None
+        # Special tool: no input required
+        tool_output = self._special_tool_use(tool_name, tool_message)
+        if tool_output:
+            return [CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output)]
+        # Common tool: input required
+        elif validation=='true':
+            current_tool = CHAT_MSG['current_tool_message'].format(tool_json=tool_json, entity_memory=self.entity_memory.entity_memory)
+            _input = buffer.messages(current_tool)
+            tool_json = self.tool_chain.invoke(tool=tool_name, vars={"input": _input})
+        lines = [CHAT_MSG['tool_complete_message'].format(step=step+1, tool_json=tool_json)]
+        tool, tool_input = tool_json.tool, tool_json.tool_input
+        try:
+            tool_output = self._tool_use(tool, tool_input)
+        except ToolInputError as e:
+            lines.append(CHAT_MSG['tool_input_error_message'].format(step=step+1, tool=tool, tool_input=tool_input, errors=e.errors))
+            return lines
+        if tool_output:
+            lines.append(CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output))
+            return lines
+        if tool_output is None:
+            raise ValueError(f"Tool '{tool}' not found in available tools.")
+        return lines
+
     # Tool step: validate and execute each tool in the plan
     def _tool_step(self, buffer, plan, is_debug):
         if not plan:
             raise ValueError("Plan is empty. Cannot proceed to validation.")
         for step, tool_json in enumerate(plan):
-            validation, message = self._tool_validator(tool_json)
-            if validation=='false':
-                self._add_buffer(buffer, CHAT_MSG['tool_validation_false_message'].format(step=step+1, message=message), is_debug)
-                break
-            tool_name, tool_message = tool_json['tool'], tool_json['message']
-            tool_output = None
-            # Special tool: no input required
-            tool_output = self._special_tool_use(tool_name, tool_message)
-            if tool_output:
-                self._add_buffer(buffer, CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output), is_debug)
-                continue
-            # Common tool: input required
-            elif validation=='true':
-                self._add_buffer(buffer, CHAT_MSG['current_tool_message'].format(tool_json=tool_json, entity_memory=self.entity_memory.entity_memory))
-                _input = [HumanMessage(content="\n".join(buffer))]
-                tool_json = self.tool_chain.invoke(tool=tool_name, vars={"input": _input})
-                buffer.pop()
-            self._add_buffer(buffer, CHAT_MSG['tool_complete_message'].format(step=step+1, tool_json=tool_json), is_debug)
-            tool, tool_input = tool_json.tool, tool_json.tool_input
-            tool_output = self._tool_use(tool, tool_input)
-            if tool_output:
-                self._add_buffer(buffer, CHAT_MSG['tool_output_message'].format(step=step+1, tool_output=tool_output), is_debug)
-                continue
-            if tool_output is None:
-                raise ValueError(f"Tool '{tool}' not found in available tools.")
+            with record_stage("ToolStep", step=step+1, tool=tool_json.get('tool')):
+                validation, message = self._tool_validator(tool_json)
+                if validation=='false':
+                    self._add_buffer(buffer, CHAT_MSG['tool_validation_false_message'].format(step=step+1, message=message), is_debug)
+                    break
+                emit(StepStarted(step+1, tool_json['tool']))
+                lines = self._run_step(buffer, step, tool_json, validation)
+                for line in lines:
+                    self._add_buffer(buffer, line, is_debug)
+                emit(StepFinished(step+1, tool_json['tool'], "\n".join(lines)))
 
     # Validation step: check if the output is valid
     def _validation_step(self, buffer, is_debug):
-        _input = [HumanMessage(content="\n".join(buffer))]
+        _input = buffer.messages()
         validation = self.validation_chain.invoke({"input": _input})
         validation_message = validation.message
+        emit(ValidationResult(validation.is_valid, validation_message))
         if validation.is_valid:
             self._add_buffer(buffer, CHAT_MSG['validation_true_message'].format(validation_message=validation_message), is_debug)
             return True
@@ -179,40 +220,63 @@ class PlanAgent(Agent):
             self._add_buffer(buffer, CHAT_MSG['validation_false_message'].format(validation_message=validation_message), is_debug)
             return False
 
-    # Response step: generate and print the final response, update memory, and handle save request
+    # Response step: generate the final response (streamed as events), update memory, and handle save request
     def _response_step(self, buffer, is_debug, accepted):
         if not accepted:
             self._add_buffer(buffer, CHAT_MSG['max_attempt_exceeded_message'], is_debug)
-        input = [HumanMessage(content="\n".join(buffer))]
-        response = self.response_chain.invoke({"memory": self.memory.memory, "input": input})
-        if type(response) == str:
-            print(f"Response:\n{response}")
+        vars = {"memory": self.memory.memory, "input": buffer.messages()}
+        if self.response_chain.is_stream:
+            tokens = []
+            for token in self.response_chain.invoke(vars):
+                emit(ResponseToken(token))
+                tokens.append(token)
+            response = "".join(tokens)
         else:
-            response_buffer = []
-            print("Response:")
-            for token in response:
-                print(token, end="", flush=True)
-                response_buffer.append(token)
-            response = "".join(response_buffer)
-        self.memory.extend([HumanMessage(content="\n".join(buffer)), AIMessage(content=response)])
+            response = self.response_chain.invoke(vars)
+            emit(ResponseToken(response))
+        self.memory.extend([buffer.message(), AIMessage(content=response)])
         if self.save_request:
             self.memory.save_memory()
             self.save_request = False
         return response
     
     # Main chat loop: orchestrate planning, tool, validation, and response steps
-    def chat(self, user_input: str, is_debug=False):
-        _buffer = []
-        recursion = 0
-        accepted = False
-        self._add_buffer(_buffer, CHAT_MSG['input_message'].format(user_input=user_input), is_debug)
-        while recursion < self.recursion_limit and not accepted:
-            self._add_buffer(_buffer, CHAT_MSG['attempt_message'].format(n_recursion=recursion+1), is_debug)
-            plan = self._planning_step(_buffer, is_debug)
-            self._tool_step(_buffer, plan, is_debug)
-            accepted = self._validation_step(_buffer, is_debug)
-            if not accepted:
-                recursion += 1
-        response = self._response_step(_buffer, is_debug, accepted)
-        self.entity_memory.query(self.memory) # Entity Memory Update
-        return response
\ No newline at end of file
+    def chat(self, user_input: str, is_debug=False, is_report=False):
+        report = ChatReport() if is_report else None
+        with reporting(report), using_memory(self.memory):
+            _buffer = Scratchpad()
+            recursion = 0
+            accepted = False
+            self._add_buffer(_buffer, CHAT_MSG['input_message'].format(user_input=user_input), is_debug)
+            while recursion < self.recursion_limit and not accepted:
+                self._add_buffer(_buffer, CHAT_MSG['attempt_message'].format(n_recursion=recursion+1), is_debug)
+                cached_plan = self._cached_plan(user_input) if recursion == 0 else None
+                with record_stage("Plan", attempt=recursion+1, cached=cached_plan is not None):
+                    if cached_plan is not None:
+                        plan = cached_plan
+                        self._add_buffer(_buffer, CHAT_MSG['plan_message'].format(plan=plan), is_debug)
+                    else:
+                        plan = self._planning_step(_buffer, is_debug)
+                emit(PlanCreated(recursion+1, plan, cached_plan is not None))
+                with record_stage("Tool", attempt=recursion+1):
+                    self._tool_step(_buffer, plan, is_debug)
+                with record_stage("Validation", attempt=recursion+1):
+                    accepted = self._validation_step(_buffer, is_debug)
+                if not accepted:
+                    recursion += 1
+                elif recursion == 0 and cached_plan is None and self.plan_cache is not None:
+                    self.plan_cache.put(user_input, plan, entities=self.entity_memory.entity_memory)
+            with record_stage("Response"):
+                response = self._response_step(_buffer, is_debug, accepted)
+            self.entity_memory.schedule(self.memory) # Entity Memory Update, in the background
+        emit(ChatFinished(response, report))
+        return (response, report) if is_report else response
+
+    def chat_stream(self, user_input: str, is_debug=False, is_report=False) -> Iterator[ChatEvent]:
+        """
+        Run :meth:`chat` and yield its events as they happen: :class:`PlanCreated`,
+        :class:`StepStarted`/:class:`StepFinished`, :class:`ValidationResult`, one
+        :class:`ResponseToken` per response token and a final :class:`ChatFinished`.
+        The turn runs in a worker thread; breaking out of the loop aborts it at its next event.
+        """
+        return iterate_events(lambda: self.chat(user_input, is_debug, is_report))
\ No newline at end of file
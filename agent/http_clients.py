@@ -0,0 +1,211 @@
+"""
+Process-wide HTTP clients shared by the chat models, the embedding backend and the tools.
+
+Left alone, every ``ChatOpenAI``/``ChatGroq`` built by :func:`agent.llm.get_llm`, the OpenAI
+embedding client and each API tool create their own HTTP client, so concurrent turns keep
+opening new connections (and TLS handshakes) to the same hosts. :func:`get_http_clients`
+returns one :class:`HTTPClients` per process, which hands out:
+
+- :attr:`HTTPClients.client`: an ``httpx.Client`` (OpenAI/Groq SDKs);
+- :attr:`HTTPClients.async_client`: an ``httpx.AsyncClient``. Connections of an asyncio pool
+  belong to the event loop that opened them, so it keeps one pool per running loop;
+- :attr:`HTTPClients.session`: a ``requests.Session`` for libraries built on ``requests``
+  (``googlemaps``).
+
+SDKs that set their own headers or base URL on the client they are given (Tavily) get a client of
+their own from :meth:`HTTPClients.new_client`, :meth:`HTTPClients.new_async_client` or
+:meth:`HTTPClients.new_session`, which still sends its requests through the shared pools.
+
+Connections are kept alive for reuse. HTTP/2 is negotiated by the ``httpx`` clients when the
+``h2`` package is installed. Pool sizes come from ``HTTP_MAX_CONNECTIONS`` (per pool, default:
+100), ``HTTP_MAX_KEEPALIVE`` (idle connections kept, default: 20) and ``HTTP_KEEPALIVE_EXPIRY``
+(seconds an idle connection is kept, default: 30); set ``HTTP2=0`` to stay on HTTP/1.1.
+
+The clients are shared and closing them does not close the pools. The sync pools are closed at
+exit; the pool of an event loop is closed by awaiting :meth:`HTTPClients.aclose` on that loop
+before it stops (the server does so on shutdown). :meth:`HTTPClients.stats` reports requests,
+opened connections and requests served over HTTP/2.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP2 = os.getenv("HTTP2", "1") != "0" and importlib.util.find_spec("h2") is not None
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0) # Per-request timeouts of the SDKs take precedence
+
+class _Meter:
+    """Counts requests, the connections they opened and those served over HTTP/2, from the response extensions."""
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.http2 = 0
+        self._seen = weakref.WeakSet() # Network streams (one per connection) already counted
+        self._lock = threading.Lock()
+
+    def observe(self, response: httpx.Response):
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            self.http2 += response.extensions.get("http_version") == b"HTTP/2"
+            if stream is not None and stream not in self._seen:
+                self._seen.add(stream)
+                self.connections_opened += 1
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "connections_opened": self.connections_opened, "http2": self.http2}
+
+class _SharedTransport(httpx.BaseTransport):
+    def __init__(self, transport: httpx.HTTPTransport, meter: _Meter):
+        self._transport = transport
+        self._meter = meter
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self._transport.handle_request(request)
+        self._meter.observe(response)
+        return response
+
+    def close(self):
+        pass # Shared; closed by HTTPClients.close
+
+class _SharedAsyncTransport(httpx.AsyncBaseTransport):
+    """Dispatches each request to the pool of the running event loop."""
+    def __init__(self, make_transport, meter: _Meter):
+        self._make_transport = make_transport
+        self._meter = meter
+        self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = self._make_transport()
+        response = await transport.handle_async_request(request)
+        self._meter.observe(response)
+        return response
+
+    async def aclose(self):
+        pass # Shared; closed by HTTPClients.aclose
+
+    async def aclose_loop(self):
+        """Close the pool of the running event loop, if it has one."""
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+class _SharedSession(requests.Session):
+    def close(self):
+        pass # The adapter is shared; closed by HTTPClients.close
+
+class _MeteredAdapter(HTTPAdapter):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+
+    def send(self, request, **kwargs):
+        self.requests += 1
+        return super().send(request, **kwargs)
+
+    def stats(self) -> dict:
+        pools = [self.poolmanager.pools[key] for key in self.poolmanager.pools.keys()]
+        return {
+            "requests": self.requests,
+            "connections_opened": sum(p.num_connections for p in pools),
+            "hosts": len(pools)
+        }
+
+class HTTPClients:
+    """
+    Shared, thread-safe HTTP clients. Use :func:`get_http_clients` rather than building one.
+
+    Args:
+        max_connections (int): Connections of each pool (per event loop for the async client).
+        max_keepalive (int): Idle connections kept open for reuse in each pool.
+        keepalive_expiry (float): Seconds an idle connection is kept.
+        is_http2 (bool): Negotiate HTTP/2 on the ``httpx`` clients. Requires ``h2``.
+    """
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        is_http2: bool = HTTP2,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.is_http2 = is_http2
+        self._meter, self._async_meter = _Meter(), _Meter()
+        self._transport = httpx.HTTPTransport(limits=self.limits, http2=is_http2)
+        self._async_transport = _SharedAsyncTransport(
+            lambda: httpx.AsyncHTTPTransport(limits=self.limits, http2=is_http2), self._async_meter
+        )
+        self._adapter = _MeteredAdapter(pool_maxsize=max_keepalive) # Connections kept per host; requests has no overall cap
+        self.client = self.new_client()
+        self.async_client = self.new_async_client()
+        self.session = self.new_session()
+
+    def new_client(self, **kwargs) -> httpx.Client:
+        """An ``httpx.Client`` of its own (headers, base URL, ...) on the shared sync pool. ``kwargs`` go to ``httpx.Client``."""
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        kwargs.setdefault("follow_redirects", True)
+        return httpx.Client(transport=_SharedTransport(self._transport, self._meter), **kwargs)
+
+    def new_async_client(self, **kwargs) -> httpx.AsyncClient:
+        """An ``httpx.AsyncClient`` of its own on the shared per-loop pools. ``kwargs`` go to ``httpx.AsyncClient``."""
+        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+        kwargs.setdefault("follow_redirects", True)
+        return httpx.AsyncClient(transport=self._async_transport, **kwargs)
+
+    def new_session(self) -> requests.Session:
+        """A ``requests.Session`` of its own (headers, proxies) on the shared connection pools."""
+        session = _SharedSession()
+        session.mount("https://", self._adapter)
+        session.mount("http://", self._adapter)
+        return session
+
+    def stats(self) -> dict:
+        """Per client: ``requests``, ``connections_opened`` and, for ``httpx``, the requests served over ``http2``."""
+        return {
+            "client": self._meter.stats(),
+            "async_client": self._async_meter.stats(),
+            "session": self._adapter.stats()
+        }
+
+    def close(self):
+        """Close the pooled connections of the sync clients."""
+        self._transport.close()
+        self._adapter.close()
+
+    async def aclose(self):
+        """Close the pooled connections of the running event loop. Await it before the loop stops."""
+        await self._async_transport.aclose_loop()
+
+_default_clients: Optional[HTTPClients] = None
+_default_clients_lock = threading.Lock()
+
+def get_http_clients() -> HTTPClients:
+    """The process-wide clients, created on first use."""
+    global _default_clients
+    with _default_clients_lock:
+        if _default_clients is None:
+            _default_clients = HTTPClients()
+            atexit.register(_default_clients.close)
+        return _default_clients
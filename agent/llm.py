@@ -1,23 +1,64 @@
+from typing import Callable
 from langchain_core.language_models import BaseChatModel
 from agent.model.chain_config import ChainConfig
+from agent.http_clients import get_http_clients
+from agent.llm_cache import LLM_CACHE, LLM_CACHE_TTL, CachedChatModel, cached_model
 
-def get_llm(chain_config: ChainConfig, tags: list, **kwargs) -> BaseChatModel:
+# Extra model families registered at runtime (e.g. the offline fake model used by `bench`)
+_MODEL_FAMILIES: dict[str, Callable[..., BaseChatModel]] = {}
+
+def register_model_family(model_family: str, factory: Callable[..., BaseChatModel]) -> None:
+    """
+    Register a chat model factory that :func:`get_llm` uses for ``model_family``.
+
+    Args:
+        model_family (str): Value of ``ChainConfig.model_family`` that selects this factory.
+        factory (Callable): Called as ``factory(name=..., model_name=..., tags=..., **kwargs)`` and
+            must return a chat model.
+    """
+    _MODEL_FAMILIES[model_family] = factory
+
+def get_llm(chain_config: ChainConfig, tags: list, **kwargs) -> BaseChatModel | CachedChatModel:
+    """
+    Build the chat model of ``chain_config``. With ``chain_config.is_cache`` (or ``LLM_CACHE=1``)
+    the model answers repeated requests from :mod:`agent.llm_cache` (and is wrapped in a
+    :class:`agent.llm_cache.CachedChatModel` if it streams). OpenAI and Groq models send
+    their requests through the shared connection pools of :mod:`agent.http_clients`, unless
+    ``http_client``/``http_async_client`` are passed in ``kwargs``.
+    """
+    # Tags are set on the model itself (not via `with_config`) so they survive `with_structured_output`.
     name, model_family, model_name = chain_config.name, chain_config.model_family, chain_config.model_name
+    if model_family in ('openai', 'groq'):
+        clients = get_http_clients()
+        kwargs.setdefault("http_client", clients.client)
+        kwargs.setdefault("http_async_client", clients.async_client)
     if model_family=='openai':
         from langchain_openai import ChatOpenAI
         llm = ChatOpenAI(
             name=name,
             model_name=model_name,
+            tags=tags,
             **kwargs
-        ).with_config(tags=tags)
+        )
     elif model_family=='groq':
         from langchain_groq import ChatGroq
         llm = ChatGroq(
             name=name,
             model_name=model_name,
+            tags=tags,
             **kwargs
-        ).with_config(tags=tags)
+        )
+    elif model_family in _MODEL_FAMILIES:
+        llm = _MODEL_FAMILIES[model_family](
+            name=name,
+            model_name=model_name,
+            tags=tags,
+            **kwargs
+        )
     else:
         raise Exception("Unexpected model family.")
-    
-    return llm
\ No newline at end of file
+
+    if chain_config.is_cache or LLM_CACHE:
+        ttl = chain_config.cache_ttl if chain_config.cache_ttl is not None else LLM_CACHE_TTL
+        llm = cached_model(llm, ttl=ttl)
+    return llm
@@ -0,0 +1,330 @@
+"""
+Exact-match cache of LLM responses, shared by every chain built with :func:`agent.llm.get_llm`.
+
+A response is keyed by ``sha256(llm_string, prompt)``: ``llm_string`` is LangChain's
+serialization of the model and its parameters (model name, temperature, bound tools and
+structured-output schema, stop words), and ``prompt`` is the serialized message list. Only an
+identical request on an identically configured model hits.
+
+Two tiers, see :class:`ResponseStore`: an in-process LRU in front of a SQLite table
+(``MEMORY_DIR/llm_cache.db``) that is shared across runs and processes. Entries expire after
+the chain's TTL and the oldest rows are evicted past ``max_entries``.
+
+``invoke``/``ainvoke`` and structured output go through LangChain's own cache hook
+(``BaseChatModel.cache``), which takes a :class:`LLMResponseCache`. ``stream``/``astream`` bypass
+that hook, so :func:`cached_model` wraps models that stream in a :class:`CachedChatModel`
+runnable: a request found in the cache is answered through ``invoke`` (a hit of the hook) and
+replayed as a token stream, and a live stream is stored as one message once it completes.
+
+Cached messages are stored without ``usage_metadata``: a hit costs no tokens, and a
+``ChatReport`` of a cached turn shows that.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.language_models import BaseChatModel
+from langchain_core.load import dumps
+from langchain_core.messages import (
+    AIMessage, AIMessageChunk, BaseMessage, BaseMessageChunk, convert_to_messages,
+    message_chunk_to_message, messages_from_dict, message_to_dict
+)
+from langchain_core.outputs import ChatGeneration, Generation
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from agent.path import MEMORY_DIR
+
+LLM_CACHE_DB = MEMORY_DIR / "llm_cache.db"
+LLM_CACHE = os.getenv("LLM_CACHE", "0") == "1"
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "0")) or None # Seconds; unset or 0 never expires
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at);
+"""
+_EVICT_EVERY = 64 # Writes between two size checks of the table
+_TOKEN = re.compile(r"\S*\s*")
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+class ResponseStore:
+    """
+    LRU plus on-disk store of serialized responses.
+
+    Args:
+        path (Path): SQLite database file. Created if missing.
+        lru_size (int): Number of responses kept in memory.
+        max_entries (int): Number of rows kept on disk; the oldest are deleted first.
+    """
+    def __init__(self, path: Path = LLM_CACHE_DB, lru_size: int = 1024, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.lru_size = lru_size
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+        self._lru: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local() # sqlite3 connections must stay in their thread
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, entry: tuple[str, float]):
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, key: str, ttl: Optional[float] = None, is_counted: bool = True) -> Optional[str]:
+        """
+        The value stored under ``key``, or ``None`` if it is missing or older than ``ttl`` seconds.
+        With ``is_counted=False`` the lookup is left out of :attr:`stats`.
+        """
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+        if entry is None:
+            entry = self._connect().execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if entry is not None:
+                self._remember(key, entry)
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += is_counted
+                return None
+            if ttl is not None and time.time() - entry[1] > ttl:
+                self.stats["expired"] += is_counted
+                return None
+            self.stats["hits"] += is_counted
+            return entry[0]
+
+    def set(self, key: str, value: str):
+        entry = (value, time.time())
+        conn = self._connect()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)", (key, *entry))
+        self._remember(key, entry)
+        with self._lock:
+            self.stats["stores"] += 1
+            self._writes += 1
+            is_due = self._writes % _EVICT_EVERY == 1
+        if is_due:
+            self.evict()
+
+    def evict(self):
+        """Delete the oldest rows beyond ``max_entries``."""
+        conn = self._connect()
+        with conn:
+            (n,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            excess = n - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY created_at LIMIT ?)", (excess,)
+                )
+        if excess > 0:
+            with self._lock:
+                self._lru.clear()
+                self.stats["evictions"] += excess
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+        with self._lock:
+            self._lru.clear()
+
+_default_store: Optional[ResponseStore] = None
+_default_store_lock = threading.Lock()
+
+def get_response_store() -> ResponseStore:
+    """The process-wide store at :data:`LLM_CACHE_DB`, opened on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ResponseStore()
+        return _default_store
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache of chat generations on top of a :class:`ResponseStore`.
+
+    Args:
+        store (ResponseStore): Where responses are kept. Defaults to :func:`get_response_store`.
+        ttl (float | None): Seconds a response stays valid. ``None`` never expires.
+    """
+    def __init__(self, store: Optional[ResponseStore] = None, ttl: Optional[float] = LLM_CACHE_TTL):
+        self.store = store or get_response_store()
+        self.ttl = ttl
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[list[Generation]]:
+        value = self.store.get(cache_key(prompt, llm_string), self.ttl)
+        if value is None:
+            return None
+        return [
+            ChatGeneration(message=message, generation_info=generation_info)
+            for message, generation_info in (
+                (messages_from_dict([g["message"]])[0], g["generation_info"]) for g in json.loads(value)
+            )
+        ]
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        if not all(isinstance(g, ChatGeneration) for g in return_val):
+            return
+        value = [
+            {
+                "message": message_to_dict(g.message.model_copy(update={"usage_metadata": None}) if isinstance(g.message, AIMessage) else g.message),
+                "generation_info": g.generation_info
+            }
+            for g in return_val
+        ]
+        self.store.set(cache_key(prompt, llm_string), json.dumps(value, ensure_ascii=False))
+
+    def contains(self, prompt: str, llm_string: str) -> bool:
+        """Whether :meth:`lookup` would hit. Not counted in the store's stats."""
+        return self.store.get(cache_key(prompt, llm_string), self.ttl, is_counted=False) is not None
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+# --------------------------------------------------------------------------- #
+# Streaming
+# --------------------------------------------------------------------------- #
+def _replay(message: BaseMessage) -> Iterator[AIMessageChunk]:
+    """A cached message as a stream: one chunk per word of text, tool calls on the first chunk."""
+    if not isinstance(message.content, str):
+        yield AIMessageChunk(**message.model_dump(exclude={"type", "tool_calls", "invalid_tool_calls", "usage_metadata"}))
+        return
+    for i, token in enumerate(_TOKEN.findall(message.content)[:-1] or [""]):
+        if i == 0:
+            yield AIMessageChunk(
+                content=token,
+                id=message.id,
+                additional_kwargs=message.additional_kwargs,
+                response_metadata=message.response_metadata,
+                tool_call_chunks=[
+                    {"name": c["name"], "args": json.dumps(c["args"]), "id": c["id"], "index": j}
+                    for j, c in enumerate(getattr(message, "tool_calls", []))
+                ]
+            )
+        else:
+            yield AIMessageChunk(content=token, id=message.id)
+
+def _merge(chunks: list[BaseMessageChunk]) -> ChatGeneration:
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        merged = merged + chunk
+    return ChatGeneration(message=message_chunk_to_message(merged))
+
+def _to_messages(input: Any) -> list[BaseMessage]:
+    if isinstance(input, PromptValue):
+        return input.to_messages()
+    return convert_to_messages([input] if isinstance(input, str) else input)
+
+class CachedChatModel(Runnable):
+    """
+    ``model`` (whose ``cache`` is set) with cached ``stream``/``astream``; anything else is the model's.
+
+    Attributes and methods other than the runnable interface, e.g. ``with_structured_output`` or
+    ``bind_tools``, are looked up on the model, so what they build is cached through its ``cache``.
+
+    Args:
+        model (BaseChatModel): The chat model. Its ``cache`` must be a :class:`LLMResponseCache`.
+    """
+    def __init__(self, model: BaseChatModel):
+        self.model = model
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.__dict__["model"], name)
+
+    def __repr__(self) -> str:
+        return f"CachedChatModel({self.model!r})"
+
+    @property
+    def InputType(self) -> Any:
+        return self.model.InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.model.OutputType
+
+    def _cache_args(self, input: Any, kwargs: dict) -> tuple[str, str]:
+        # The same key as LangChain's cache hook computes in `invoke`, where `stop` is a separate argument
+        kwargs = dict(kwargs)
+        stop = kwargs.pop("stop", None)
+        return dumps(_to_messages(input)), self.model._get_llm_string(stop=stop, **kwargs)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseMessage:
+        return self.model.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> BaseMessage:
+        return await self.model.ainvoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[BaseMessageChunk]:
+        prompt, llm_string = self._cache_args(input, kwargs)
+        if self.model.cache.contains(prompt, llm_string):
+            yield from _replay(self.model.invoke(input, config, **kwargs))
+            return
+        chunks = []
+        for chunk in self.model.stream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.model.cache.update(prompt, llm_string, [_merge(chunks)])
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[BaseMessageChunk]:
+        prompt, llm_string = self._cache_args(input, kwargs)
+        if await asyncio.to_thread(self.model.cache.contains, prompt, llm_string):
+            for chunk in _replay(await self.model.ainvoke(input, config, **kwargs)):
+                yield chunk
+            return
+        chunks = []
+        async for chunk in self.model.astream(input, config, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            await self.model.cache.aupdate(prompt, llm_string, [_merge(chunks)])
+
+def cached_model(llm: BaseChatModel, ttl: Optional[float] = LLM_CACHE_TTL) -> BaseChatModel | CachedChatModel:
+    """
+    Make ``llm`` answer repeated requests from the response cache.
+
+    Args:
+        llm (BaseChatModel): The model. Its ``cache`` field is set.
+        ttl (float | None): Seconds a cached response stays valid.
+
+    Returns:
+        ``llm``, wrapped in a :class:`CachedChatModel` if it implements streaming.
+    """
+    llm.cache = LLMResponseCache(ttl=ttl)
+    if type(llm)._stream is BaseChatModel._stream and type(llm)._astream is BaseChatModel._astream:
+        return llm # `stream` falls back to the cached `invoke`
+    return CachedChatModel(llm)
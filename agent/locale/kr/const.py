@@ -3,6 +3,8 @@ PLAN_MODEL_DESC = {
     'plan': (
         "계획의 단계들을 나타내는 딕셔너리 리스트.\n"
         "각 딕셔너리는 'tool' (수행할 행동)과 'message' (추가 메모)를 포함합니다.\n"
+        "선택적으로 'depends_on'에 해당 단계가 결과를 필요로 하는 이전 단계 번호(1부터 시작)의 리스트를 넣을 수 있습니다. "
+        "이전 결과가 필요 없는 단계는 []로 지정하며, 'depends_on'이 없으면 바로 앞 단계에 의존합니다.\n"
         "예시: [{'tool': 'get_datetime', 'message': '오늘 날짜 파악'}, {'tool': 'web_search', 'message': '이전 단계에서 파악한 날짜로, 'x월 x일 서울 날씨'와 같은 query를 통해 오늘 서울의 날씨 검색'}]\n"
     )
 }
@@ -15,6 +17,13 @@ VALIDATION_MODEL_DESC = {
     'is_valid': "계획 및 실행이 유효했는지 여부. True면 계획이 성공적으로 실행되었음을 의미하고, False면 실패했으므로 다시 계획을 짜야함을 의미합니다.",
     'message': "검증 결과에 대한 설명 메시지. 선택 사항으로, 검증 결과에 대한 추가 정보를 제공할 수 있습니다."
 }
+ENTITIES_MODEL_DESC = {
+    'entities': (
+        "대화에서 추출한 엔티티 딕셔너리. "
+        "키는 엔티티 이름 또는 종류(예: 'person', 'location', 'goal'), 값은 그 내용입니다. "
+        "예시: { 'person': '민수', 'location': '서울', 'goal': '날씨 정보 찾기' }"
+    )
+}
 
 # graph.py
 TOOL_VALIDATOR_MSG = {
@@ -22,6 +31,7 @@ TOOL_VALIDATOR_MSG = {
     'missing_keys'          : "Missing required keys: {missing_keys}.",
     'yaml_path_not_exist'   : "Description file not found for tool: {tool_name}.",
     'yaml_load_error'       : "Failed to load YAML for tool {tool_name}: {e}",
+    'invalid_depends_on'    : "Invalid depends_on {depends_on}: it must be a list of earlier step numbers.",
 }
 SPECIAL_TOOL_MSG = {
     'save_chat_memory'  : "대화 내역을 성공적으로 저장했습니다.",
@@ -33,6 +43,7 @@ CHAT_MSG = {
     'plan_message'                  : "Plan: {plan}",
     'tool_validation_false_message' : "Step {step} Error : {message}",
     'tool_complete_message'         : "Plan Step {step} Tool: {tool_json}",
+    'tool_input_error_message'      : "Plan Step {step} Tool Input Error: `{tool}`이(가) tool_input {tool_input}을(를) 거부했습니다.\n{errors}",
     'tool_output_message'           : (
                                         "Plan Step {step} Tool Output:\n"
                                         "<OUTPUT START>\n{tool_output}\n<OUTPUT END>"
@@ -57,6 +68,14 @@ MEMORY_CONST = {
     'load_error_message': "대화 내역을 불러오는 중 오류가 발생했습니다: {e}",
     'save_error_message': "대화 내역을 저장하는 중 오류가 발생했습니다: {e}",
 }
+ENTITY_MEMORY_CONST = {
+    'query_input_templeate': (
+        "새로 추가된 대화 메시지와 현재 엔티티를 바탕으로 엔티티 메모리를 갱신하세요. "
+        "새로 생기거나 바뀐 엔티티만 JSON 딕셔너리로 반환하고, 삭제할 엔티티는 값을 null로 지정하세요.\n"
+        "새 메시지:\n{memory}\n"
+        "현재 엔티티 메모리:\n{entity_memory}"
+    )
+}
 
 # Tool related
 EXECUTE_CODE_CONST = {
@@ -65,6 +84,8 @@ EXECUTE_CODE_CONST = {
     'parsing_failed': "❌ 코드 파싱 실패",
     'timeout': "⏰ 실행 시간이 제한({timeout} 초)을 초과했습니다.",
     'no_output': "✅ 실행 완료 (출력 없음)",
+    'crashed': "❌ 코드 실행기가 예기치 않게 종료되었습니다.",
+    'busy': "⏳ 모든 코드 실행기가 사용 중입니다. 잠시 후 다시 시도해 주세요.",
     'desc': """
     로컬 Python 환경에서 입력한 코드를 실행합니다.  
     간단한 테스트나 ‘빠른 코드 스니펫 검증’이 필요할 때 유용합니다.
@@ -3,6 +3,8 @@ PLAN_MODEL_DESC = {
     'plan': (
         "List of dictionaries representing the steps of the plan.\n"
         "Each dictionary includes 'tool' (the action to perform) and 'message' (additional notes).\n"
+        "Optionally, 'depends_on' lists the earlier step numbers (starting at 1) whose output the step needs. "
+        "Use [] for a step that needs no earlier output; without 'depends_on' a step depends on the step right before it.\n"
         "Example: [{'tool': 'get_datetime', 'message': 'Check today's date'}, {'tool': 'web_search', 'message': 'Using the date found in the previous step, search for today's weather in Seoul with a query like 'Month Day Seoul weather'}]\n"
     )
 }
@@ -29,6 +31,7 @@ TOOL_VALIDATOR_MSG = {
     'missing_keys'          : "Missing required keys: {missing_keys}.",
     'yaml_path_not_exist'   : "Description file not found for tool: {tool_name}.",
     'yaml_load_error'       : "Failed to load YAML for tool {tool_name}: {e}",
+    'invalid_depends_on'    : "Invalid depends_on {depends_on}: it must be a list of earlier step numbers.",
 }
 SPECIAL_TOOL_MSG = {
     'save_chat_memory'  : "Conversation history has been saved successfully.",
@@ -41,6 +44,7 @@ CHAT_MSG = {
     'current_tool_message'          : "Current Step: {tool_json} TODO!\nCurrent Entity Memory:\n<ENTITY MEMORY START>\n{entity_memory}\n<ENTITY MEMORY END>",
     'tool_validation_false_message' : "Step {step} Error : {message}",
     'tool_complete_message'         : "Plan Step {step} Tool: {tool_json}",
+    'tool_input_error_message'      : "Plan Step {step} Tool Input Error: `{tool}` rejected tool_input {tool_input}.\n{errors}",
     'tool_output_message'           : (
                                         "Plan Step {step} Tool Output:\n"
                                         "<OUTPUT START>\n{tool_output}\n<OUTPUT END>"
@@ -66,9 +70,9 @@ MEMORY_CONST = {
 }
 ENTITY_MEMORY_CONST = {
     'query_input_templeate': (
-        "Update the entity memory based on the conversation history so far and current entities. "
-        "Return only the updated entity memory as a JSON dictionary.\n"
-        "Conversation so far:\n{memory}\n"
+        "Update the entity memory based on the new messages of the conversation and current entities. "
+        "Return only the entities that are new or changed as a JSON dictionary; set an entity to null to remove it.\n"
+        "New messages:\n{memory}\n"
         "Current Entity Memory:\n{entity_memory}"
     )
 }
@@ -80,6 +84,8 @@ EXECUTE_CODE_CONST = {
     'parsing_failed': "❌ Code parsing failed",
     'timeout': "⏰ Execution time limit exceeded ({timeout} seconds).",
     'no_output': "✅ Execution complete (no output)",
+    'crashed': "❌ The code runner exited unexpectedly.",
+    'busy': "⏳ Every code runner is busy, try again shortly.",
     'desc': (
         "Executes the given code in the local Python environment.  "
         "Useful for quick tests or 'fast code snippet validation'.\n"
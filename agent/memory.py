@@ -1,83 +1,310 @@
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from langchain_core.messages import (
     HumanMessage,
-    AIMessage,
-    messages_to_dict,
-    messages_from_dict
+    AIMessage
 )
 from agent.chains import EntityMemoryChain, SummaryChain
-from agent.utils import load_chat_memory, save_chat_memory
+from agent.report import record_stage
+from agent.tokens import TokenCounter, get_token_counter
+from agent.store import ConversationStore, get_conversation_store
 from agent.utils import load_locale_const
 const = load_locale_const()
 MEMORY_CONST = const.MEMORY_CONST
 ENTITY_MEMORY_CONST = const.ENTITY_MEMORY_CONST
 
+_active_memory_var: ContextVar["Memory | None"] = ContextVar("active_memory", default=None)
+
+@contextmanager
+def using_memory(memory: "Memory"):
+    """Make ``memory`` the conversation memory of the enclosed block, for tools that need the chat history."""
+    token = _active_memory_var.set(memory)
+    try:
+        yield memory
+    finally:
+        _active_memory_var.reset(token)
+
+def active_memory() -> "Memory | None":
+    return _active_memory_var.get()
+
+MEMORY_WORKERS = int(os.getenv("MEMORY_WORKERS", "4"))
+_background_executor: ThreadPoolExecutor | None = None
+_background_executor_lock = threading.Lock()
+
+def get_background_executor() -> ThreadPoolExecutor:
+    """
+    Worker threads shared by the summarization and entity extraction of every session.
+    Each memory runs at most one job at a time, so a session's jobs never overlap.
+    """
+    global _background_executor
+    with _background_executor_lock:
+        if _background_executor is None:
+            _background_executor = ThreadPoolExecutor(max_workers=MEMORY_WORKERS, thread_name_prefix="memory")
+        return _background_executor
+
+def format_messages(messages) -> str:
+    result = []
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            result.append(f' - Human: "{msg.content}"')
+        elif isinstance(msg, AIMessage):
+            result.append(f' - AI: "{msg.content}"')
+    return '\n'.join(result)
+
 class Memory:
-    def __init__(self, max_tokens=64000):
+    """
+    Conversation history of a session with rolling summarization.
+
+    When the history grows past ``max_tokens``, everything but the last ``keep_recent_turns``
+    turns is folded into a single summary message by ``SummaryChain``. The previous summary is
+    one of the folded messages, so each compaction only summarizes what was added since.
+    With ``is_background=True`` compaction runs in a worker thread and the next turn does
+    not wait for it; messages added meanwhile are kept. It runs in a copy of the context of the
+    turn that triggered it, so its ``Summary`` stage and LLM usage go to that turn's report.
+
+    Args:
+        max_tokens (int): Token budget that triggers compaction.
+        token_counter (TokenCounter | None): Defaults to :func:`agent.tokens.get_token_counter`.
+        keep_recent_turns (int): Number of recent (Human, AI) turns kept verbatim.
+        is_background (bool): Compact in a worker thread instead of inside ``extend``.
+        session_id (str): Key of the session's history in the conversation store.
+        store (ConversationStore | None): Defaults to :func:`agent.store.get_conversation_store`.
+        load_limit (int): Number of most recent stored messages loaded at start.
+        summary_chain (SummaryChain | None): Chain to summarize with, e.g. one shared by several sessions. A new one by default.
+    """
+    def __init__(self, max_tokens=64000, token_counter: TokenCounter | None = None, keep_recent_turns: int = 2, is_background: bool = True,
+                 session_id: str = "default", store: ConversationStore | None = None, load_limit: int = 64,
+                 summary_chain: SummaryChain | None = None):
+        self.session_id = session_id
+        self.store = store
+        self.load_limit = load_limit
         self.memory = []
+        self._unsaved = [] # Messages added since the last save_memory
+        self._is_cleared = False # Whether the stored history must be dropped on the next save_memory
         self.load_memory()
         
+        self.token_counter = token_counter or get_token_counter()
         self.tokens = self._count_tokens(self.memory)
         self.max_tokens = max_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.is_background = is_background
         self.summary_input = [HumanMessage(content=MEMORY_CONST['summary_input'])]
-        self.summary_chain = SummaryChain()
+        self.summary_chain = summary_chain or SummaryChain()
+
+        self._lock = threading.Lock()
+        self._generation = 0 # Bumped by clear_memory so that a running compaction is discarded
+        self._compaction: Future | None = None
         
     def __repr__(self):
-        result = []
-        for msg in self.memory:
-            if isinstance(msg, HumanMessage):
-                result.append(f' - Human: "{msg.content}"')
-            elif isinstance(msg, AIMessage):
-                result.append(f' - AI: "{msg.content}"')
-        return '\n'.join(result)
+        return format_messages(self.memory)
     
-    def _summarizing(self, is_reset_memory=False):
-        out = self.summary_chain.invoke({"memory": self.memory, "input": self.summary_input})
-        summary_message = AIMessage(content=out)
-        if is_reset_memory: 
-            self.memory = [summary_message] # Hard Reset
-            self.tokens = self._count_tokens(self.memory)
-        return summary_message
+    def _summarizing(self, messages):
+        with record_stage("Summary"):
+            out = self.summary_chain.invoke({"memory": messages, "input": self.summary_input})
+        return AIMessage(content=out)
         
     def _count_tokens(self, msgs):
-        return sum(len(msg.content) for msg in msgs)
+        return self.token_counter.count_messages(msgs)
+
+    def _next_segment(self):
+        # Messages to fold into the summary, or None if the memory is within budget or only the summary can be folded.
+        if self.tokens <= self.max_tokens:
+            return None
+        segment = self.memory[:max(len(self.memory) - 2*self.keep_recent_turns, 0)]
+        return segment if len(segment) >= 2 else None
+
+    def _compact(self, generation):
+        while True:
+            with self._lock:
+                segment = self._next_segment() if generation == self._generation else None
+            if segment is None:
+                return
+            summary_message = self._summarizing(segment)
+            with self._lock:
+                # Drop the result if the memory was cleared or replaced while summarizing.
+                if generation != self._generation or any(a is not b for a, b in zip(self.memory, segment)):
+                    return
+                self.memory = [summary_message] + self.memory[len(segment):]
+                self.tokens = self._count_tokens(self.memory)
+    
+    def _schedule_compaction(self):
+        with self._lock:
+            if self.is_compacting or self._next_segment() is None:
+                return
+            generation = self._generation
+        if not self.is_background:
+            self._compact(generation)
+            return
+        self._compaction = get_background_executor().submit(contextvars.copy_context().run, self._compact, generation)
+        self._compaction.add_done_callback(self._report_compaction_error)
+
+    @staticmethod
+    def _report_compaction_error(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            print("[memory] summarization failed, keeping full history:", future.exception())
+
+    @property
+    def is_compacting(self) -> bool:
+        return self._compaction is not None and not self._compaction.done()
+
+    def wait_compaction(self, timeout: float | None = None):
+        """Block until the running background compaction, if any, has finished."""
+        if self._compaction is not None:
+            wait([self._compaction], timeout)
     
     def extend(self, message_sequence):
-        self.memory.extend(message_sequence)
-        self.tokens += self._count_tokens(message_sequence)
-        
-        if self.tokens > self.max_tokens:
-            self._summarizing(is_reset_memory=True)
+        with self._lock:
+            self.memory.extend(message_sequence)
+            self._unsaved.extend(message_sequence)
+            self.tokens += self._count_tokens(message_sequence)
+        self._schedule_compaction()
             
+    def _store(self) -> ConversationStore:
+        if self.store is None:
+            self.store = get_conversation_store()
+        return self.store
+
     def load_memory(self):
+        """Load the most recent ``load_limit`` messages of the session, after importing the legacy ``chat_memory.yaml`` into an empty one."""
         try:
-            messages_dict = load_chat_memory()
-            if messages_dict is not None:
-                self.memory = messages_from_dict(messages_dict)
+            self._store().import_legacy(self.session_id)
+            self.memory, _ = self._store().page(self.session_id, self.load_limit)
         except Exception as e:
             return MEMORY_CONST['load_error_message'].format(e=e)
     
     def save_memory(self):
+        """
+        Queue the messages added since the previous save for appending to the session's stored history.
+        The write happens in the background; use :meth:`flush` to wait for it. If earlier writes are
+        failing, the save stays queued for retry and the error message is returned.
+        """
         try:
-            messages_dict = messages_to_dict(self.memory)
-            import asyncio
-            asyncio.create_task(save_chat_memory(messages_dict))
+            with self._lock:
+                unsaved, is_cleared = self._unsaved, self._is_cleared
+                self._unsaved, self._is_cleared = [], False
+            writer = self._store().writer()
+            if unsaved or is_cleared:
+                writer.submit(self.session_id, unsaved, is_clear=is_cleared)
+            if writer.error is not None:
+                return MEMORY_CONST['save_error_message'].format(e=writer.error)
         except Exception as e:
             return MEMORY_CONST['save_error_message'].format(e=e)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Block until the queued saves are written. Returns ``False`` if a write failed (the saves stay
+        queued for retry; see ``self.store.writer().error``) or ``timeout`` expired first.
+        """
+        return self._store().writer().flush(timeout)
     
     def clear_memory(self):
-        self.memory = []
-        self.tokens = 0
+        with self._lock:
+            self._generation += 1
+            self.memory = []
+            self._unsaved = []
+            self._is_cleared = True
+            self.tokens = 0
     
     
 class EntityMemory:
-    def __init__(self):
+    """
+    Entities worth remembering, extracted from the conversation by ``EntityMemoryChain``.
+
+    Each extraction only sends the messages added since the previous one and merges the
+    returned delta into :attr:`entity_memory` (a ``None`` value removes an entity).
+    :meth:`schedule` runs extractions in a worker thread, ``debounce`` seconds after the call
+    so that rapid turns are coalesced into one call. The wait is a timer; a worker is only taken
+    once the extraction runs. It runs in a copy of the context of the latest scheduling turn,
+    so its ``EntityMemory`` stage and LLM usage go to that turn's report.
+
+    Args:
+        debounce (float): Seconds to wait for further turns before extracting.
+        entity_memory_chain (EntityMemoryChain | None): Chain to extract with, e.g. one shared by several sessions. A new one by default.
+    """
+    def __init__(self, debounce: float = 0.5, entity_memory_chain: EntityMemoryChain | None = None):
         self.entity_memory = {}
-        self.entity_memory_chain = EntityMemoryChain()
+        self.entity_memory_chain = entity_memory_chain or EntityMemoryChain()
         self.query_input_templeate = ENTITY_MEMORY_CONST['query_input_templeate']
+        self.debounce = debounce
+
+        self._last_message = None # Last message already extracted from
+        self._lock = threading.Lock()
+        self._job: Future | None = None # Resolved once no extraction is pending
+        self._timer: threading.Timer | None = None
+        self._is_dirty = False
+        self._pending_memory = None
+        self._pending_context: contextvars.Context | None = None
+
+    def _new_messages(self, messages):
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i] is self._last_message:
+                return messages[i+1:]
+        return messages # Memory was cleared or summarized past the last extraction
         
     def query(self, memory):
-        query_input = [HumanMessage(self.query_input_templeate.format(memory=memory, entity_memory=self.entity_memory))]
-        out = self.entity_memory_chain.invoke({"input": query_input})
-        self.entity_memory = out.entities
-        
-        
\ No newline at end of file
+        """Extract entities from the messages of ``memory`` added since the previous extraction."""
+        with record_stage("EntityMemory"):
+            new_messages = self._new_messages(memory.memory)
+            if not new_messages:
+                return
+            query_input = [HumanMessage(self.query_input_templeate.format(memory=format_messages(new_messages), entity_memory=self.entity_memory))]
+            out = self.entity_memory_chain.invoke({"input": query_input})
+            entity_memory = {**self.entity_memory, **out.entities}
+            self.entity_memory = {k: v for k, v in entity_memory.items() if v is not None} # Swapped, never mutated: ToolChain may be reading it
+            self._last_message = new_messages[-1]
+
+    def schedule(self, memory):
+        """Extract from ``memory`` in the background. Calls made while an extraction is pending are coalesced."""
+        with self._lock:
+            self._pending_memory = memory
+            self._pending_context = contextvars.copy_context()
+            if self._job is not None and not self._job.done():
+                self._is_dirty = True # Picked up by the pending extraction, or by one more after it
+                return
+            self._job = Future()
+            self._job.add_done_callback(self._report_error)
+            self._start_timer()
+
+    def _start_timer(self):
+        # Called with the lock held
+        self._is_dirty = False
+        self._timer = threading.Timer(self.debounce, self._submit)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _submit(self):
+        try:
+            get_background_executor().submit(self._run)
+        except BaseException as e: # Executor shut down
+            with self._lock:
+                self._job.set_exception(e)
+
+    def _run(self):
+        with self._lock:
+            self._is_dirty = False
+            memory, context = self._pending_memory, self._pending_context
+        try:
+            context.run(self.query, memory)
+        except BaseException as e:
+            with self._lock:
+                self._job.set_exception(e)
+            return
+        with self._lock:
+            if self._is_dirty:
+                self._start_timer()
+            else:
+                self._job.set_result(None)
+
+    @staticmethod
+    def _report_error(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            print("[memory] entity extraction failed:", future.exception())
+
+    def wait(self, timeout: float | None = None):
+        """Block until the scheduled extraction, if any, has finished."""
+        if self._job is not None:
+            wait([self._job], timeout)
@@ -7,4 +7,6 @@ class ChainConfig:
     name: str
     yaml: Optional[Path]
     model_family: str = "openai"
-    model_name: str  = "gpt-4o-mini"
\ No newline at end of file
+    model_name: str  = "gpt-4o-mini"
+    is_cache: bool = False # Answer repeated requests from the LLM response cache
+    cache_ttl: Optional[float] = None # Seconds; defaults to LLM_CACHE_TTL
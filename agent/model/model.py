@@ -10,7 +10,8 @@ class Plan(BaseModel):
 
     Args:
         plan (List[Dict[str, Any]]): List of dictionaries representing the steps of the plan.
-            Each dictionary includes 'tool' (the action to perform) and 'message' (additional notes).
+            Each dictionary includes 'tool' (the action to perform) and 'message' (additional notes),
+            and optionally 'depends_on' (earlier 1-based step numbers whose output the step needs).
     """
     
     plan: list[Dict[str, Any]] = Field(
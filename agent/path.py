@@ -5,6 +5,7 @@ LOCALE = os.getenv("LOCALE")
 BASE_DIR   = Path(__file__).resolve().parent
 MEMORY_DIR = BASE_DIR / 'memory'
 IMAGE_DIR  = MEMORY_DIR / 'image'
+VECTOR_DIR = MEMORY_DIR / 'vector'
 
 LOCALE_DIR = BASE_DIR / 'locale' / LOCALE
 PROMPT_DIR = LOCALE_DIR / 'prompts'
@@ -14,4 +15,5 @@ LOCALE_DIR.mkdir(parents=True, exist_ok=True)
 PROMPT_DIR.mkdir(parents=True, exist_ok=True)
 DESC_DIR.mkdir(parents=True, exist_ok=True)
 MEMORY_DIR.mkdir(parents=True, exist_ok=True)
-IMAGE_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+VECTOR_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
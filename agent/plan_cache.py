@@ -0,0 +1,176 @@
+"""
+Cache of PlanChain output for repeated queries. Opt-in: pass ``use_plan_cache=True`` to the
+agent or its :class:`~agent.runtime.AgentRuntime`.
+
+A plan is stored after it led to an accepted answer on the first attempt, and looked up before
+planning, whatever the chat history. It is keyed on what the plan depends on besides the
+history: the normalized query (case, whitespace and trailing punctuation folded) and the
+entities of the session's entity memory that the query mentions. A query about "Seoul" is
+therefore planned once per remembered context of Seoul, while "what time is it?" hits the same
+entry in every session. A plan whose steps mention a remembered entity that the query does not
+(e.g. a name recalled from the history) is never stored, so it cannot reach another session.
+
+Lookups go through two tiers:
+
+1. exact: the key above;
+2. similarity (optional, queries mentioning no entity): the cosine similarity of the query's
+   embedding to a stored query's, at or above ``similarity_threshold``.
+
+The whole cache is dropped when the locale bundle (prompts and tool descriptions) or the
+registered tool descriptions change, and a hit whose steps name a tool that is no longer
+registered is evicted instead of returned.
+"""
+from __future__ import annotations
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Container, Mapping, Optional
+
+import numpy as np
+
+from agent.bundle import get_locale_bundle
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.casefold().split()).rstrip(" .!?。？！")
+
+def _mentions(text: str, value: Any) -> bool:
+    value = normalize_query(str(value))
+    return bool(value) and f" {value} " in f" {text} "
+
+def mentioned_entities(query: str, entities: Mapping[str, Any]) -> tuple:
+    """The ``(name, value)`` pairs of ``entities`` whose name or value ``query`` mentions, sorted."""
+    text = normalize_query(query)
+    return tuple(sorted(
+        (str(name), str(value)) for name, value in entities.items() if _mentions(text, name) or _mentions(text, value)
+    ))
+
+class PlanCache:
+    """
+    LRU cache of plans keyed by normalized query and the entities it mentions.
+
+    Args:
+        max_entries (int): Number of plans kept.
+        similarity_threshold (float | None): Enables the similarity tier. Embeddings come from
+            :func:`agent.embeddings.get_embedding_backend`.
+    """
+    def __init__(self, max_entries: int = 1024, similarity_threshold: Optional[float] = None):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: OrderedDict[tuple, list[dict[str, Any]]] = OrderedDict()
+        self._vectors: dict[tuple, np.ndarray] = {}
+        self._matrix: Optional[tuple[list[tuple], np.ndarray]] = None # Stacked `_vectors`, rebuilt after changes
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "skipped": 0}
+
+    @staticmethod
+    def fingerprint() -> tuple:
+        """Identifies everything a plan depends on besides its key: the locale bundle and the tool descriptions."""
+        from agent.tool_registry import tool_descriptor_index
+
+        return (get_locale_bundle().key, tool_descriptor_index.version)
+
+    def _check_fingerprint(self):
+        fingerprint = self.fingerprint()
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                self.stats["invalidations"] += 1
+            self._clear()
+            self._fingerprint = fingerprint
+
+    def _clear(self):
+        self._entries.clear()
+        self._vectors.clear()
+        self._matrix = None
+
+    def _embed(self, query: str) -> np.ndarray:
+        from agent.embeddings import get_embedding_backend
+
+        return np.asarray(get_embedding_backend().embed([query])[0], dtype=np.float32)
+
+    def _evict(self, key: tuple):
+        self._entries.pop(key, None)
+        if self._vectors.pop(key, None) is not None:
+            self._matrix = None
+
+    def _similar_key(self, query: str) -> Optional[tuple]:
+        if not self._vectors:
+            return None
+        if self._matrix is None:
+            keys = list(self._vectors)
+            self._matrix = (keys, np.stack([self._vectors[k] for k in keys]))
+        keys, matrix = self._matrix
+        scores = matrix @ self._embed(query)
+        best = int(np.argmax(scores))
+        return keys[best] if scores[best] >= self.similarity_threshold else None
+
+    def get(self, query: str, known_tools: Container[str], entities: Mapping[str, Any] = {}) -> Optional[list[dict[str, Any]]]:
+        """
+        A copy of the cached plan for ``query``, or ``None``.
+
+        Args:
+            query (str): The user input.
+            known_tools (Container[str]): Names of the currently registered tools.
+            entities (Mapping): The session's entity memory.
+        """
+        text, mentioned = normalize_query(query), mentioned_entities(query, entities)
+        key = (text, mentioned)
+        with self._lock:
+            self._check_fingerprint()
+            tier, plan = "exact_hits", self._entries.get(key)
+            if plan is None and self.similarity_threshold is not None and not mentioned:
+                similar = self._similar_key(text)
+                tier, plan = "similar_hits", self._entries.get(similar) if similar else None
+                key = similar or key
+            if plan is not None and not all(step.get("tool") in known_tools for step in plan):
+                self._evict(key)
+                plan = None
+            if plan is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats[tier] += 1
+            return copy.deepcopy(plan)
+
+    def put(self, query: str, plan: list[dict[str, Any]], entities: Mapping[str, Any] = {}):
+        """Store ``plan`` for ``query``, unless its steps mention an entity of ``entities`` that the query does not."""
+        if not plan:
+            return
+        text, mentioned = normalize_query(query), mentioned_entities(query, entities)
+        steps = normalize_query(" ".join(str(step.get(k, "")) for step in plan for k in ("message", "tool_input")))
+        if any(_mentions(steps, value) for name, value in entities.items() if (str(name), str(value)) not in mentioned):
+            with self._lock:
+                self.stats["skipped"] += 1
+            return
+        key = (text, mentioned)
+        vector = self._embed(text) if self.similarity_threshold is not None and not mentioned else None
+        with self._lock:
+            self._check_fingerprint()
+            self._entries[key] = copy.deepcopy(plan)
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors[key] = vector
+                self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+            self.stats["stores"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self.stats["invalidations"] += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+_default_cache: Optional[PlanCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_plan_cache() -> PlanCache:
+    """The process-wide plan cache shared by the agents that opt in (exact tier only)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PlanCache()
+        return _default_cache
@@ -0,0 +1,177 @@
+"""
+Opt-in per-turn performance report for the plan agents.
+
+A :class:`ChatReport` is activated for the duration of a ``chat`` call with
+:func:`reporting`. While it is active, :func:`record_stage` appends wall-clock timings
+and every chat model run is picked up by :class:`UsageCallbackHandler` through a
+LangChain configure hook, so chains do not need to pass callbacks explicitly.
+Both live in context variables and therefore follow ``await`` and ``asyncio.to_thread``,
+and the background memory jobs, which run in a copy of the scheduling turn's context.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+# Tags given to each chain's LLM in agent.chains
+CHAIN_TAGS = ("Plan", "Tool", "Validation", "Response", "Vision", "Summary", "EntityMemory")
+RETRY_TAG_PREFIX = "retry:attempt:"
+
+@dataclass
+class StageTiming:
+    name: str
+    elapsed: float
+    info: dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class LLMUsage:
+    calls: int = 0
+    retries: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+@dataclass
+class ChatReport:
+    """
+    Timings and LLM usage of a single ``chat`` turn.
+
+    Args:
+        total (float): Wall time of the whole turn in seconds.
+        stages (list[StageTiming]): Timings in completion order. Stage names are
+            ``Plan``, ``Tool`` (all plan steps of an attempt), ``ToolStep`` (one per plan step),
+            ``ToolCall`` (tool execution), ``Validation``, ``Response``, ``Summary`` and
+            ``EntityMemory``. ``ToolStep`` is nested in ``Tool`` and ``ToolCall`` in ``ToolStep``.
+            Plan steps may overlap in the async agent. ``Summary`` and ``EntityMemory`` run in
+            the background and are appended to the report of the turn that scheduled them when
+            they finish, possibly after ``chat`` returned; they are not part of ``total``.
+        llm_usage (dict[str, LLMUsage]): Calls, retries and tokens keyed by chain tag.
+    """
+    total: float = 0.0
+    stages: list[StageTiming] = field(default_factory=list)
+    llm_usage: dict[str, LLMUsage] = field(default_factory=dict)
+
+    @property
+    def attempts(self) -> int:
+        return sum(1 for s in self.stages if s.name == "Plan")
+
+    @property
+    def tool_timings(self) -> list[StageTiming]:
+        return [s for s in self.stages if s.name == "ToolCall"]
+
+    @property
+    def tool_chain_retries(self) -> int:
+        return self.llm_usage.get("Tool", LLMUsage()).retries
+
+    @property
+    def llm_calls(self) -> int:
+        return sum(u.calls for u in self.llm_usage.values())
+
+    @property
+    def input_tokens(self) -> int:
+        return sum(u.input_tokens for u in self.llm_usage.values())
+
+    @property
+    def output_tokens(self) -> int:
+        return sum(u.output_tokens for u in self.llm_usage.values())
+
+    def stage_totals(self) -> dict[str, float]:
+        """Sum of the elapsed time per stage name."""
+        totals: dict[str, float] = {}
+        for s in self.stages:
+            totals[s.name] = totals.get(s.name, 0.0) + s.elapsed
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "attempts": self.attempts,
+            "tool_chain_retries": self.tool_chain_retries,
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Counts chat model calls, retries and token usage of a report, per chain tag."""
+    run_inline = True
+
+    def __init__(self, report: ChatReport):
+        self.report = report
+        self._lock = threading.Lock()
+        self._runs: dict[UUID, str] = {}
+        self._retry_runs: set[UUID] = set()
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, tags: Optional[list[str]] = None, **kwargs):
+        # RunnableRetry tags the child run of every attempt after the first one.
+        if any(t.startswith(RETRY_TAG_PREFIX) for t in tags or []):
+            with self._lock:
+                self._retry_runs.add(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, parent_run_id: Optional[UUID] = None, tags: Optional[list[str]] = None, **kwargs):
+        chain = next((t for t in tags or [] if t in CHAIN_TAGS), "Other")
+        with self._lock:
+            self._runs[run_id] = chain
+            usage = self.report.llm_usage.setdefault(chain, LLMUsage())
+            usage.calls += 1
+            if parent_run_id in self._retry_runs:
+                usage.retries += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs):
+        with self._lock:
+            chain = self._runs.pop(run_id, None)
+            if chain is None:
+                return
+            usage = self.report.llm_usage[chain]
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                    if metadata:
+                        usage.input_tokens += metadata.get("input_tokens", 0)
+                        usage.output_tokens += metadata.get("output_tokens", 0)
+
+
+_report_var: ContextVar[Optional[ChatReport]] = ContextVar("chat_report", default=None)
+_usage_handler_var: ContextVar[Optional[UsageCallbackHandler]] = ContextVar("chat_report_usage", default=None)
+register_configure_hook(_usage_handler_var, inheritable=True)
+
+@contextmanager
+def reporting(report: Optional[ChatReport]):
+    """
+    Activate ``report`` for the enclosed block. ``None`` keeps reporting disabled.
+    The report's ``total`` is set to the wall time of the block.
+    """
+    if report is None:
+        yield None
+        return
+    report_token = _report_var.set(report)
+    handler_token = _usage_handler_var.set(UsageCallbackHandler(report))
+    start = time.perf_counter()
+    try:
+        yield report
+    finally:
+        report.total = time.perf_counter() - start
+        _usage_handler_var.reset(handler_token)
+        _report_var.reset(report_token)
+
+@contextmanager
+def record_stage(name: str, **info):
+    """Time the enclosed block as stage ``name`` of the active report, if any."""
+    report = _report_var.get()
+    if report is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        report.stages.append(StageTiming(name, time.perf_counter() - start, info))
@@ -0,0 +1,33 @@
+"""
+Chains and caches that do not depend on the session, shared by the agents built on them.
+
+Building a chain loads its prompt and creates its chat model client, so an :class:`AgentRuntime`
+is built once and passed to every ``PlanAgent`` of a process (see :mod:`agent.server`); an
+agent itself then only holds its session state: memory, entity memory and the save flag. The
+chains are stateless between calls and safe to use from concurrent turns.
+"""
+from __future__ import annotations
+
+from agent.chains import EntityMemoryChain, PlanChain, ResponseChain, SummaryChain, ToolChain, ValidationChain
+from agent.plan_cache import get_plan_cache
+from agent.tokens import TokenCounter, get_token_counter
+
+class AgentRuntime:
+    """
+    The session-independent part of a ``PlanAgent``.
+
+    Args:
+        is_stream (bool): Stream the ResponseChain's tokens.
+        use_plan_cache (bool): Reuse plans through :func:`agent.plan_cache.get_plan_cache`. Off by default.
+        token_counter (TokenCounter | None): Token counter of the agents' memories. Resolved here, once,
+            from :func:`agent.tokens.get_token_counter` by default, so no turn has to load an encoding.
+    """
+    def __init__(self, is_stream: bool = True, use_plan_cache: bool = False, token_counter: TokenCounter | None = None):
+        self.plan_chain = PlanChain()
+        self.tool_chain = ToolChain()
+        self.validation_chain = ValidationChain()
+        self.response_chain = ResponseChain(is_stream=is_stream)
+        self.summary_chain = SummaryChain()
+        self.entity_memory_chain = EntityMemoryChain()
+        self.plan_cache = get_plan_cache() if use_plan_cache else None
+        self.token_counter = token_counter or get_token_counter()
@@ -0,0 +1,397 @@
+"""
+Pool of warm Python worker processes that run ``execute_code`` snippets.
+
+Starting an interpreter per snippet costs tens of milliseconds, and much more when the snippet
+imports ``numpy`` or ``pandas``. A :class:`SandboxPool` keeps ``size`` workers started ahead of
+time, with the modules in ``SANDBOX_PRELOAD`` already imported. A snippet is sent to an idle
+worker over its stdin pipe as a length-prefixed JSON frame; the worker runs it in fresh globals
+with ``sys.stdout``/``sys.stderr`` captured and sends both back. A call then costs a pipe round
+trip instead of a process start.
+
+A worker only runs the snippets of one session (the ``session`` key passed by the caller;
+callers without one share their own workers). A snippet starts from fresh globals, but what it
+leaves in imported modules, the working directory or the environment stays visible to the next
+snippets of its session, as in a notebook kernel, and never to another session. Once a worker
+has run a snippet, it stays idle for its session; when ``max_workers`` are live, the least
+recently used idle worker of a session is closed to make room for an unused one.
+
+Workers are replaced:
+
+- after ``max_runs`` snippets, so state a session leaves behind does not live on indefinitely;
+- when a snippet exceeds its timeout: the worker is killed and the call raises ``TimeoutError``;
+- when a worker dies: the call raises :class:`SandboxCrashed`.
+
+Each worker process is started by the worker's own reader thread, so neither the pool lock
+nor the caller (nor the event loop, in :meth:`SandboxPool.arun`) waits for a process to
+start; callers wait on the worker's ``ready`` future instead. Replacements are started in the
+background. If no worker is available, the call starts a cold worker of its own, up to
+``max_workers`` live workers in all; past that it waits for a worker to become free and raises
+:class:`SandboxBusy` after ``acquire_timeout`` seconds. :meth:`SandboxPool.arun` is the async
+counterpart of :meth:`SandboxPool.run` and never blocks the event loop, neither while waiting
+for a worker nor while a snippet runs.
+
+Workers are separate processes but are not otherwise isolated: they run with the user's
+permissions, like the interpreter that spawned them.
+"""
+from __future__ import annotations
+
+import asyncio
+import atexit
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import IO, Optional
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_MAX_WORKERS = int(os.getenv("SANDBOX_MAX_WORKERS", "8"))
+SANDBOX_MAX_RUNS = int(os.getenv("SANDBOX_MAX_RUNS", "50"))
+SANDBOX_PRELOAD = [m for m in os.getenv("SANDBOX_PRELOAD", "numpy").split(",") if m]
+OUTPUT_LIMIT = 4000 # Characters of stdout and of stderr sent back per snippet
+
+_HEADER = struct.Struct(">I")
+
+# Run with `python -c`. The protocol uses private duplicates of fds 0 and 1; the real fds are
+# pointed at /dev/null so a snippet cannot read or corrupt the frames.
+_WORKER_SOURCE = r'''
+import contextlib, importlib, io, json, linecache, os, struct, sys, traceback
+
+_HEADER = struct.Struct(">I")
+_LIMIT = int(sys.argv[1])
+_in, _out = os.fdopen(os.dup(0), "rb"), os.fdopen(os.dup(1), "wb")
+_null = os.open(os.devnull, os.O_RDWR)
+os.dup2(_null, 0)
+os.dup2(_null, 1)
+sys.stdin = open(os.devnull)
+
+def _send(obj):
+    data = json.dumps(obj).encode("utf-8")
+    _out.write(_HEADER.pack(len(data)) + data)
+    _out.flush()
+
+def _recv():
+    head = _in.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        return None
+    return json.loads(_in.read(_HEADER.unpack(head)[0]))
+
+for _name in sys.argv[2:]:
+    try:
+        importlib.import_module(_name)
+    except Exception:
+        pass
+_send({"ready": True})
+
+while (_request := _recv()) is not None:
+    _code = _request["code"]
+    linecache.cache["<sandbox>"] = (len(_code), None, _code.splitlines(True), "<sandbox>")
+    _stdout, _stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(_stdout), contextlib.redirect_stderr(_stderr):
+        try:
+            exec(compile(_code, "<sandbox>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+        except SystemExit as e:
+            if e.code is not None and not isinstance(e.code, int):
+                print(e.code, file=sys.stderr)
+        except BaseException as e:
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next) # Drop this loop's frame
+    _send({"stdout": _stdout.getvalue()[:_LIMIT], "stderr": _stderr.getvalue()[:_LIMIT]})
+'''
+
+class SandboxCrashed(RuntimeError):
+    """Raised when a worker exits or fails to start before returning a result."""
+
+class SandboxBusy(RuntimeError):
+    """Raised when ``max_workers`` workers are busy and none became free in time."""
+
+def _read_frame(stream: IO[bytes]) -> Optional[dict]:
+    head = stream.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        return None
+    return json.loads(stream.read(_HEADER.unpack(head)[0]))
+
+class _Worker:
+    """
+    One worker process. Its reader thread starts the process, so creating a worker never blocks,
+    then resolves ``ready`` and the pending result from its frames.
+    """
+    def __init__(self, preload: list[str]):
+        self.preload = preload
+        self.proc: Optional[subprocess.Popen] = None
+        self.runs = 0
+        self.session: Optional[str] = None # Whose snippets it has run
+        self.ready: Future = Future()
+        self._result: Optional[Future] = None
+        self._is_closed = False
+        self._reader = threading.Thread(target=self._read, name="sandbox-reader", daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, "-c", _WORKER_SOURCE, str(OUTPUT_LIMIT), *self.preload],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            self.ready.set_exception(SandboxCrashed(f"sandbox worker did not start: {e}"))
+            return
+        if self._is_closed: # Closed while starting
+            self.proc.kill()
+        try:
+            while (frame := _read_frame(self.proc.stdout)) is not None:
+                # A future may have been cancelled by a caller that gave up waiting
+                if frame.get("ready"):
+                    if not self.ready.done():
+                        self.ready.set_result(None)
+                    continue
+                result, self._result = self._result, None
+                if result is not None and not result.done():
+                    result.set_result(frame["stdout"] + frame["stderr"])
+        except Exception:
+            pass
+        finally:
+            error = SandboxCrashed(f"sandbox worker exited with code {self.proc.poll()}")
+            for future in (self.ready, self._result):
+                if future is not None and not future.done():
+                    future.set_exception(error)
+
+    def is_alive(self) -> bool:
+        if self.proc is None:
+            return not self.ready.done() # Still starting, unless starting failed
+        return self.proc.poll() is None
+
+    def submit(self, code: str) -> Future:
+        """Send ``code`` to the worker once ``ready``. The returned future resolves to its stdout followed by its stderr."""
+        result = self._result = Future()
+        data = json.dumps({"code": code}).encode("utf-8")
+        try:
+            self.proc.stdin.write(_HEADER.pack(len(data)) + data)
+            self.proc.stdin.flush()
+        except OSError:
+            if not result.done():
+                result.set_exception(SandboxCrashed("sandbox worker is gone"))
+        return result
+
+    def close(self):
+        """Let the worker exit after its current snippet."""
+        self._is_closed = True
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def kill(self):
+        self._is_closed = True
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.wait()
+
+class SandboxPool:
+    """
+    Warm workers for :func:`agent.tools.code.execute_code`. Thread-safe.
+
+    Args:
+        size (int): Number of unused idle workers kept started.
+        max_runs (int): Snippets a worker runs before it is replaced.
+        preload (list[str]): Modules imported by each worker before its first snippet. Missing ones are skipped.
+        startup_timeout (float): Seconds to wait for a worker to finish starting, not counted in a snippet's timeout.
+        max_workers (int): Live workers (idle, starting or running a snippet) at most. At least ``size``.
+        acquire_timeout (float): Seconds a call waits for a free worker when ``max_workers`` are busy,
+            not counted in a snippet's timeout.
+    """
+    def __init__(
+        self,
+        size: int = SANDBOX_WORKERS,
+        max_runs: int = SANDBOX_MAX_RUNS,
+        preload: Optional[list[str]] = None,
+        startup_timeout: float = 30.0,
+        max_workers: int = SANDBOX_MAX_WORKERS,
+        acquire_timeout: float = 30.0,
+    ):
+        self.size = size
+        self.max_runs = max_runs
+        self.preload = SANDBOX_PRELOAD if preload is None else preload
+        self.startup_timeout = startup_timeout
+        self.max_workers = max(max_workers, size)
+        self.acquire_timeout = acquire_timeout
+        self.stats = {"runs": 0, "cold_starts": 0, "recycled": 0, "killed": 0, "crashed": 0, "waits": 0, "busy": 0, "evicted": 0}
+        self._idle: list[_Worker] = [] # Least recently used first
+        self._live = 0 # Workers started and not yet closed or killed
+        self._lock = threading.Lock()
+        self._freed = threading.Condition(self._lock) # Notified when a worker becomes idle or a slot is released
+        self._is_closed = False
+        self._fill()
+
+    def _evict(self) -> Optional[_Worker]:
+        # Called with the lock held. Takes the least recently used idle worker of a session out of the pool; its slot is reused.
+        worker = next((w for w in self._idle if w.runs), None)
+        if worker is not None:
+            self._idle.remove(worker)
+            self.stats["evicted"] += 1
+        return worker
+
+    def _fill(self):
+        """Start workers until ``size`` unused ones are idle. At ``max_workers``, idle workers of sessions make room."""
+        while True:
+            with self._lock:
+                if self._is_closed or sum(not w.runs for w in self._idle) >= self.size:
+                    return
+                if self._live < self.max_workers:
+                    self._live += 1
+                    evicted = None
+                elif (evicted := self._evict()) is None:
+                    return
+                self._idle.append(_Worker(self.preload)) # Starts in its own thread
+                self._freed.notify()
+            if evicted is not None:
+                evicted.close()
+
+    def _try_acquire(self, session: Optional[str]) -> tuple[Optional[_Worker], Optional[_Worker]]:
+        """
+        Called with the lock held. ``(worker, None)`` for an idle worker of ``session`` or an unused one; else
+        ``(None, evicted)`` with a slot reserved for a cold start, taken from the evicted idle worker of another
+        session if any. Raises if there is neither.
+        """
+        for worker in [w for w in self._idle if not w.is_alive()]:
+            self._idle.remove(worker)
+            self._live -= 1
+        worker = next((w for w in reversed(self._idle) if w.runs and w.session == session), None) \
+            or next((w for w in self._idle if not w.runs), None)
+        if worker is not None:
+            self._idle.remove(worker)
+            return worker, None
+        if self._live < self.max_workers:
+            self._live += 1
+            self.stats["cold_starts"] += 1
+            return None, None
+        evicted = self._evict()
+        if evicted is not None:
+            self.stats["cold_starts"] += 1
+            return None, evicted
+        raise SandboxBusy(f"all {self.max_workers} sandbox workers are busy")
+
+    def _acquire(self, session: Optional[str], timeout: Optional[float] = None) -> _Worker:
+        """A worker for ``session`` (see :meth:`_try_acquire`), or wait up to ``timeout`` (default: ``acquire_timeout``) for one."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        with self._lock:
+            try:
+                worker, evicted = self._try_acquire(session)
+            except SandboxBusy:
+                if timeout == 0:
+                    raise
+                self.stats["waits"] += 1
+                if not self._freed.wait_for(self._is_free, timeout):
+                    self.stats["busy"] += 1
+                    raise
+                worker, evicted = self._try_acquire(session)
+        if evicted is not None:
+            evicted.close()
+        return worker or _Worker(self.preload)
+
+    def _is_free(self) -> bool:
+        return bool(self._idle) or self._live < self.max_workers
+
+    def _drop_slot(self):
+        with self._lock:
+            self._live -= 1
+            self._freed.notify()
+
+    def _release(self, worker: _Worker, session: Optional[str], outcome: str):
+        worker.runs += 1
+        worker.session = session
+        with self._lock:
+            self.stats["runs"] += 1
+            if outcome == "ok" and worker.runs < self.max_runs and not self._is_closed:
+                self._idle.append(worker)
+                self._freed.notify()
+                return
+            if outcome == "ok" and worker.runs >= self.max_runs:
+                self.stats["recycled"] += 1
+            elif outcome != "ok":
+                self.stats[outcome] += 1
+        threading.Thread(target=self._retire, args=(worker, outcome == "ok"), name="sandbox-fill", daemon=True).start()
+
+    def _retire(self, worker: _Worker, is_graceful: bool):
+        # Off the caller's thread: killing waits for the process to exit
+        if is_graceful:
+            worker.close()
+        else:
+            worker.kill()
+        self._drop_slot()
+        self._fill()
+
+    def run(self, code: str, timeout: float, session: Optional[str] = None) -> str:
+        """
+        Run ``code`` in a worker that has only run snippets of ``session`` so far.
+
+        Returns:
+            str: Captured stdout followed by captured stderr, each at most ``OUTPUT_LIMIT`` characters.
+
+        Raises:
+            TimeoutError: If ``code`` ran longer than ``timeout`` seconds. The worker is killed.
+            SandboxCrashed: If the worker exited or did not start.
+            SandboxBusy: If no worker became free within ``acquire_timeout`` seconds.
+        """
+        worker, outcome = self._acquire(session), "crashed"
+        try:
+            try:
+                worker.ready.result(self.startup_timeout)
+            except FutureTimeoutError:
+                raise SandboxCrashed("sandbox worker did not start") from None
+            try:
+                output = worker.submit(code).result(timeout)
+            except FutureTimeoutError:
+                outcome = "killed"
+                raise TimeoutError(f"snippet exceeded {timeout} seconds") from None
+            outcome = "ok"
+            return output
+        finally:
+            self._release(worker, session, outcome)
+
+    async def arun(self, code: str, timeout: float, session: Optional[str] = None) -> str:
+        """Async :meth:`run`: waits for a worker and on its pipe without blocking the event loop."""
+        try:
+            worker = self._acquire(session, timeout=0)
+        except SandboxBusy:
+            worker = await asyncio.to_thread(self._acquire, session)
+        outcome = "crashed"
+        try:
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(worker.ready), self.startup_timeout)
+            except asyncio.TimeoutError:
+                raise SandboxCrashed("sandbox worker did not start") from None
+            try:
+                output = await asyncio.wait_for(asyncio.wrap_future(worker.submit(code)), timeout)
+            except asyncio.TimeoutError:
+                outcome = "killed"
+                raise TimeoutError(f"snippet exceeded {timeout} seconds") from None
+            outcome = "ok"
+            return output
+        finally:
+            self._release(worker, session, outcome)
+
+    def close(self):
+        """Stop the idle workers. Workers still running a snippet exit when it is done."""
+        with self._lock:
+            self._is_closed = True
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+        for worker in idle:
+            worker.kill()
+
+_default_pool: Optional[SandboxPool] = None
+_default_pool_lock = threading.Lock()
+
+def get_sandbox_pool() -> SandboxPool:
+    """The process-wide pool, started on first use. Call it at startup to warm the workers early."""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
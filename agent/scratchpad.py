@@ -0,0 +1,69 @@
+"""
+Append-only working buffer of a single ``chat`` turn.
+
+Every chain of a turn sees the same growing text (input, attempts, plans, tool outputs,
+validations). Re-joining the whole line list for each chain call makes a turn quadratic
+in its length, so :class:`Scratchpad` builds the text as lines are appended: each append
+only adds its own line to the text, and every view of the buffer reuses that text. Lines
+that only one chain call sees (:meth:`Scratchpad.messages` ``extra``) go in a message of
+their own, so the buffer is never copied to add them.
+"""
+from __future__ import annotations
+
+from typing import Iterator, Optional
+
+from langchain_core.messages import HumanMessage
+
+class Scratchpad:
+    """
+    Lines of a chat turn with cached text and message views.
+
+    Args:
+        lines (Iterable[str]): Initial lines.
+    """
+    def __init__(self, lines=()):
+        self._lines: list[str] = [] # Append-only
+        self._text = ""
+        self._message: Optional[HumanMessage] = None
+        for line in lines:
+            self.append(line)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._lines)
+
+    def __getitem__(self, index):
+        return self._lines[index]
+
+    def __repr__(self) -> str:
+        return f"Scratchpad({len(self._lines)} lines)"
+
+    def append(self, line: str):
+        self._message = None
+        # Through a local, so CPython can grow the string in place when no message holds it
+        text, self._text = self._text, ""
+        text += f"\n{line}" if self._lines else line
+        self._text = text
+        self._lines.append(line)
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def text(self) -> str:
+        """The lines joined with newlines."""
+        return self._text
+
+    def message(self) -> HumanMessage:
+        """:meth:`text` as a ``HumanMessage``. The same object is returned until the next append."""
+        if self._message is None:
+            self._message = HumanMessage(content=self._text)
+        return self._message
+
+    def messages(self, *extra: str) -> list[HumanMessage]:
+        """Chain input view: ``[self.message()]``, followed by one message of the ``extra`` lines, which are not appended."""
+        if not extra:
+            return [self.message()]
+        return [self.message(), HumanMessage(content="\n".join(extra))]
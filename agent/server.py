@@ -0,0 +1,280 @@
+"""
+ASGI server for the async ``PlanAgent``.
+
+One :class:`~agent.runtime.AgentRuntime` (chains, LLM clients, plan cache) is built at start
+and shared by every session. A :class:`SessionPool` holds one lightweight agent per session
+(memory, entity memory) and drops the least recently used ones past ``max_sessions`` or
+after ``idle_timeout`` seconds without a request; a dropped session is reloaded from the
+conversation store on its next request. A session's agent is built (and its stored history read)
+on a worker thread, once even when its first requests arrive together. Turns of the same session
+run one at a time.
+
+Endpoints (JSON bodies):
+
+- ``POST /sessions/{session_id}/chat`` with ``{"message": str, "is_report": bool}``: returns
+  ``{"response": str, "report": dict | null}``.
+- ``POST /sessions/{session_id}/chat/stream``: same body; a ``text/event-stream`` of the turn's
+  events (see :mod:`agent.events`), one ``event: <type>`` / ``data: <json>`` pair per event,
+  ending with ``done``, or ``error`` if the turn failed. Disconnecting cancels the turn.
+- ``DELETE /sessions/{session_id}``: drops the session's state from the pool.
+- ``GET /health``: ``{"status": "ok", "sessions": int, "http": dict}``, ``http`` being the
+  connection-pool metrics of :meth:`agent.http_clients.HTTPClients.stats`.
+
+Run with ``python -m agent.server --host 127.0.0.1 --port 8000`` (requires ``uvicorn``), or
+serve :func:`create_app` with any ASGI server.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from agent.agraph import PlanAgent
+from agent.http_clients import get_http_clients
+from agent.runtime import AgentRuntime
+
+SESSION_ID = re.compile(r"[\w.\-]{1,128}")
+ROUTE = re.compile(r"/sessions/(?P<session_id>[^/]+)(?P<action>/chat|/chat/stream)?")
+
+class _Session:
+    __slots__ = ("agent", "lock", "last_used")
+
+    def __init__(self, agent: PlanAgent):
+        self.agent = agent
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+class SessionPool:
+    """
+    Per-session agents on a shared runtime, kept in LRU order.
+
+    Args:
+        runtime (AgentRuntime): Shared by every agent of the pool.
+        max_sessions (int): Number of sessions kept; the least recently used are dropped first.
+        idle_timeout (float): Seconds after which an unused session is dropped.
+        agent_kwargs: Passed to each ``PlanAgent`` (e.g. ``recursion_limit``, ``max_memory_tokens``).
+    """
+    def __init__(self, runtime: AgentRuntime, max_sessions: int = 1024, idle_timeout: float = 3600.0, **agent_kwargs):
+        self.runtime = runtime
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.agent_kwargs = agent_kwargs
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._building: dict[str, asyncio.Lock] = {} # Per session id while its agent is built
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self):
+        now = time.monotonic()
+        for session_id, session in list(self._sessions.items()):
+            if len(self._sessions) <= self.max_sessions and now - session.last_used <= self.idle_timeout:
+                break # LRU order: the rest were used more recently
+            if not session.lock.locked():
+                del self._sessions[session_id]
+
+    async def get(self, session_id: str) -> _Session:
+        """The session's state, created (and its stored history loaded) on first use."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = await self._build(session_id)
+        self._sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        self._evict()
+        return session
+
+    async def _build(self, session_id: str) -> _Session:
+        # Loading the memory reads the conversation store, so it runs off the event loop; requests
+        # arriving meanwhile for the same session wait for that agent instead of building another
+        lock = self._building.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                try:
+                    agent = await asyncio.to_thread(PlanAgent, session_id, runtime=self.runtime, **self.agent_kwargs)
+                finally:
+                    if self._building.get(session_id) is lock:
+                        del self._building[session_id] # Waiters still hold the lock and find the session
+                session = self._sessions[session_id] = _Session(agent)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+# --------------------------------------------------------------------------- #
+# ASGI
+# --------------------------------------------------------------------------- #
+class _HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class _Disconnected(Exception):
+    """The client left before the request body was read."""
+
+async def _read_json(receive) -> dict:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise _Disconnected()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        raise _HTTPError(400, "Body is not valid JSON.") from None
+    if not isinstance(data, dict) or not isinstance(data.get("message"), str) or not data["message"].strip():
+        raise _HTTPError(400, "Body must be a JSON object with a non-empty 'message'.")
+    return data
+
+async def _send_json(send, status: int, payload: Any):
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json; charset=utf-8"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+def _sse(event_type: str, payload: Any) -> bytes:
+    return f"event: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n".encode("utf-8")
+
+class AgentServer:
+    """
+    The ASGI application. Build it with :func:`create_app`.
+
+    Args:
+        pool (SessionPool): Sessions served by this app.
+    """
+    def __init__(self, pool: SessionPool):
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            await self._route(scope, receive, send)
+        except _HTTPError as e:
+            await _send_json(send, e.status, {"error": str(e)})
+        except _Disconnected:
+            pass
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                from agent.store import get_conversation_store
+                await get_http_clients().aclose() # The pools of this loop; the sync ones close at exit
+                writer = get_conversation_store().writer()
+                if await asyncio.to_thread(writer.flush, 10.0): # Pending memory saves
+                    await send({"type": "lifespan.shutdown.complete"})
+                else:
+                    await send({"type": "lifespan.shutdown.failed", "message": f"Unsaved chat memory: {writer.error or 'flush timed out'}"})
+                return
+
+    async def _route(self, scope, receive, send):
+        method, path = scope["method"], scope["path"].rstrip("/")
+        if path == "/health":
+            if method != "GET":
+                raise _HTTPError(405, "Method not allowed.")
+            await _send_json(send, 200, {"status": "ok", "sessions": len(self.pool), "http": get_http_clients().stats()})
+            return
+        match = ROUTE.fullmatch(path)
+        if match is None:
+            raise _HTTPError(404, "Not found.")
+        session_id, action = match["session_id"], match["action"]
+        if not SESSION_ID.fullmatch(session_id):
+            raise _HTTPError(400, "Invalid session id.")
+        if action is None:
+            if method != "DELETE":
+                raise _HTTPError(405, "Method not allowed.")
+            await _send_json(send, 200, {"dropped": self.pool.drop(session_id)})
+            return
+        if method != "POST":
+            raise _HTTPError(405, "Method not allowed.")
+        data = await _read_json(receive)
+        if action == "/chat":
+            await self._chat(session_id, data, send)
+        else:
+            await self._chat_stream(session_id, data, receive, send)
+
+    async def _chat(self, session_id: str, data: dict, send):
+        session = await self.pool.get(session_id)
+        is_report = bool(data.get("is_report"))
+        async with session.lock:
+            try:
+                result = await session.agent.chat(data["message"], is_report=is_report)
+            except Exception as e:
+                await _send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+                return
+        response, report = result if is_report else (result, None)
+        await _send_json(send, 200, {"response": response, "report": report.to_dict() if report else None})
+
+    async def _chat_stream(self, session_id: str, data: dict, receive, send):
+        session = await self.pool.get(session_id)
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache")]
+        })
+
+        async def stream():
+            async with session.lock:
+                events = session.agent.chat_stream(data["message"], is_report=bool(data.get("is_report")))
+                try:
+                    async for event in events:
+                        await send({"type": "http.response.body", "body": _sse(event.type, event.to_dict()), "more_body": True})
+                except Exception as e:
+                    await send({"type": "http.response.body", "body": _sse("error", {"error": f"{type(e).__name__}: {e}"}), "more_body": True})
+                finally:
+                    await events.aclose()
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming, watcher = asyncio.create_task(stream()), asyncio.create_task(disconnected())
+        try:
+            await asyncio.wait([streaming, watcher], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (streaming, watcher):
+                task.cancel()
+        if streaming.done() and not streaming.cancelled():
+            streaming.result()
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def create_app(runtime: Optional[AgentRuntime] = None, **pool_kwargs) -> AgentServer:
+    """
+    Build the ASGI app.
+
+    Args:
+        runtime (AgentRuntime | None): Shared chains. Built with defaults if omitted.
+        pool_kwargs: Passed to :class:`SessionPool`.
+    """
+    return AgentServer(SessionPool(runtime or AgentRuntime(), **pool_kwargs))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m agent.server", description="Serve the async PlanAgent over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-sessions", type=int, default=1024)
+    parser.add_argument("--idle-timeout", type=float, default=3600.0, help="Seconds before an unused session is dropped.")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run(create_app(max_sessions=args.max_sessions, idle_timeout=args.idle_timeout), host=args.host, port=args.port)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
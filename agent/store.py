@@ -0,0 +1,285 @@
+"""
+Persistent, per-session conversation store.
+
+Messages are kept in a SQLite database (``MEMORY_DIR/chat_memory.db``) in WAL mode, one row
+per message keyed by ``(session_id, seq)``. Saving a turn appends its messages, so saving
+costs O(turn) rather than O(history), and history is read back a page at a time. Sessions
+in other threads or processes can write at the same time: WAL lets readers run alongside
+the single writer, and writers wait for each other up to ``timeout`` seconds.
+
+Saves go through a :class:`PersistenceWriter` (``store.writer()``), which writes behind the
+turn in batched transactions; call its ``flush()`` before shutting down.
+
+Earlier versions kept a single history, shared by every session, in ``chat_memory.yaml``.
+If that file sits next to the database, it is imported once, into the first session opened
+without stored messages (see :meth:`ConversationStore.import_legacy`).
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import yaml
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from agent.path import MEMORY_DIR
+
+CHAT_MEMORY_DB = MEMORY_DIR / "chat_memory.db"
+LEGACY_CHAT_MEMORY = "chat_memory.yaml" # Saved history of earlier versions, next to the database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    session_id TEXT    NOT NULL,
+    seq        INTEGER NOT NULL,
+    message    TEXT    NOT NULL,
+    created_at REAL    NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+class ConversationStore:
+    """
+    Append-only message log keyed by session.
+
+    Args:
+        path (Path): SQLite database file. Created if missing.
+        timeout (float): Seconds to wait for another writer's lock.
+    """
+    def __init__(self, path: Path = CHAT_MEMORY_DB, timeout: float = 30.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local() # sqlite3 connections must stay in their thread
+        self._writer: Optional[PersistenceWriter] = None
+        self._writer_lock = threading.Lock()
+        self.legacy_path = self.path.with_name(LEGACY_CHAT_MEMORY)
+        self._has_legacy = self.legacy_path.exists()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn: sqlite3.Connection, session_id: str, messages: List[BaseMessage], now: float) -> None:
+        rows = [json.dumps(m, ensure_ascii=False) for m in messages_to_dict(messages)]
+        (last,) = conn.execute(
+            "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        conn.executemany(
+            "INSERT INTO messages (session_id, seq, message, created_at) VALUES (?, ?, ?, ?)",
+            [(session_id, last + 1 + i, row, now) for i, row in enumerate(rows)]
+        )
+
+    def write(self, ops: List[Tuple[str, bool, List[BaseMessage]]]) -> None:
+        """
+        Apply ``(session_id, is_clear, messages)`` operations in one transaction: the session's
+        history is deleted first if ``is_clear``, then ``messages`` are appended.
+        Either every operation is stored or none is.
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE takes the write lock up front, so the seq reads are not interleaved with another writer.
+            conn.execute("BEGIN IMMEDIATE")
+            for session_id, is_clear, messages in ops:
+                if is_clear:
+                    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                if messages:
+                    self._insert(conn, session_id, messages, now)
+
+    def append(self, session_id: str, messages: List[BaseMessage]) -> None:
+        """Append ``messages`` to the end of the session's history."""
+        if messages:
+            self.write([(session_id, False, messages)])
+
+    def clear(self, session_id: str) -> None:
+        """Delete the session's history."""
+        self.write([(session_id, True, [])])
+
+    def import_legacy(self, session_id: str) -> int:
+        """
+        Import the ``chat_memory.yaml`` history of earlier versions into ``session_id`` if the
+        session has no stored messages. The file held one history for every session, so it is
+        imported only once: it is renamed to ``chat_memory.yaml.migrated`` in the same transaction.
+
+        Returns:
+            int: Number of imported messages.
+        """
+        if not self._has_legacy:
+            return 0
+        migrated = self.legacy_path.with_name(f"{LEGACY_CHAT_MEMORY}.migrated")
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE") # Other processes wait here, then find the file already renamed
+            if not self.legacy_path.exists():
+                self._has_legacy = False
+                return 0
+            (n,) = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()
+            if n:
+                return 0
+            messages = messages_from_dict(yaml.safe_load(self.legacy_path.read_text(encoding="utf-8")) or [])
+            if messages:
+                self._insert(conn, session_id, messages, time.time())
+            os.replace(self.legacy_path, migrated)
+            self._has_legacy = False
+        return len(messages)
+
+    def writer(self) -> "PersistenceWriter":
+        """The write-behind writer of this store, started on first use."""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = PersistenceWriter(self)
+            return self._writer
+
+    def count(self, session_id: str) -> int:
+        (n,) = self._connect().execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return n
+
+    def page(self, session_id: str, limit: int = 64, before: Optional[int] = None) -> tuple[List[BaseMessage], Optional[int]]:
+        """
+        Load up to ``limit`` messages older than sequence number ``before`` (default: the newest ones).
+
+        Returns:
+            tuple[list[BaseMessage], int | None]: The messages in chronological order, and the
+            ``before`` value of the next older page, or ``None`` if there is none.
+        """
+        rows = self._connect().execute(
+            "SELECT seq, message FROM messages WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before if before is not None else 2**63 - 1, limit)
+        ).fetchall()
+        rows.reverse()
+        messages = messages_from_dict([json.loads(message) for _, message in rows])
+        next_before = rows[0][0] if rows and rows[0][0] > 0 and len(rows) == limit else None
+        return messages, next_before
+
+    def iter_pages(self, session_id: str, limit: int = 64) -> Iterator[List[BaseMessage]]:
+        """Iterate over the session's history from the newest page to the oldest."""
+        before = None
+        while True:
+            messages, before = self.page(session_id, limit, before)
+            if messages:
+                yield messages
+            if before is None:
+                return
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class PersistenceWriter:
+    """
+    Write-behind queue of a :class:`ConversationStore`.
+
+    :meth:`submit` only enqueues a snapshot of the messages, so saving never blocks a turn and
+    works the same from sync and async code. A single daemon thread writes the queue in FIFO
+    order. Operations that arrive within ``batch_delay`` seconds of each other are coalesced
+    per session and written in one transaction. Pending writes are flushed at interpreter exit.
+
+    A batch that fails to write stays queued and is retried, together with the operations
+    submitted meanwhile, after ``retry_delay`` seconds (doubling up to ``max_retry_delay``).
+    :attr:`error` holds the exception until a write succeeds again, and a :meth:`flush` waiting
+    for the batch returns ``False``.
+
+    Args:
+        store (ConversationStore): The store to write to.
+        batch_delay (float): Seconds to wait for more operations before writing a batch.
+        retry_delay (float): Seconds to wait before retrying a failed batch.
+        max_retry_delay (float): Upper bound of the doubled ``retry_delay``.
+    """
+    def __init__(self, store: ConversationStore, batch_delay: float = 0.05, retry_delay: float = 0.5, max_retry_delay: float = 30.0):
+        self.store = store
+        self.batch_delay = batch_delay
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.error: Optional[Exception] = None # Of the last write, if it failed
+        self._queue: queue.Queue = queue.Queue()
+        self._pending = 0
+        self._failed = 0 # Number of failed writes
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, session_id: str, messages: List[BaseMessage], is_clear: bool = False) -> None:
+        """Enqueue appending ``messages`` (after deleting the history if ``is_clear``) to the session."""
+        with self._cond:
+            self._pending += 1
+        self._queue.put((session_id, is_clear, list(messages)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until every operation submitted so far has been written, or the next write fails.
+
+        Returns:
+            bool: ``False`` if a write failed while waiting (see :attr:`error`; the operations stay
+            queued) or ``timeout`` expired first.
+        """
+        with self._cond:
+            failed = self._failed
+            self._cond.wait_for(lambda: self._pending == 0 or self._failed != failed, timeout)
+            return self._pending == 0
+
+    @staticmethod
+    def _coalesce(ops):
+        merged: dict[str, Tuple[bool, List[BaseMessage]]] = {}
+        for session_id, is_clear, messages in ops:
+            if is_clear:
+                merged[session_id] = (True, list(messages))
+            else:
+                prev_clear, prev_messages = merged.get(session_id, (False, []))
+                merged[session_id] = (prev_clear, prev_messages + messages)
+        return [(session_id, is_clear, messages) for session_id, (is_clear, messages) in merged.items()]
+
+    def _run(self):
+        ops, failures = [], 0
+        while True:
+            if not ops:
+                ops.append(self._queue.get())
+                time.sleep(self.batch_delay)
+            while True:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.store.write(self._coalesce(ops))
+            except Exception as e:
+                failures += 1
+                with self._cond:
+                    self.error = e
+                    self._failed += 1
+                    self._cond.notify_all()
+                time.sleep(min(self.retry_delay * 2 ** (failures - 1), self.max_retry_delay))
+                continue # The failed operations go first in the next batch
+            with self._cond:
+                self.error = None
+                self._pending -= len(ops)
+                self._cond.notify_all()
+            ops, failures = [], 0
+
+_default_store: Optional[ConversationStore] = None
+_default_store_lock = threading.Lock()
+
+def get_conversation_store() -> ConversationStore:
+    """The process-wide store at :data:`CHAT_MEMORY_DB`, opened on first use."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ConversationStore()
+        return _default_store
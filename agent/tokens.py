@@ -0,0 +1,118 @@
+"""
+Token counting for :class:`agent.memory.Memory`.
+
+A :class:`TokenCounter` counts the tokens of text and of chat messages. Message counts are
+cached by the counter (by message identity, until the message is dropped or its content is
+replaced), so a message is only tokenized once per counter.
+
+- :class:`TiktokenCounter` uses a ``tiktoken`` encoding. ``tiktoken`` downloads encodings on
+  first use; to work offline, point ``TIKTOKEN_CACHE_DIR`` at a directory that already holds the
+  encoding file.
+- :class:`ApproximateTokenCounter` needs nothing and estimates from characters.
+
+:func:`get_token_counter` picks one from the ``TOKEN_COUNTER`` env var
+(``auto`` (default), ``tiktoken`` or ``approx``). ``auto`` never touches the network: it uses
+``tiktoken`` only when ``TIKTOKEN_CACHE_DIR`` is set, and the approximation otherwise or when
+the encoding cannot be loaded. An :class:`agent.runtime.AgentRuntime` resolves the counter
+once, when it is built, and passes it to the memories of its agents.
+"""
+from __future__ import annotations
+
+import math
+import os
+import weakref
+from functools import lru_cache
+from typing import Any, Iterable
+
+from langchain_core.messages import BaseMessage
+
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "auto")
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "o200k_base")
+
+MESSAGE_OVERHEAD_TOKENS = 4 # Role and separators of a chat message
+IMAGE_TOKENS = 765 # A 1024x1024 image part at "high" detail
+
+class TokenCounter:
+    """Base class. Subclasses implement :meth:`count_text`."""
+    name = "base"
+
+    def __init__(self):
+        # id(message) -> (weak reference to it, its content, tokens). Messages are unhashable pydantic models.
+        self._counts: dict[int, tuple[weakref.ref, Any, int]] = {}
+
+    def count_text(self, text: str) -> int:
+        raise NotImplementedError("This method should be implemented in subclasses.")
+
+    def _count_content(self, content) -> int:
+        if isinstance(content, str):
+            return self.count_text(content)
+        tokens = 0
+        for part in content:
+            if isinstance(part, str):
+                tokens += self.count_text(part)
+            elif part.get("type") == "text":
+                tokens += self.count_text(part.get("text", ""))
+            elif part.get("type") in ("image_url", "image"):
+                tokens += IMAGE_TOKENS
+        return tokens
+
+    def count_message(self, message: BaseMessage) -> int:
+        """Tokens of ``message``, cached until the message is dropped or its content is replaced."""
+        key = id(message)
+        cached = self._counts.get(key)
+        if cached is not None and cached[0]() is message and cached[1] is message.content:
+            return cached[2]
+        tokens = MESSAGE_OVERHEAD_TOKENS + self._count_content(message.content)
+        self._counts[key] = (weakref.ref(message, lambda _, key=key: self._counts.pop(key, None)), message.content, tokens)
+        return tokens
+
+    def count_messages(self, messages: Iterable[BaseMessage]) -> int:
+        return sum(self.count_message(m) for m in messages)
+
+class ApproximateTokenCounter(TokenCounter):
+    """
+    About 4 ASCII characters per token and one token per other character,
+    which keeps Korean text from being undercounted.
+    """
+    name = "approx"
+
+    def count_text(self, text: str) -> int:
+        non_ascii = sum(1 for c in text if ord(c) > 127)
+        return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+class TiktokenCounter(TokenCounter):
+    """
+    Exact counts with a ``tiktoken`` encoding.
+
+    Raises:
+        Exception: If ``tiktoken`` or the encoding cannot be loaded.
+    """
+    def __init__(self, encoding_name: str = TIKTOKEN_ENCODING):
+        import tiktoken
+
+        super().__init__()
+        self.encoding = tiktoken.get_encoding(encoding_name)
+        self.name = f"tiktoken:{encoding_name}"
+
+    def count_text(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+@lru_cache(maxsize=None)
+def get_token_counter(kind: str = TOKEN_COUNTER) -> TokenCounter:
+    """
+    Shared token counter of the given kind: ``auto``, ``tiktoken`` or ``approx``.
+    ``tiktoken`` may download the encoding, so resolve it at startup rather than during a turn.
+    """
+    if kind == "approx":
+        return ApproximateTokenCounter()
+    if kind == "tiktoken":
+        return TiktokenCounter()
+    if kind != "auto":
+        raise ValueError(f"Unknown token counter: {kind}")
+    if not os.getenv("TIKTOKEN_CACHE_DIR"):
+        return ApproximateTokenCounter() # The encoding would be downloaded
+    try:
+        return TiktokenCounter()
+    except Exception as e:
+        print("[memory] tiktoken encoding unavailable, using approximate token counts:", type(e).__name__)
+        return ApproximateTokenCounter()
@@ -0,0 +1,124 @@
+"""
+Result cache of common tools that call external APIs.
+
+A tool opts in at registration with a :class:`ToolCachePolicy`::
+
+    @common_tool_registry(name_or_callable="web_search", description=..., cache=ToolCachePolicy(ttl=600))
+
+Each cached tool gets its own :class:`ToolResultCache`: an LRU of results that expire after
+``ttl`` seconds, keyed by ``policy.key(tool_input)``. Concurrent calls with the same key are
+coalesced (singleflight): the first caller runs the tool and the others, in any thread or task,
+wait for its result instead of calling the API again. Errors are passed to every waiter and are
+never cached.
+
+Tools without a policy, such as ``get_datetime`` or ``get_image_from_screen`` whose results
+change between calls, always run.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+def default_key(tool_input: dict) -> str:
+    return json.dumps(tool_input, sort_keys=True, ensure_ascii=False, default=str)
+
+@dataclass(frozen=True)
+class ToolCachePolicy:
+    """
+    How the results of a tool are cached.
+
+    Args:
+        ttl (float): Seconds a result stays valid.
+        max_entries (int): Number of results kept; the least recently used are dropped first.
+        key (Callable[[dict], Hashable]): Maps the validated ``tool_input`` to the cache key.
+            Inputs with equal keys share a result.
+    """
+    ttl: float
+    max_entries: int = 256
+    key: Callable[[dict], Hashable] = default_key
+
+class ToolResultCache:
+    """TTL/LRU cache with singleflight of one tool's results. Thread- and task-safe."""
+    def __init__(self, policy: ToolCachePolicy):
+        self.policy = policy
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._inflight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "expired": 0}
+
+    def _claim(self, key: Hashable) -> tuple[Optional[Future], bool, Any]:
+        """``(future, is_leader, cached)``: a hit, a call to wait for, or the lead of a new call."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return None, False, entry[0]
+                del self._entries[key]
+                self.stats["expired"] += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False, None
+            self.stats["misses"] += 1
+            future = self._inflight[key] = Future()
+            return future, True, None
+
+    def _settle(self, key: Hashable, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._entries[key] = (result, time.monotonic() + self.policy.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.policy.max_entries:
+                    self._entries.popitem(last=False)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def call(self, tool_input: dict, fn: Callable[[], Any]) -> Any:
+        """The cached result for ``tool_input``, or the result of ``fn()``, which is then cached."""
+        key = self.policy.key(tool_input)
+        future, is_leader, cached = self._claim(key)
+        if future is None:
+            return cached
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    async def acall(self, tool_input: dict, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async :meth:`call`; waiting for another caller's result does not block the event loop."""
+        key = self.policy.key(tool_input)
+        future, is_leader, cached = self._claim(key)
+        if future is None:
+            return cached
+        if not is_leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        self._settle(key, future, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
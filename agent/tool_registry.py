@@ -1,24 +1,340 @@
+import os
+import asyncio
+import importlib
+import threading
+import contextvars
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, ValidationError
 from langchain.tools import tool
-from agent.utils import export_tool_desc
+from agent.bundle import get_locale_bundle
+from agent.path import DESC_DIR
+from agent.tool_cache import ToolCachePolicy, ToolResultCache
+from agent.utils import export_tool_desc, load_tool_descs
+
+class ToolDescriptorIndex:
+    """
+    In-memory index of tool metadata (``name``, ``description``, ``args``, ``kind``), keyed by tool name.
+
+    It is filled by the registries when tools are registered, so looking a tool up during a chat
+    never touches the filesystem. :meth:`watch` optionally reloads it from the description files.
+    Reads are lock-free: every update swaps in a new dict.
+    """
+    def __init__(self):
+        self._descs: Dict[str, Dict[str, Any]] = {}
+        self.version = 0 # Bumped on every update, so dependent caches can tell they are stale
+        self._versions: Dict[str, int] = {} # Name -> ``version`` at its last change
+        self._stop_event: Optional[threading.Event] = None
+        self._watcher: Optional[threading.Thread] = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._descs
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        return self._descs[name]
+
+    def __setitem__(self, name: str, desc: Dict[str, Any]):
+        if self._descs.get(name) != desc:
+            self._descs = {**self._descs, name: desc}
+            self.version += 1
+            self._versions = {**self._versions, name: self.version}
+
+    def get(self, name: str, default=None) -> Optional[Dict[str, Any]]:
+        return self._descs.get(name, default)
+
+    def values(self):
+        return self._descs.values()
+
+    def version_of(self, name: str) -> int:
+        """``version`` when the descriptor of ``name`` last changed, so a cache per tool only goes stale with its own tool."""
+        return self._versions.get(name, 0)
+
+    def reload(self, desc_dir: Path = DESC_DIR):
+        """Replace the index with the description files in ``desc_dir``."""
+        descs = {d["name"]: d for d in load_tool_descs(desc_dir)}
+        changed = {name for name in descs.keys() | self._descs.keys() if descs.get(name) != self._descs.get(name)}
+        if changed:
+            self._descs = descs
+            self.version += 1
+            self._versions = {**self._versions, **{name: self.version for name in changed}}
+
+    def watch(self, desc_dir: Path = DESC_DIR) -> threading.Thread:
+        """
+        Reload the index in a daemon thread whenever a file in ``desc_dir`` changes.
+        Requires ``watchfiles``. A file that fails to parse keeps the previous index.
+        """
+        from watchfiles import watch
+
+        self.stop_watching()
+        stop_event = self._stop_event = threading.Event()
+        def run():
+            for _ in watch(desc_dir, stop_event=stop_event):
+                try:
+                    self.reload(desc_dir)
+                except Exception as e:
+                    print("[tool:desc] reload failed, keeping previous descriptions:", e)
+        self._watcher = threading.Thread(target=run, name="tool-desc-watch", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self, timeout: float = 5.0):
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._watcher.join(timeout)
+            self._stop_event = self._watcher = None
+
+class ToolInputError(ValueError):
+    """
+    Raised when ``tool_input`` does not match a tool's ``args_schema``.
+
+    Args:
+        tool (str): Name of the tool.
+        tool_input (dict): The rejected input.
+        errors (list[dict]): One ``{"loc", "msg", "type"}`` dict per problem.
+    """
+    def __init__(self, tool: str, tool_input: dict, errors: list[dict]):
+        super().__init__(f"Invalid tool_input for '{tool}': {errors}")
+        self.tool = tool
+        self.tool_input = tool_input
+        self.errors = errors
+
+def _model_validator(schema: type[BaseModel]) -> Callable[[dict], dict]:
+    # The pydantic-core validator of `schema` is compiled once, when the model class is created.
+    def validate(tool_input: dict) -> dict:
+        return schema.model_validate(tool_input).model_dump(exclude_unset=True)
+    return validate
+
+def _json_schema_validator(schema: dict) -> Callable[[dict], dict]:
+    properties = schema.get("properties", schema)
+    required = set(schema.get("required", []))
+    allowed = set(properties)
+    def validate(tool_input: dict) -> dict:
+        errors = [
+            {"loc": key, "msg": "Field required", "type": "missing"}
+            for key in sorted(required - tool_input.keys())
+        ] + [
+            {"loc": key, "msg": "Extra inputs are not permitted", "type": "extra_forbidden"}
+            for key in sorted(tool_input.keys() - allowed)
+        ]
+        if errors:
+            raise ValueError(errors)
+        return tool_input
+    return validate
+
+@dataclass(frozen=True)
+class ToolEntry:
+    """
+    Dispatch table entry: the registered tool, its precompiled ``tool_input`` validator and its
+    result cache (``None`` if the tool is not cached).
+    """
+    tool: Any
+    validator: Callable[[dict], dict]
+    cache: Optional[ToolResultCache] = None
+
+    @classmethod
+    def compile(cls, t, cache: Optional[ToolResultCache] = None) -> "ToolEntry":
+        schema = getattr(t, "args_schema", None)
+        if isinstance(schema, type) and issubclass(schema, BaseModel):
+            return cls(t, _model_validator(schema), cache)
+        if isinstance(schema, dict):
+            return cls(t, _json_schema_validator(schema), cache)
+        return cls(t, lambda tool_input: tool_input, cache)
+
+    def validate(self, tool_input: Any) -> dict:
+        """
+        Check and coerce ``tool_input`` before the tool runs.
+
+        Raises:
+            ToolInputError: With the structured list of problems.
+        """
+        if not isinstance(tool_input, dict):
+            raise ToolInputError(self.tool.name, tool_input, [{"loc": "", "msg": "Input should be a dictionary", "type": "dict_type"}])
+        try:
+            return self.validator(tool_input)
+        except ValidationError as e:
+            errors = [
+                {"loc": ".".join(str(l) for l in err["loc"]), "msg": err["msg"], "type": err["type"]}
+                for err in e.errors()
+            ]
+            raise ToolInputError(self.tool.name, tool_input, errors) from None
+        except ValueError as e:
+            raise ToolInputError(self.tool.name, tool_input, e.args[0]) from None
+
+def import_tool_module(module: str) -> bool:
+    """Import a tool module, which registers its tools. A module that fails to import is reported and skipped."""
+    try:
+        importlib.import_module(module)
+        return True
+    except Exception as e:
+        print("[tool:skip] {}: {}".format(module, e))
+        return False
 
 class CommonToolRegistry(dict): # For Common Tools
-    def __call__(self, *d_args, **d_kwargs):
+    """
+    Registered common tools, keyed by name.
+
+    Tools can also be *declared* (:meth:`declare`) with the module that registers them. The
+    module, and whatever API client or heavy package it imports, is then only imported on the
+    first :meth:`dispatch` of one of its tools, or by :meth:`load`.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._entries: Dict[str, ToolEntry] = {}
+        self._providers: Dict[str, str] = {} # Declared tool -> module that registers it, until imported
+        self._load_lock = threading.Lock()
+        self.caches: Dict[str, ToolResultCache] = {}
+
+    def declare(self, name: str, module: str):
+        """Declare that importing ``module`` registers the tool ``name``, without importing it yet."""
+        if name not in self:
+            self._providers[name] = module
+
+    def names(self) -> set:
+        """Names of the registered and of the declared, not yet loaded, tools."""
+        return self.keys() | self._providers.keys()
+
+    def is_loaded(self, name: str) -> bool:
+        """``False`` while ``name`` is declared but not registered yet."""
+        return name in self or name not in self._providers
+
+    def load(self, name: Optional[str] = None):
+        """
+        Import the module of the declared tool ``name``, or of every declared tool if ``None``.
+        Tools of a module that fails to import are dropped, like tools that skip registration.
+        """
+        with self._load_lock:
+            names = self._providers.keys() if name is None else [name]
+            modules = {self._providers[n] for n in names if not self.is_loaded(n)}
+            for module in modules:
+                import_tool_module(module)
+                self._providers = {n: m for n, m in self._providers.items() if m != module}
+
+    def dispatch(self, name: str) -> Optional[ToolEntry]:
+        """
+        O(1) lookup of the dispatch entry of tool ``name``, or ``None`` if it is not registered.
+        A declared tool is loaded first. Entries are compiled on first use and recompiled if the
+        registered tool is replaced.
+        """
+        t = self.get(name)
+        if t is None and name in self._providers:
+            self.load(name)
+            t = self.get(name)
+        if t is None:
+            return None
+        entry = self._entries.get(name)
+        if entry is None or entry.tool is not t or entry.cache is not self.caches.get(name):
+            entry = self._entries[name] = ToolEntry.compile(t, self.caches.get(name))
+        return entry
+
+    async def adispatch(self, name: str) -> Optional[ToolEntry]:
+        """Async :meth:`dispatch`; a declared tool is loaded in a thread, so its imports do not block the event loop."""
+        if not self.is_loaded(name):
+            await asyncio.to_thread(self.load, name)
+        return self.dispatch(name)
+
+    def __call__(self, *d_args, cache: Optional[ToolCachePolicy] = None, **d_kwargs):
+        """
+        Register the decorated function as a common tool. ``d_args``/``d_kwargs`` go to ``langchain``'s ``tool``.
+
+        Args:
+            cache (ToolCachePolicy | None): Cache the tool's results. Leave unset for tools whose
+                results change between identical calls.
+        """
         def wrapper(fn):
-            t = tool(*d_args, **d_kwargs)(fn)
+            t = tool(*d_args, **d_kwargs)(fn) # `async def` functions become async-only tools
             self[t.name] = t
-            export_tool_desc(t, kind='common')
+            tool_descriptor_index[t.name] = export_tool_desc(t, kind='common')
+            self.set_cache_policy(t.name, cache)
             return t
         return wrapper
 
+    def set_cache_policy(self, name: str, policy: Optional[ToolCachePolicy]):
+        """Cache the results of tool ``name`` with ``policy`` (a fresh, empty cache), or stop caching them if ``None``."""
+        if policy is None:
+            self.caches.pop(name, None)
+        else:
+            self.caches[name] = ToolResultCache(policy)
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit, miss, coalesced-call and expiry counters of every cached tool."""
+        return {name: dict(cache.stats) for name, cache in self.caches.items()}
+
+    def coroutine(self, name: str):
+        """
+        Attach a native async implementation to the already registered tool ``name``.
+        It must take the same arguments as the sync implementation.
+        """
+        def wrapper(fn):
+            self[name].coroutine = fn
+            return fn
+        return wrapper
+
 class SpecialToolRegistry(dict): # For Special Tools
     def __call__(self, *d_args, **d_kwargs):
         def wrapper(cls):
             self[cls.name] = cls
-            export_tool_desc(cls, kind='special')
+            tool_descriptor_index[cls.name] = export_tool_desc(cls, kind='special')
             return cls
         return wrapper
-    
+
+tool_descriptor_index = ToolDescriptorIndex()
+for _desc in get_locale_bundle().tool_descs: # Descriptors of declared tools are known before their modules are imported
+    tool_descriptor_index[_desc["name"]] = _desc
 common_tool_registry = CommonToolRegistry()
 special_tool_registry = SpecialToolRegistry()
 
-import agent.tools
\ No newline at end of file
+# --------------------------------------------------------------------------- #
+# Tool execution
+# --------------------------------------------------------------------------- #
+TOOL_MAX_WORKERS = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+_tool_executor = None
+
+def configure_tool_executor(max_workers: int = TOOL_MAX_WORKERS) -> ThreadPoolExecutor:
+    """
+    (Re)create the bounded thread pool that runs sync-only tools for the async agent.
+
+    Args:
+        max_workers (int): Maximum number of sync tool calls running at once. Further
+            calls wait in the pool's queue. Defaults to the ``TOOL_MAX_WORKERS`` env var (8).
+
+    Returns:
+        ThreadPoolExecutor: The new executor.
+    """
+    global _tool_executor
+    previous, _tool_executor = _tool_executor, ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+    if previous is not None:
+        previous.shutdown(wait=False)
+    return _tool_executor
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    return _tool_executor or configure_tool_executor()
+
+def invoke_tool(tool, tool_input: dict, cache: Optional[ToolResultCache] = None):
+    """
+    Invoke a common tool from sync code. Async-only tools are run on a fresh event loop.
+    With ``cache``, a cached or in-flight result for the same input is used instead.
+    """
+    if cache is not None:
+        return cache.call(tool_input, lambda: invoke_tool(tool, tool_input))
+    if getattr(tool, "func", None) is None and getattr(tool, "coroutine", None) is not None:
+        return asyncio.run(tool.ainvoke(tool_input))
+    return tool.invoke(tool_input)
+
+async def ainvoke_tool(tool, tool_input: dict, cache: Optional[ToolResultCache] = None):
+    """
+    Invoke a common tool without blocking the event loop.
+
+    Tools with a native async implementation are awaited directly; sync-only tools run in
+    the bounded executor of :func:`get_tool_executor`, with the caller's context variables.
+    With ``cache``, a cached or in-flight result for the same input is used instead.
+    """
+    if cache is not None:
+        return await cache.acall(tool_input, lambda: ainvoke_tool(tool, tool_input))
+    if getattr(tool, "coroutine", None) is not None:
+        return await tool.ainvoke(tool_input)
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(get_tool_executor(), ctx.run, tool.invoke, tool_input)
+
+import agent.tools
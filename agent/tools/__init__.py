@@ -1,10 +1,28 @@
-import pkgutil, importlib as _ilb
+import pkgutil
+from agent.tool_registry import common_tool_registry, import_tool_module
+
+# Common tools of these modules are declared by name and registered when their module is first
+# imported: on the first dispatch of one of them, or by `load_tools()`. That keeps API clients,
+# chromadb, PIL and the VisionChain out of `import agent.graph`. The names must match the tools
+# each module registers. Other modules of this package are imported right away.
+LAZY_TOOL_MODULES = {
+    __name__ + ".code": ["execute_code"],
+    __name__ + ".map": ["get_user_location", "nearby_search"],
+    __name__ + ".retrieval": ["web_search"],
+    __name__ + ".utils": ["get_datetime"],
+    __name__ + ".vision": ["get_image_from_screen", "get_image_from_db", "vision_tool"],
+}
+
+def load_tools():
+    """Import every declared tool module now, e.g. to warm a worker before it takes requests."""
+    common_tool_registry.load()
 
 def _auto_import():
+    for module, names in LAZY_TOOL_MODULES.items():
+        for name in names:
+            common_tool_registry.declare(name, module)
     for mod in pkgutil.walk_packages(__path__, prefix=__name__ + "."):
-        try:
-            _ilb.import_module(mod.name)
-        except Exception as e:
-            print("[tool:skip] {}: {}".format(mod.name, e))
+        if mod.name not in LAZY_TOOL_MODULES:
+            import_tool_module(mod.name)
 
-_auto_import()
\ No newline at end of file
+_auto_import()
@@ -1,15 +1,13 @@
 # execute_code_local.py
-import subprocess, tempfile, os, textwrap, sys, ast
+import textwrap, ast
+from agent.sandbox import SandboxBusy, SandboxCrashed, get_sandbox_pool
 from agent.tool_registry import common_tool_registry
 from agent.utils import load_locale_const
 
 const = load_locale_const()
 
-@common_tool_registry(
-    name_or_callable="execute_code",
-    description=const.EXECUTE_CODE_CONST['desc']
-)
-def execute_code(code: str, timeout: int = 5) -> str:
+def _check_code(code: str) -> str | None:
+    """Return the refusal message for forbidden or unparsable code, else ``None``."""
     FORBIDDEN = {
         "import os", "import sys", "subprocess", "socket",
         "__import__", "open(", "eval(", "exec("
@@ -26,22 +24,48 @@ def execute_code(code: str, timeout: int = 5) -> str:
                     return const.EXECUTE_CODE_CONST['forbidden_module']
     except Exception:
         return const.EXECUTE_CODE_CONST['parsing_failed']
+    return None
+
+def _session_id() -> str | None:
+    """Session of the chatting agent, whose sandbox workers run its snippets."""
+    from agent.memory import active_memory
+
+    memory = active_memory()
+    return memory.session_id if memory is not None else None
+
+@common_tool_registry(
+    name_or_callable="execute_code",
+    description=const.EXECUTE_CODE_CONST['desc']
+)
+def execute_code(code: str, timeout: int = 5) -> str:
+    # Runs in a worker of the chatting session only: module-level state a snippet leaves behind
+    # is seen by later snippets of the same session until the worker is replaced (see agent.sandbox).
+    refusal = _check_code(code)
+    if refusal:
+        return refusal
+
+    try:
+        output = get_sandbox_pool().run(textwrap.dedent(code), timeout, session=_session_id())
+    except TimeoutError:
+        return const.EXECUTE_CODE_CONST['timeout'].format(timeout=timeout)
+    except SandboxCrashed:
+        return const.EXECUTE_CODE_CONST['crashed']
+    except SandboxBusy:
+        return const.EXECUTE_CODE_CONST['busy']
+    return output[:4000] or const.EXECUTE_CODE_CONST['no_output']
 
-    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as f:
-        f.write(textwrap.dedent(code))
-        script_path = f.name
+@common_tool_registry.coroutine("execute_code")
+async def aexecute_code(code: str, timeout: int = 5) -> str:
+    refusal = _check_code(code)
+    if refusal:
+        return refusal
 
-    cmd = [sys.executable, script_path]
     try:
-        proc = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        output = (proc.stdout + proc.stderr)[:4000]
-        return output or const.EXECUTE_CODE_CONST['no_output']
-    except subprocess.TimeoutExpired:
+        output = await get_sandbox_pool().arun(textwrap.dedent(code), timeout, session=_session_id())
+    except TimeoutError:
         return const.EXECUTE_CODE_CONST['timeout'].format(timeout=timeout)
-    finally:
-        os.remove(script_path)
+    except SandboxCrashed:
+        return const.EXECUTE_CODE_CONST['crashed']
+    except SandboxBusy:
+        return const.EXECUTE_CODE_CONST['busy']
+    return output[:4000] or const.EXECUTE_CODE_CONST['no_output']
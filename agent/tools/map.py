@@ -1,13 +1,28 @@
 import os
 from googlemaps import Client
+from agent.http_clients import get_http_clients
+from agent.tool_cache import ToolCachePolicy
 from agent.tool_registry import common_tool_registry
 from agent.utils import load_locale_const
 
 const = load_locale_const()
 
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+LOCATION_CACHE_TTL = 60 # Seconds the geolocation is reused
+NEARBY_CACHE_TTL = 300 # Seconds a nearby search is reused for the same place
+
+def _nearby_key(tool_input: dict) -> tuple:
+    # ~10 m grid, so the same place geolocated twice shares a result
+    latlng = tool_input["latlng"]
+    return (
+        tool_input["keyword"].casefold().strip(),
+        round(float(latlng.get("lat", 0.0)), 4),
+        round(float(latlng.get("lng", 0.0)), 4),
+        tool_input.get("radius", 200)
+    )
+
 try:
-    gmaps = Client(key=GOOGLE_MAPS_API_KEY)
+    gmaps = Client(key=GOOGLE_MAPS_API_KEY, requests_session=get_http_clients().session)
 except Exception as e:
     gmaps = None
     print("[tool:skip] GoogleMapsClient init failed → 'get_user_location', 'nearby_search' not registered:", e)
@@ -15,7 +30,8 @@ except Exception as e:
 if gmaps:
     @common_tool_registry(
         name_or_callable="get_user_location",
-        description=const.GET_USER_LOCATION_CONST['desc']
+        description=const.GET_USER_LOCATION_CONST['desc'],
+        cache=ToolCachePolicy(ttl=LOCATION_CACHE_TTL, max_entries=1, key=lambda tool_input: "") # The query does not affect the location
     )
     def get_user_location(query: str) -> str:
         result = gmaps.geolocate()
@@ -29,7 +45,8 @@ if gmaps:
 
     @common_tool_registry(
         name_or_callable="nearby_search",
-        description=const.NEARBY_SEARCH_CONST['desc']
+        description=const.NEARBY_SEARCH_CONST['desc'],
+        cache=ToolCachePolicy(ttl=NEARBY_CACHE_TTL, key=_nearby_key)
     )
     def nearby_search(keyword: str, latlng: dict[str, float], radius: int=200) -> str:
         places = gmaps.places_nearby(location=latlng, radius=radius,keyword=keyword)
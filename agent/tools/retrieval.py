@@ -1,34 +1,57 @@
-import logging
-from tavily import TavilyClient
+import asyncio
+import os
+from tavily import AsyncTavilyClient, TavilyClient
+from tavily.errors import MissingAPIKeyError
+from agent.http_clients import get_http_clients
+from agent.tool_cache import ToolCachePolicy
 from agent.tool_registry import common_tool_registry
 from agent.utils import load_locale_const
 
 const = load_locale_const()
 
 TOP_K = 4
+SEARCH_CACHE_TTL = 600 # Seconds a search result is reused for the same query
+SEARCH_TIMEOUT = 60
 try:
-    tavily: TavilyClient | None = TavilyClient()
+    if not os.getenv("TAVILY_API_KEY"):
+        raise MissingAPIKeyError() # Given a session, the SDK no longer checks for the key itself
+    # The SDK sets its headers on the session/client it is handed, so each gets its own on the shared pools
+    tavily: TavilyClient | None = TavilyClient(session=get_http_clients().new_session())
+    # With injected clients the async SDK ignores TAVILY_HTTP(S)_PROXY; proxied searches use the sync client
+    atavily: AsyncTavilyClient | None = None if tavily.proxies else AsyncTavilyClient(
+        client=get_http_clients().new_async_client()
+    )
 except Exception as e:
-    tavily = None
+    tavily = atavily = None
     print("[tool:skip] TavilyClient init failed → 'web_search' not registered:", e)
-    
+
+def _search_key(tool_input: dict) -> str:
+    return " ".join(tool_input["query"].casefold().split())
+
+def _search_args(query: str) -> dict:
+    return {"query": query, "max_results": TOP_K, "search_depth": "basic", "timeout": SEARCH_TIMEOUT}
+
+def _format_results(results: list[dict]) -> str:
+    return "\n".join([
+        const.WEB_SEARCH_CONST['result_format'].format(
+            idx=i+1,
+            title=r['title'],
+            url=r['url'],
+            content=r['content']
+        ) for i, r in enumerate(results)
+    ])
+
 if tavily:
     @common_tool_registry(
         name_or_callable="web_search",
-        description=const.WEB_SEARCH_CONST['desc']
+        description=const.WEB_SEARCH_CONST['desc'],
+        cache=ToolCachePolicy(ttl=SEARCH_CACHE_TTL, key=_search_key)
     )
     def web_search(query: str) -> str:
-        results = tavily.search(
-            query=query,
-            max_results=TOP_K,
-            search_depth="basic"
-        )["results"]
-        
-        return "\n".join([
-            const.WEB_SEARCH_CONST['result_format'].format(
-                idx=i+1,
-                title=r['title'],
-                url=r['url'],
-                content=r['content']
-            ) for i, r in enumerate(results)
-        ])
\ No newline at end of file
+        return _format_results(tavily.search(**_search_args(query))["results"])
+
+    @common_tool_registry.coroutine("web_search")
+    async def aweb_search(query: str) -> str:
+        if atavily is None:
+            return _format_results((await asyncio.to_thread(tavily.search, **_search_args(query)))["results"])
+        return _format_results((await atavily.search(**_search_args(query)))["results"])
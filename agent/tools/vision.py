@@ -1,9 +1,10 @@
+import asyncio
 import datetime
+import threading
 from PIL import ImageGrab
 
 from agent.chains import VisionChain
 from agent.path import IMAGE_DIR
-from agent.db import store_image_desc, query_by_text
 from agent.tool_registry import common_tool_registry
 from agent.utils import load_locale_const
 
@@ -25,18 +26,13 @@ def get_image_from_screen(query: str) -> str:
     description=const.GET_IMAGE_FROM_DB_CONST['desc']
 )
 def get_image_from_db(query: str) -> str:
+    from agent.db import query_by_text # chromadb is imported on first use
     metadatas = query_by_text(query).get('metadatas', None)
-    image_path = metadatas[0][0].get('image_path', None) if metadatas else None
+    image_path = metadatas[0][0].get('image_path', None) if metadatas and metadatas[0] else None
     return image_path if image_path else ''
 
-vision_chain = VisionChain()
-@common_tool_registry(
-    name_or_callable="vision_tool",
-    description=const.VISION_TOOL_CONST['desc']
-)
-def vision_tool(query: str, image_path: str) -> str:
-    from langchain_core.messages import HumanMessage, messages_from_dict
-    from agent.utils import load_chat_memory
+def _vision_input(query: str, image_path: str) -> list:
+    from langchain_core.messages import HumanMessage
 
     def encode_image(path: str) -> tuple[str, str]:
         import base64, mimetypes
@@ -46,7 +42,7 @@ def vision_tool(query: str, image_path: str) -> str:
         return mime, b64
     
     mime, b64 = encode_image(image_path)
-    input = [
+    return [
         HumanMessage(
             content=[
                 {"type": "text", "text": query},
@@ -59,11 +55,45 @@ def vision_tool(query: str, image_path: str) -> str:
             ]
         )
     ]
-    memory = []
-    messages_dict = load_chat_memory()
-    if messages_dict is not None: 
-        memory = messages_from_dict(messages_dict) 
 
-    response = vision_chain.invoke({"memory":memory, "input": input})
-    store_image_desc(image_path, response)
-    return response
\ No newline at end of file
+def _vision_memory() -> list:
+    from agent.memory import active_memory
+
+    # The live history of the chatting agent; nothing is read from disk.
+    memory = active_memory()
+    return list(memory.memory) if memory is not None else []
+
+def _store_image_desc(image_path: str, description: str):
+    from agent.db import store_image_desc # chromadb is imported on first use
+    store_image_desc(image_path, description)
+
+_vision_chain = None
+_vision_chain_lock = threading.Lock()
+
+def get_vision_chain() -> VisionChain:
+    """The VisionChain of the vision tools, built on first use."""
+    global _vision_chain
+    with _vision_chain_lock:
+        if _vision_chain is None:
+            _vision_chain = VisionChain()
+        return _vision_chain
+
+@common_tool_registry(
+    name_or_callable="vision_tool",
+    description=const.VISION_TOOL_CONST['desc']
+)
+def vision_tool(query: str, image_path: str) -> str:
+    input = _vision_input(query, image_path)
+    memory = _vision_memory()
+    response = get_vision_chain().invoke({"memory":memory, "input": input})
+    _store_image_desc(image_path, response)
+    return response
+
+@common_tool_registry.coroutine("vision_tool")
+async def avision_tool(query: str, image_path: str) -> str:
+    input = await asyncio.to_thread(_vision_input, query, image_path)
+    memory = _vision_memory()
+    vision_chain = await asyncio.to_thread(get_vision_chain)
+    response = await vision_chain.ainvoke({"memory":memory, "input": input})
+    await asyncio.to_thread(_store_image_desc, image_path, response)
+    return response
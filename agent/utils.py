@@ -3,6 +3,7 @@ from __future__ import annotations
 import inspect
 import json
 import textwrap
+import threading
 from pathlib import Path
 from string import Template
 from typing import Any, Dict, List, Literal, Tuple
@@ -12,15 +13,21 @@ import yaml
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+from agent.bundle import get_locale_bundle
 from agent.model.chain_config import ChainConfig
-from agent.path import DESC_DIR, MEMORY_DIR, LOCALE_DIR
+from agent.path import DESC_DIR, LOCALE_DIR, PROMPT_DIR
 
 # --------------------------------------------------------------------------- #
 # Locale related
 # --------------------------------------------------------------------------- #
+_locale_consts: Dict[Path, Any] = {}
+_locale_consts_lock = threading.Lock()
+
 def load_locale_const(locale_path = LOCALE_DIR):
     """locale 환경변수에 맞는 const.py 모듈을 반환한다.
 
+    모듈은 프로세스당 한 번만 실행되고, 이후 호출은 같은 모듈 객체를 공유한다.
+
     Returns
     -------
     module
@@ -28,15 +35,21 @@ def load_locale_const(locale_path = LOCALE_DIR):
     """
     file_path = locale_path / "const.py"
 
-    if not file_path.is_file():
-        raise FileNotFoundError(f"{file_path} 가 존재하지 않습니다.")
+    with _locale_consts_lock:
+        module = _locale_consts.get(file_path)
+        if module is not None:
+            return module
 
-    module_name = f"locale_const"        # sys.modules 충돌 방지용
-    spec = spec_from_file_location(module_name, file_path)
-    module = module_from_spec(spec)
-    spec.loader.exec_module(module)               # 실제 로드 & 실행
+        if not file_path.is_file():
+            raise FileNotFoundError(f"{file_path} 가 존재하지 않습니다.")
 
-    return module
+        module_name = f"locale_const"        # sys.modules 충돌 방지용
+        spec = spec_from_file_location(module_name, file_path)
+        module = module_from_spec(spec)
+        spec.loader.exec_module(module)               # 실제 로드 & 실행
+
+        _locale_consts[file_path] = module
+        return module
 
 # --------------------------------------------------------------------------- #
 # Prompt related
@@ -63,18 +76,26 @@ def load_prompt(
     tuple[list, list]
         ``system`` (length == 1) and ``few_shot`` message lists that can be fed
         directly into :class:`langchain.prompts.ChatPromptTemplate`.
+
+    Prompt files of the locale's ``PROMPT_DIR`` are rendered from the already parsed
+    templates of :func:`agent.bundle.get_locale_bundle`; other files are read and parsed.
     """
-    with open(chain_config.yaml, "r", encoding="utf-8") as fh:
-        raw = fh.read()
+    prompt_path = Path(chain_config.yaml)
+    bundle = get_locale_bundle()
+    if prompt_path.parent == PROMPT_DIR and bundle.has_prompt(prompt_path.name):
+        cfg = bundle.render_prompt(prompt_path.name, **vars_)
+    else:
+        with open(prompt_path, "r", encoding="utf-8") as fh:
+            raw = fh.read()
+
+        # If a value contains newlines, indent it so YAML keeps the block structure.
+        safe_vars = {
+            k: v if "\n" not in str(v) else textwrap.indent(str(v), "  ")
+            for k, v in vars_.items()
+        }
+        rendered = Template(raw).safe_substitute(**safe_vars)
+        cfg = yaml.safe_load(rendered)
 
-    # If a value contains newlines, indent it so YAML keeps the block structure.
-    safe_vars = {
-        k: v if "\n" not in str(v) else textwrap.indent(str(v), "  ")
-        for k, v in vars_.items()
-    }
-    rendered = Template(raw).safe_substitute(**safe_vars)
-    cfg = yaml.safe_load(rendered)
-    
     system_messages = [SystemMessage(content=cfg.get('system', ''))]
     few_shot_messages = [
         HumanMessage(content=m["content"])
@@ -138,7 +159,7 @@ def tool_desc_format(desc: Dict[str, Any]) -> str:
     args_json = json.dumps(desc["args"], ensure_ascii=False)
     return f"- `{desc['name']}` : {args_json}\n{desc['description']}"
 
-def export_tool_desc(tool, kind: Literal["common", "special"]) -> None:
+def export_tool_desc(tool, kind: Literal["common", "special"]) -> Dict[str, Any]:
     """
     Dump tool metadata to ``DESC_DIR/<tool-name>.yaml``.
 
@@ -152,6 +173,11 @@ def export_tool_desc(tool, kind: Literal["common", "special"]) -> None:
         ``name``, ``description`` and ``args_schema`` attributes.
     kind : {"common", "special"}
         Category flag used later when prompts are built.
+
+    Returns
+    -------
+    dict
+        The exported metadata, in the format returned by :func:`load_tool_descs`.
     """
     schema = (
         tool.args_schema.model_json_schema()["properties"]
@@ -171,10 +197,11 @@ def export_tool_desc(tool, kind: Literal["common", "special"]) -> None:
         yml_path.write_text(
             yaml.safe_dump(payload, allow_unicode=True), encoding="utf-8"
         )
+    return payload
 
-def load_tool_descs() -> List[Dict[str, Any]]:
+def load_tool_descs(desc_dir: Path = DESC_DIR) -> List[Dict[str, Any]]:
     """
-    Read every ``*.yaml`` file in :data:`agent.path.DESC_DIR`.
+    Read every ``*.yaml`` file in ``desc_dir`` (default: :data:`agent.path.DESC_DIR`).
 
     Returns
     -------
@@ -183,49 +210,30 @@ def load_tool_descs() -> List[Dict[str, Any]]:
     """
     return [
         yaml.safe_load(p.read_text(encoding="utf-8"))
-        for p in Path(DESC_DIR).glob("*.yaml")
+        for p in Path(desc_dir).glob("*.yaml")
     ]
 
 
 # --------------------------------------------------------------------------- #
 # Embedding model related
 # --------------------------------------------------------------------------- #
-def preload_embedding_model():
-    pass
-
-# --------------------------------------------------------------------------- #
-# Chat memory related
-# --------------------------------------------------------------------------- #
-import aiofiles
-async def save_chat_memory(data: List) -> None:
+def preload_embedding_model(kind: str | None = None):
     """
-    Persist chat memory to ``MEMORY_DIR/chat_memory.yaml`` in a human-readable form.
+    Load the embedding backend used by the image memory ahead of the first query.
 
     Args
     ----------
-    data : list
-        A list of messages to serialize with PyYAML.
-    """
-    async with aiofiles.open(MEMORY_DIR / "chat_memory.yaml", "w", encoding="utf-8") as fh:
-        yaml_str = yaml.dump(
-            data,
-            allow_unicode=True,
-            sort_keys=False,
-            default_flow_style=False,
-        )
-        await fh.write(yaml_str)
-
-def load_chat_memory() -> Any:
-    """
-    Load chat memory previously saved by :func:`save_chat_memory`.
+    kind : str, optional
+        Backend kind (``local``, ``openai`` or ``sentence-transformers:<model>``), which also
+        becomes the process default. Defaults to the ``EMBEDDING_BACKEND`` env var.
 
     Returns
     -------
-    Any
-        The deserialized Python object, or ``None`` if the file is missing.
+    EmbeddingBackend
+        The shared backend instance, warmed up with one embedding.
     """
-    path = MEMORY_DIR / "chat_memory.yaml"
-    if not path.exists():
-        return None
-    with open(path, "r", encoding="utf-8") as fh:
-        return yaml.safe_load(fh)
+    from agent.embeddings import get_embedding_backend, use_embedding_backend
+
+    backend = use_embedding_backend(kind) if kind else get_embedding_backend()
+    backend.embed(["warmup"])
+    return backend
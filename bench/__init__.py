@@ -0,0 +1,12 @@
+"""
+Offline end-to-end benchmark for the plan agents.
+
+Run ``python -m bench run --help`` for the command line interface, or use
+:func:`bench.runner.run_benchmark` directly.
+"""
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# agent.path requires a locale; benchmarks default to the English prompts.
+os.environ.setdefault("LOCALE", "us")
@@ -0,0 +1,141 @@
+"""
+Command line entry point.
+
+    python -m bench run --agent async --runs 5 --llm-latency 0.05 --output bench_output.json
+    python -m bench compare baseline.json bench_output.json --threshold 0.1
+    python -m bench startup --runs 5 --budget 1.5
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from bench.fake import Script
+from bench.runner import DEFAULT_CORPUS, STAGES, compare, load_corpus, run_benchmark
+from bench.startup import run_startup
+
+
+def _chain_latency(values: list[str]) -> dict[str, float]:
+    result = {}
+    for value in values:
+        name, _, seconds = value.partition("=")
+        if not seconds:
+            raise argparse.ArgumentTypeError(f"Expected <ChainName>=<seconds>, got '{value}'.")
+        result[name] = float(seconds)
+    return result
+
+
+def _print_summary(result: dict):
+    summary = result["summary"]
+    print(f"{'stage':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}")
+    rows = [("Total", summary["total"]), ("FirstToken", summary["first_token"])] + [(s, summary["stages"][s]) for s in STAGES]
+    for name, stats in rows:
+        print(f"{name:<14}" + "".join(f"{stats[k]*1000:>8.1f}ms" for k in ("p50", "p95", "p99", "mean")))
+    print(f"attempts: mean={summary['attempts']['mean']:.2f} max={summary['attempts']['max']}")
+    llm = summary["llm"]
+    print(
+        f"per turn: llm_calls={llm['llm_calls']:.2f} tool_chain_retries={llm['tool_chain_retries']:.2f} "
+        f"input_tokens={llm['input_tokens']:.0f} output_tokens={llm['output_tokens']:.0f}"
+    )
+
+
+def cmd_run(args) -> int:
+    script = Script(
+        latency=args.llm_latency,
+        chain_latency=_chain_latency(args.chain_latency),
+        token_latency=args.token_latency,
+        jitter=args.jitter,
+        replan_rate=args.replan_rate,
+        response_tokens=args.response_tokens,
+        seed=args.seed,
+    )
+    result = run_benchmark(
+        agent=args.agent,
+        runs=args.runs,
+        corpus=load_corpus(args.corpus),
+        script=script,
+        tool_latency=args.tool_latency,
+        is_async_tools=not args.sync_tools,
+        is_stream=not args.no_stream,
+        use_plan_cache=args.plan_cache,
+    )
+    _print_summary(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Result written to {args.output}")
+    return 0
+
+
+def cmd_compare(args) -> int:
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+    current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    rows = compare(baseline, current, args.threshold)
+    print(f"{'metric':<20}{'baseline':>12}{'current':>12}{'change':>10}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<20}{row['baseline']:>12.4f}{row['current']:>12.4f}{row['change']:>+10.1%}{flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+def cmd_startup(args) -> int:
+    result = run_startup(module=args.module, runs=args.runs, budget=args.budget, top=args.top)
+    print(f"import {result['module']}: {result['module_count']} modules loaded")
+    print(f"{'':<14}{'p50':>10}{'max':>10}")
+    for name in ("import", "process"):
+        print(f"{name:<14}" + "".join(f"{result[name][k]*1000:>8.1f}ms" for k in ("p50", "max")))
+    print("slowest modules (self time):")
+    for name, seconds in result["slowest"]:
+        print(f"  {seconds*1000:>8.1f}ms  {name}")
+    if result["deferred_imported"]:
+        print(f"DEFERRED MODULES IMPORTED: {', '.join(result['deferred_imported'])}")
+    if args.budget is not None:
+        print(f"budget: {args.budget*1000:.0f}ms " + ("ok" if result["import"]["p50"] <= args.budget else "EXCEEDED"))
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Result written to {args.output}")
+    return 0 if result["ok"] else 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Offline plan-agent benchmark.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Replay a query corpus with a fake model and stub tools.")
+    run.add_argument("--agent", choices=["sync", "async"], default="sync")
+    run.add_argument("--runs", type=int, default=3)
+    run.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="JSONL file with a 'query' per line.")
+    run.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per LLM call.")
+    run.add_argument("--chain-latency", action="append", default=[], metavar="CHAIN=SECONDS",
+                     help="Per-chain latency override, e.g. PlanChain=0.2. Repeatable.")
+    run.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed tokens.")
+    run.add_argument("--tool-latency", type=float, default=0.0, help="Seconds per stub tool call.")
+    run.add_argument("--sync-tools", action="store_true", help="Make stub tools sync-only (exercises the tool executor).")
+    run.add_argument("--jitter", type=float, default=0.0, help="Relative latency jitter, e.g. 0.1.")
+    run.add_argument("--replan-rate", type=float, default=0.0, help="Fraction of queries rejected on the first attempt.")
+    run.add_argument("--response-tokens", type=int, default=64)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--no-stream", action="store_true", help="Disable ResponseChain streaming.")
+    run.add_argument("--plan-cache", action="store_true", help="Let the agents reuse cached plans instead of always calling PlanChain.")
+    run.add_argument("--output", help="Write the machine-readable result to this JSON file.")
+    run.set_defaults(func=cmd_run)
+
+    cmp_ = sub.add_parser("compare", help="Compare two JSON results; exit 1 on regression.")
+    cmp_.add_argument("baseline")
+    cmp_.add_argument("current")
+    cmp_.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown treated as regression.")
+    cmp_.set_defaults(func=cmd_compare)
+
+    startup = sub.add_parser("startup", help="Time cold imports of the agent; exit 1 past the budget.")
+    startup.add_argument("--module", default="agent.graph")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--budget", type=float, help="Seconds the p50 import time may take.")
+    startup.add_argument("--top", type=int, default=10, help="Number of slowest modules listed.")
+    startup.add_argument("--output", help="Write the machine-readable result to this JSON file.")
+    startup.set_defaults(func=cmd_startup)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
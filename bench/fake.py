@@ -0,0 +1,278 @@
+"""
+Deterministic stand-ins for the chat models and tools used by the agents.
+
+:class:`FakeChatModel` is registered as the ``fake`` model family of
+:func:`agent.llm.get_llm`, and :func:`install_stub_tools` replaces every entry of
+``common_tool_registry`` with a stub built from its description file. Together
+they let both agents run end-to-end without any API key or network access.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, Iterator, AsyncIterator, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
+
+from agent.utils import load_locale_const
+
+const = load_locale_const()
+CHAT_MSG = const.CHAT_MSG
+
+FAKE_MODEL_FAMILY = "fake"
+
+# (keywords, tool) pairs used to turn a query into a plan. Order is the plan order.
+PLAN_RULES = [
+    (("time", "date", "today", "yesterday"),            "get_datetime"),
+    (("where am i", "location"),                        "get_user_location"),
+    (("nearby", "near me", "cafe", "restaurant"),       "nearby_search"),
+    (("news", "search", "weather", "who is", "what is"),"web_search"),
+    (("code", "python", "calculate"),                   "execute_code"),
+    (("screenshot", "screen"),                          "get_image_from_screen"),
+    (("image", "photo", "picture"),                     "get_image_from_db"),
+]
+# Tools whose step needs the output of another tool's step when both are planned.
+PLAN_DEPENDENCIES = {
+    "nearby_search": "get_user_location",
+    "web_search": "get_datetime",
+}
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(c.get("text", "") for c in content if isinstance(c, dict))
+
+def _input_text(messages: list[BaseMessage]) -> str:
+    # The chain input: the human messages after the prompt's last non-human message (the scratchpad and its extra lines)
+    tail = []
+    for message in reversed(messages):
+        if not isinstance(message, HumanMessage):
+            break
+        tail.append(_text(message))
+    return "\n".join(reversed(tail))
+
+def _prefix(template: str) -> str:
+    return template.split("{")[0]
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+class Script:
+    """
+    Scripted behaviour shared by every fake chat model.
+
+    Args:
+        latency (float): Seconds each LLM call takes before answering.
+        chain_latency (dict[str, float] | None): Per-chain overrides of ``latency``, keyed by chain name.
+        token_latency (float): Seconds between streamed response tokens.
+        jitter (float): Relative latency jitter (0.1 → ±10%), drawn from a seeded RNG.
+        replan_rate (float): Fraction of queries whose first attempt is rejected by ValidationChain.
+        response_tokens (int): Number of words in ResponseChain/SummaryChain/VisionChain answers.
+        seed (int): Seed of the jitter RNG.
+    """
+    def __init__(
+        self,
+        latency: float = 0.0,
+        chain_latency: Optional[dict[str, float]] = None,
+        token_latency: float = 0.0,
+        jitter: float = 0.0,
+        replan_rate: float = 0.0,
+        response_tokens: int = 64,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.chain_latency = chain_latency or {}
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.replan_rate = replan_rate
+        self.response_tokens = response_tokens
+        self._rng = random.Random(seed)
+
+    def latency_for(self, chain_name: str) -> float:
+        base = self.chain_latency.get(chain_name, self.latency)
+        if self.jitter:
+            base *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        return max(base, 0.0)
+
+    def _query(self, buffer: str) -> str:
+        first_line = buffer.strip().splitlines()[0] if buffer.strip() else ""
+        return first_line.removeprefix(_prefix(CHAT_MSG['input_message']).strip()).strip()
+
+    def _needs_replan(self, query: str) -> bool:
+        return zlib.crc32(query.encode("utf-8")) % 100 < self.replan_rate * 100
+
+    def plan_for(self, query: str) -> list[dict]:
+        lowered = query.lower()
+        tools = [tool for keywords, tool in PLAN_RULES if any(k in lowered for k in keywords)]
+        if not tools:
+            return [{"tool": "thought", "message": query}]
+        return [
+            {
+                "tool": tool,
+                "message": query,
+                "depends_on": [tools.index(PLAN_DEPENDENCIES[tool]) + 1] if PLAN_DEPENDENCIES.get(tool) in tools else []
+            }
+            for tool in tools
+        ]
+
+    def tool_input_for(self, tool_name: str, query: str) -> dict:
+        from agent.chains import COMMON_TOOL_DESC_LIST
+        args = next((d["args"] for d in COMMON_TOOL_DESC_LIST if d["name"] == tool_name), {})
+        defaults = {"integer": 1, "number": 0.0, "boolean": False, "array": [], "object": {"lat": 0.0, "lng": 0.0}}
+        return {
+            key: spec["default"] if "default" in spec else defaults.get(spec.get("type"), query)
+            for key, spec in args.items()
+        }
+
+    def reply(self, chain_name: str, messages: list[BaseMessage]) -> str:
+        buffer = _input_text(messages)
+        query = self._query(buffer)
+        if chain_name == "PlanChain":
+            return json.dumps({"plan": self.plan_for(query)}, ensure_ascii=False)
+        if chain_name == "ToolChain":
+            system = _text(messages[0])
+            match = re.search(r"- `(\w+)` : ", system)
+            tool_name = match.group(1) if match else ""
+            return json.dumps({
+                "tool": tool_name,
+                "tool_input": self.tool_input_for(tool_name, query),
+                "message": ""
+            }, ensure_ascii=False)
+        if chain_name == "ValidationChain":
+            attempts = buffer.count(_prefix(CHAT_MSG['attempt_message']))
+            is_valid = not (self._needs_replan(query) and attempts < 2)
+            return json.dumps({"is_valid": is_valid, "message": "fake validation"})
+        if chain_name == "EntityMemoryChain":
+            return json.dumps({"entities": {}})
+        return " ".join(f"token{i}" for i in range(self.response_tokens))
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers from a :class:`Script` after a configurable delay.
+
+    Structured output is produced by parsing the scripted JSON answer with the
+    requested pydantic schema, so parsing and retry paths behave like the real chains.
+    """
+    model_name: str = "fake"
+    temperature: Optional[float] = None
+    streaming: bool = False
+    script: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return FAKE_MODEL_FAMILY
+
+    def _message(self, messages: list[BaseMessage]) -> AIMessage:
+        content = self.script.reply(self.name, messages)
+        input_tokens = sum(_count_tokens(_text(m)) for m in messages)
+        output_tokens = _count_tokens(content)
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
+            }
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.script.latency_for(self.name))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.script.latency_for(self.name))
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _chunks(self, messages: list[BaseMessage]) -> list[AIMessageChunk]:
+        message = self._message(messages)
+        words = message.content.split(" ")
+        return [
+            AIMessageChunk(
+                content=w if i == 0 else " " + w,
+                # Usage is reported once, on the last chunk, like providers with stream usage enabled.
+                usage_metadata=message.usage_metadata if i == len(words) - 1 else None
+            )
+            for i, w in enumerate(words)
+        ]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.script.latency_for(self.name))
+        for chunk in self._chunks(messages):
+            if self.script.token_latency:
+                time.sleep(self.script.token_latency)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.script.latency_for(self.name))
+        for chunk in self._chunks(messages):
+            if self.script.token_latency:
+                await asyncio.sleep(self.script.token_latency)
+            yield ChatGenerationChunk(message=chunk)
+
+    def with_structured_output(self, schema, **kwargs):
+        return self | RunnableLambda(lambda message: schema.model_validate_json(message.content))
+
+
+def install_fake_llm(script: Script) -> None:
+    """
+    Register the ``fake`` model family and point every chain config at it.
+
+    Must be called before any chain (or tool module building a chain) is constructed.
+    """
+    from agent.llm import register_model_family
+    from agent.chains import CHAINS
+
+    register_model_family(
+        FAKE_MODEL_FAMILY,
+        lambda **kwargs: FakeChatModel(script=script, **kwargs)
+    )
+    for chain_config in CHAINS.values():
+        chain_config.model_family = FAKE_MODEL_FAMILY
+
+
+def install_stub_tools(latency: float = 0.0, is_async: bool = True) -> list[str]:
+    """
+    Replace every common tool with a stub that sleeps ``latency`` seconds.
+
+    Stubs are built from the description files, so tools whose modules failed to
+    import (missing API keys or packages) are benchmarked as well. With ``is_async=False``
+    the stubs are sync-only and the async agent runs them in its tool executor.
+
+    Returns:
+        list[str]: Names of the stubbed tools.
+    """
+    from agent.chains import COMMON_TOOL_DESC_LIST
+    from agent.tool_registry import common_tool_registry, tool_descriptor_index
+
+    def make_stub(name: str):
+        def stub(**kwargs) -> str:
+            time.sleep(latency)
+            return f"[{name}] stub output for {kwargs}"
+
+        async def astub(**kwargs) -> str:
+            await asyncio.sleep(latency)
+            return f"[{name}] stub output for {kwargs}"
+        return stub, astub
+
+    for desc in COMMON_TOOL_DESC_LIST:
+        stub, astub = make_stub(desc["name"])
+        common_tool_registry[desc["name"]] = StructuredTool.from_function(
+            func=stub,
+            coroutine=astub if is_async else None,
+            name=desc["name"],
+            description=desc["description"],
+            args_schema={"type": "object", "properties": desc["args"]}
+        )
+        tool_descriptor_index[desc["name"]] = desc
+    return [desc["name"] for desc in COMMON_TOOL_DESC_LIST]
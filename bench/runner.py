@@ -0,0 +1,274 @@
+"""
+Replay a query corpus through ``PlanAgent`` / ``AsyncPlanAgent`` and collect timings.
+
+Every turn runs with ``is_report=True``, so the agent's :class:`agent.report.ChatReport`
+yields the time spent in Plan/Tool/Validation/Response/EntityMemory/Summary, the number
+of attempts, LLM calls and tokens. The background memory jobs of a turn are waited for
+before the next one, so their stages and LLM calls are counted in the turn that scheduled them. Turns are consumed through ``chat_stream``, which also gives
+the time to the first response token. Results are plain dictionaries that :func:`summarize`
+reduces to p50/p95/p99 figures.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from bench.fake import Script, install_fake_llm, install_stub_tools
+
+STAGES = ("Plan", "Tool", "Validation", "Response", "EntityMemory", "Summary")
+PERCENTILES = (50, 95, 99)
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "corpus.jsonl"
+
+
+def load_corpus(path: Path = DEFAULT_CORPUS) -> list[dict]:
+    """
+    Read a JSONL corpus. Each line needs a ``query`` (or ``input``/``title``) field
+    and may carry an ``id`` (``request_id`` is accepted as well).
+    """
+    corpus = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for i, line in enumerate(fh):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            query = row.get("query") or row.get("input") or row.get("title")
+            if not query:
+                raise ValueError(f"{path}:{i+1} has no 'query' field.")
+            corpus.append({"id": str(row.get("id") or row.get("request_id") or i), "query": query})
+    return corpus
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Linear-interpolated percentile of ``values`` (``p`` in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _stats(values: list[float]) -> dict[str, float]:
+    stats = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+    stats["mean"] = sum(values) / len(values) if values else 0.0
+    stats["n"] = len(values)
+    return stats
+
+
+def summarize(turns: list[dict]) -> dict:
+    """Reduce per-turn records to percentile statistics for the total and every stage."""
+    def mean(key):
+        return sum(t[key] for t in turns) / len(turns) if turns else 0.0
+
+    return {
+        "total": _stats([t["total"] for t in turns]),
+        "first_token": _stats([t["first_token"] for t in turns]),
+        "stages": {s: _stats([t["stages"][s] for t in turns]) for s in STAGES},
+        "attempts": {
+            "mean": mean("attempts"),
+            "max": max((t["attempts"] for t in turns), default=0),
+        },
+        "llm": {key: mean(key) for key in ("llm_calls", "tool_chain_retries", "input_tokens", "output_tokens")},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _new_agent(kind: str, is_stream: bool, use_plan_cache: bool):
+    if kind == "async":
+        from agent.agraph import PlanAgent
+    else:
+        from agent.graph import PlanAgent
+    agent = PlanAgent("bench", is_stream=is_stream, use_plan_cache=use_plan_cache)
+    agent.memory.clear_memory() # Do not start from the user's saved chat memory
+    agent.entity_memory.debounce = 0.0 # Each turn waits for its extraction anyway
+    return agent
+
+
+def _wait_background(agent):
+    # Summary and EntityMemory are recorded into the turn's report when the background jobs finish
+    agent.memory.wait_compaction()
+    agent.entity_memory.wait()
+
+
+def _record(report, first_token: Optional[float], run: int, item: dict) -> dict:
+    totals = report.stage_totals()
+    return {
+        "run": run,
+        "query_id": item["id"],
+        "total": report.total,
+        "first_token": first_token if first_token is not None else report.total,
+        "stages": {s: totals.get(s, 0.0) for s in STAGES},
+        "attempts": report.attempts,
+        "llm_calls": report.llm_calls,
+        "tool_chain_retries": report.tool_chain_retries,
+        "input_tokens": report.input_tokens,
+        "output_tokens": report.output_tokens,
+    }
+
+
+def _replay_sync(corpus, runs, is_stream, use_plan_cache):
+    from agent.events import ChatFinished, ResponseToken
+
+    turns = []
+    for run in range(runs):
+        agent = _new_agent("sync", is_stream, use_plan_cache)
+        for item in corpus:
+            start, first_token = time.perf_counter(), None
+            for event in agent.chat_stream(item["query"], is_report=True):
+                if isinstance(event, ResponseToken) and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif isinstance(event, ChatFinished):
+                    report = event.report
+            _wait_background(agent)
+            turns.append(_record(report, first_token, run, item))
+    return turns
+
+
+async def _replay_async(corpus, runs, is_stream, use_plan_cache):
+    from agent.events import ChatFinished, ResponseToken
+
+    turns = []
+    for run in range(runs):
+        agent = _new_agent("async", is_stream, use_plan_cache)
+        for item in corpus:
+            start, first_token = time.perf_counter(), None
+            async for event in agent.chat_stream(item["query"], is_report=True):
+                if isinstance(event, ResponseToken) and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif isinstance(event, ChatFinished):
+                    report = event.report
+            await asyncio.to_thread(_wait_background, agent)
+            turns.append(_record(report, first_token, run, item))
+    from agent.http_clients import get_http_clients
+    await get_http_clients().aclose() # Before asyncio.run stops this loop
+    return turns
+
+
+def run_benchmark(
+    agent: str = "sync",
+    runs: int = 3,
+    corpus: Optional[list[dict]] = None,
+    script: Optional[Script] = None,
+    tool_latency: float = 0.0,
+    is_async_tools: bool = True,
+    is_stream: bool = True,
+    use_plan_cache: bool = False,
+) -> dict:
+    """
+    Replay ``corpus`` ``runs`` times through a fresh agent per run.
+
+    Args:
+        agent (str): ``"sync"`` for :mod:`agent.graph`, ``"async"`` for :mod:`agent.agraph`.
+        runs (int): Number of replays of the whole corpus.
+        corpus (list[dict] | None): Items with ``id`` and ``query``. Defaults to ``bench/corpus.jsonl``.
+        script (Script | None): Fake model behaviour. Defaults to a zero-latency script.
+        tool_latency (float): Seconds each stub tool call takes.
+        is_async_tools (bool): Give stub tools a native async implementation.
+        is_stream (bool): Passed to the agent's ResponseChain.
+        use_plan_cache (bool): Let the agents reuse plans of queries seen before (see
+            :mod:`agent.plan_cache`). The shared plan cache is emptied before the first run.
+
+    Returns:
+        dict: ``meta``, per-turn ``turns`` and the ``summary`` produced by :func:`summarize`.
+    """
+    if agent not in ("sync", "async"):
+        raise ValueError(f"Unknown agent kind: {agent}")
+    script = script or Script()
+    corpus = corpus if corpus is not None else load_corpus()
+
+    install_fake_llm(script)
+    stubbed = install_stub_tools(tool_latency, is_async_tools)
+    from agent.plan_cache import get_plan_cache
+    plan_cache = get_plan_cache()
+    plan_cache.invalidate()
+
+    wall_start = time.perf_counter()
+    if agent == "async":
+        turns = asyncio.run(_replay_async(corpus, runs, is_stream, use_plan_cache))
+    else:
+        turns = _replay_sync(corpus, runs, is_stream, use_plan_cache)
+    wall = time.perf_counter() - wall_start
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "agent": agent,
+            "runs": runs,
+            "queries": len(corpus),
+            "wall_time": wall,
+            "tools": stubbed,
+            "config": {
+                "llm_latency": script.latency,
+                "chain_latency": script.chain_latency,
+                "token_latency": script.token_latency,
+                "jitter": script.jitter,
+                "replan_rate": script.replan_rate,
+                "response_tokens": script.response_tokens,
+                "tool_latency": tool_latency,
+                "is_async_tools": is_async_tools,
+                "is_stream": is_stream,
+                "use_plan_cache": use_plan_cache,
+            },
+            "plan_cache": dict(plan_cache.stats) if use_plan_cache else None,
+        },
+        "turns": turns,
+        "summary": summarize(turns),
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list[dict]:
+    """
+    Compare the summaries of two benchmark results.
+
+    Args:
+        baseline (dict): Result of an earlier :func:`run_benchmark`.
+        current (dict): Result to check against ``baseline``.
+        threshold (float): Relative slowdown above which a metric counts as a regression.
+
+    Returns:
+        list[dict]: One row per metric with ``metric``, ``baseline``, ``current``,
+        ``change`` (relative) and ``regression`` flag.
+    """
+    def metrics(summary: dict):
+        for p in PERCENTILES:
+            yield f"total.p{p}", summary["total"][f"p{p}"]
+        if "first_token" in summary: # Absent from results of older versions
+            for p in PERCENTILES:
+                yield f"first_token.p{p}", summary["first_token"][f"p{p}"]
+        for stage in STAGES:
+            for p in PERCENTILES:
+                yield f"{stage}.p{p}", summary["stages"][stage][f"p{p}"]
+        yield "attempts.mean", summary["attempts"]["mean"]
+
+    current_metrics = dict(metrics(current["summary"]))
+    rows = []
+    for name, base in metrics(baseline["summary"]):
+        value = current_metrics[name]
+        change = (value - base) / base if base else 0.0
+        rows.append({
+            "metric": name,
+            "baseline": base,
+            "current": value,
+            "change": change,
+            "regression": change > threshold,
+        })
+    return rows
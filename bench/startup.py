@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark: time ``import agent.graph`` (or another module) in fresh interpreters.
+
+Each run starts a new ``python -X importtime`` process that imports the module once and
+reports how long the import took and which modules it loaded. :func:`run_startup` returns
+p50/max import and process times, the modules that took longest on their own (from the last
+run's ``-X importtime`` trace), and the *deferred* modules that were imported anyway. Those
+are the packages that tools load on first use, and importing the agent must not pull them in.
+"""
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from bench.runner import percentile
+
+# Loaded by tool modules or SDK clients on first use only
+DEFERRED_MODULES = ("chromadb", "PIL", "googlemaps", "tavily", "openai", "langchain_openai", "langchain_groq")
+
+_CHILD = r'''
+import importlib, json, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print("\n" + json.dumps({"seconds": seconds, "modules": sorted(sys.modules)}))
+'''
+
+
+def _parse_importtime(stderr: str) -> list[tuple[str, float]]:
+    """``(module, self seconds)`` of each line of an ``-X importtime`` trace."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1e6))
+    return rows
+
+
+def time_import(module: str = "agent.graph") -> dict:
+    """Import ``module`` in a fresh interpreter. Returns the import and process wall times, loaded modules and importtime rows."""
+    env = {**os.environ, "LOCALE": os.environ.get("LOCALE", "us")}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, module],
+        capture_output=True, text=True, env=env
+    )
+    process_seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "import": result["seconds"],
+        "process": process_seconds,
+        "modules": result["modules"],
+        "importtime": _parse_importtime(proc.stderr)
+    }
+
+
+def run_startup(module: str = "agent.graph", runs: int = 5, budget: Optional[float] = None, top: int = 10) -> dict:
+    """
+    Time ``runs`` cold imports of ``module``.
+
+    Args:
+        budget (float | None): Seconds the p50 import time may take. ``ok`` is ``False`` past it,
+            or if any of ``DEFERRED_MODULES`` was imported.
+        top (int): Number of slowest modules (by their own import time) reported.
+    """
+    samples = [time_import(module) for _ in range(runs)]
+    imports = [s["import"] for s in samples]
+    processes = [s["process"] for s in samples]
+    loaded = set(samples[-1]["modules"])
+    deferred = sorted(m for m in DEFERRED_MODULES if m in loaded)
+    p50 = percentile(imports, 50)
+    return {
+        "module": module,
+        "runs": runs,
+        "import": {"p50": p50, "max": max(imports)},
+        "process": {"p50": percentile(processes, 50), "max": max(processes)},
+        "module_count": len(loaded),
+        "slowest": sorted(samples[-1]["importtime"], key=lambda row: row[1], reverse=True)[:top],
+        "deferred_imported": deferred,
+        "budget": budget,
+        "ok": not deferred and (budget is None or p50 <= budget)
+    }
@@ -0,0 +1,52 @@
+"""
+Shared fixtures. The tests run offline: every chain answers with the bench's ``FakeChatModel``
+and every common tool is a stub (see :mod:`bench.fake`). Run them from the repository root
+with ``python -m pytest``.
+"""
+import functools
+import os
+import shutil
+
+os.environ.setdefault("LOCALE", "us")
+
+import pytest
+
+from bench.fake import Script, install_fake_llm, install_stub_tools
+
+install_fake_llm(Script()) # Before any chain is built
+install_stub_tools()
+
+
+@pytest.fixture
+def store(tmp_path):
+    """A conversation store in a temporary database."""
+    from agent.store import ConversationStore
+
+    store = ConversationStore(tmp_path / "chat_memory.db")
+    yield store
+    store.writer().flush(5)
+
+
+@pytest.fixture
+def default_store(store, monkeypatch):
+    """Make ``store`` the process-wide store, so agents built in the test save there."""
+    import agent.store
+
+    monkeypatch.setattr(agent.store, "_default_store", store)
+    return store
+
+
+@pytest.fixture
+def locale_copy(tmp_path, monkeypatch):
+    """Load the locale bundle from a copy of the locale files, which the test may edit. Returns its prompt directory."""
+    import agent.bundle
+    from agent.path import DESC_DIR, PROMPT_DIR
+
+    prompt_dir, desc_dir = tmp_path / "prompts", tmp_path / "descriptions"
+    shutil.copytree(PROMPT_DIR, prompt_dir)
+    shutil.copytree(DESC_DIR, desc_dir)
+    monkeypatch.setattr(agent.bundle, "_bundle", agent.bundle._bundle) # Restored after the test
+    monkeypatch.setattr(agent.bundle, "load_locale_bundle",
+                        functools.partial(agent.bundle.load_locale_bundle, prompt_dir, desc_dir, tmp_path / "bundle.json"))
+    agent.bundle.reload_locale_bundle()
+    return prompt_dir
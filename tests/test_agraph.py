@@ -0,0 +1,34 @@
+import asyncio
+
+from agent.agraph import PlanAgent
+from agent.scratchpad import Scratchpad
+
+
+def _run_plan(plan):
+    agent = PlanAgent("agraph-barrier")
+    log = []
+
+    async def execute(buffer, step, tool_json, validation, dependencies, outputs):
+        log.append(("start", step))
+        await asyncio.sleep(0.01)
+        log.append(("end", step))
+
+    agent._execute_step = execute
+    asyncio.run(agent._tool_step(Scratchpad(), plan, is_debug=False))
+    return log
+
+
+def test_independent_steps_overlap(default_store):
+    plan = [{"tool": "get_datetime", "message": "time", "depends_on": []} for _ in range(2)]
+
+    assert _run_plan(plan)[:2] == [("start", 0), ("start", 1)]
+
+
+def test_special_tool_step_runs_alone(default_store):
+    plan = [
+        {"tool": "get_datetime", "message": "time", "depends_on": []},
+        {"tool": "clear_chat_memory", "message": "reset", "depends_on": []},
+        {"tool": "get_datetime", "message": "time", "depends_on": []},
+    ]
+
+    assert _run_plan(plan) == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+import agent.bundle
+from agent.bundle import get_locale_bundle
+
+
+@pytest.fixture
+def check_always(monkeypatch):
+    monkeypatch.setattr(agent.bundle, "BUNDLE_CHECK_INTERVAL", 0)
+
+
+def test_edited_file_reloads_the_bundle(locale_copy, check_always):
+    bundle = get_locale_bundle()
+    path = locale_copy / "summary.yaml"
+    path.write_text(path.read_text(encoding="utf-8") + "\n# edited\n", encoding="utf-8")
+
+    reloaded = get_locale_bundle()
+
+    assert reloaded is not bundle and reloaded.key != bundle.key
+    assert get_locale_bundle() is reloaded
+
+
+def test_touched_file_keeps_the_bundle(locale_copy, check_always):
+    bundle = get_locale_bundle()
+    path = locale_copy / "summary.yaml"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert get_locale_bundle() is bundle
+    assert not bundle.is_stale() # The new stats were recorded
+
+
+def test_files_are_not_checked_within_the_interval(locale_copy, monkeypatch):
+    monkeypatch.setattr(agent.bundle, "BUNDLE_CHECK_INTERVAL", 3600)
+    bundle = get_locale_bundle()
+    path = locale_copy / "summary.yaml"
+    path.write_text(path.read_text(encoding="utf-8") + "\n# edited\n", encoding="utf-8")
+
+    assert get_locale_bundle() is bundle
+
+
+def test_broken_edit_keeps_the_loaded_bundle(locale_copy, check_always):
+    bundle = get_locale_bundle()
+    (locale_copy / "summary.yaml").write_text("system: [unclosed\n", encoding="utf-8")
+
+    assert get_locale_bundle() is bundle
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent.http_clients import HTTPClients
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive
+    closed = 0 # Connections the clients closed
+
+    def finish(self):
+        super().finish()
+        type(self).closed += 1
+
+    def do_GET(self):
+        body = self.headers.get("Authorization", "").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_clients_of_their_own_share_the_pool(url):
+    clients = HTTPClients(is_http2=False)
+    own = clients.new_client(base_url=url, headers={"Authorization": "Bearer own"})
+
+    assert own.get("/").text == "Bearer own"
+    assert clients.client.get(f"{url}/").text == "" # Headers stay with the client they were set on
+    own.close() # Does not close the shared pool
+    assert clients.client.get(f"{url}/").status_code == 200
+
+    assert clients.stats()["client"] == {"requests": 3, "connections_opened": 1, "http2": 0}
+    clients.close()
+
+
+def test_sessions_of_their_own_share_the_adapter(url):
+    clients = HTTPClients()
+    own = clients.new_session()
+    own.headers["Authorization"] = "Bearer own"
+
+    assert own.get(f"{url}/").text == "Bearer own"
+    own.close()
+    assert clients.session.get(f"{url}/").text == ""
+
+    assert clients.stats()["session"] == {"requests": 2, "connections_opened": 1, "hosts": 1}
+    clients.close()
+
+
+def test_aclose_closes_the_pool_of_the_running_loop(url):
+    clients = HTTPClients(is_http2=False)
+
+    async def requests_then_close():
+        for _ in range(2):
+            await clients.async_client.get(f"{url}/")
+        await clients.aclose()
+
+    _Handler.closed = 0
+    asyncio.run(requests_then_close())
+    assert clients.stats()["async_client"]["connections_opened"] == 1
+    deadline = time.monotonic() + 5
+    while _Handler.closed < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert _Handler.closed == 1
+
+    asyncio.run(requests_then_close()) # A new loop opens its own pool
+    assert clients.stats()["async_client"] == {"requests": 4, "connections_opened": 2, "http2": 0}
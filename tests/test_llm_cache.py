@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from agent.llm_cache import CachedChatModel, LLMResponseCache, ResponseStore
+from bench.fake import FakeChatModel, Script
+
+
+class CountingScript(Script):
+    def __init__(self):
+        super().__init__(response_tokens=8)
+        self.calls = 0
+
+    def reply(self, chain_name, messages):
+        self.calls += 1
+        return super().reply(chain_name, messages)
+
+
+@pytest.fixture
+def model(tmp_path):
+    llm = FakeChatModel(script=CountingScript(), name="ResponseChain")
+    llm.cache = LLMResponseCache(store=ResponseStore(tmp_path / "llm_cache.db"))
+    return CachedChatModel(llm)
+
+
+def _text(chunks) -> str:
+    return "".join(chunk.content for chunk in chunks)
+
+
+def test_stream_with_stop_is_cached(model):
+    first = _text(model.stream("Hello", stop=["\n"]))
+    second = _text(model.stream("Hello", stop=["\n"]))
+
+    assert first == second
+    assert model.script.calls == 1
+
+
+def test_stop_is_part_of_the_key(model):
+    _text(model.stream("Hello", stop=["\n"]))
+    _text(model.stream("Hello"))
+
+    assert model.script.calls == 2
+
+
+def test_astream_with_stop_is_cached(model):
+    async def collect():
+        return _text([chunk async for chunk in model.astream("Hello", stop=["\n"])])
+
+    assert asyncio.run(collect()) == asyncio.run(collect())
+    assert model.script.calls == 1
@@ -0,0 +1,27 @@
+import runpy
+
+import pytest
+
+from agent.chains import CHAINS
+from agent.path import BASE_DIR
+
+LOCALES = sorted(p.name for p in (BASE_DIR / "locale").iterdir() if (p / "const.py").exists())
+
+
+def _const(locale: str) -> dict:
+    return {k: v for k, v in runpy.run_path(str(BASE_DIR / "locale" / locale / "const.py")).items() if k.isupper()}
+
+
+@pytest.mark.parametrize("locale", LOCALES)
+def test_locale_has_every_chain_prompt(locale):
+    prompt_dir = BASE_DIR / "locale" / locale / "prompts"
+
+    assert [c.yaml.name for c in CHAINS.values() if not (prompt_dir / c.yaml.name).exists()] == []
+
+
+@pytest.mark.parametrize("locale", LOCALES)
+def test_locale_has_every_constant(locale):
+    us, other = _const("us"), _const(locale)
+
+    assert sorted(us.keys() - other.keys()) == []
+    assert {k: sorted(v.keys() ^ other[k].keys()) for k, v in us.items() if isinstance(v, dict) and v.keys() != other[k].keys()} == {}
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import agent.plan_cache
+from agent.plan_cache import PlanCache
+
+PLAN = [{"tool": "get_datetime", "message": "what time is it", "depends_on": []}]
+TOOLS = {"get_datetime", "web_search", "thought"}
+
+
+def test_plan_is_reused_for_the_normalized_query():
+    cache = PlanCache()
+    cache.put("What time is it?", PLAN)
+
+    assert cache.get("what  time is it", TOOLS, entities={"person": "Kim"}) == PLAN
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_plan_is_keyed_on_the_entities_the_query_mentions():
+    plan = [{"tool": "web_search", "message": "weather in Seoul", "depends_on": []}]
+    cache = PlanCache()
+    cache.put("Weather in Seoul today?", plan, entities={"location": "Seoul"})
+
+    assert cache.get("Weather in Seoul today?", TOOLS, entities={"location": "Seoul"}) == plan
+    assert cache.get("Weather in Seoul today?", TOOLS, entities={}) is None
+    assert cache.get("Weather in Seoul today?", TOOLS, entities={"location": "Seoul", "hometown": "Seoul"}) is None
+
+
+def test_plan_recalling_an_entity_is_not_stored():
+    plan = [{"tool": "thought", "message": "The user's name is Kim."}]
+    cache = PlanCache()
+    cache.put("What is my name?", plan, entities={"person": "Kim"})
+
+    assert len(cache) == 0
+    assert cache.stats["skipped"] == 1
+
+
+def test_plan_naming_an_unknown_tool_is_evicted():
+    cache = PlanCache()
+    cache.put("What time is it?", PLAN)
+
+    assert cache.get("What time is it?", known_tools=set()) is None
+    assert len(cache) == 0
+
+
+def test_bundle_change_drops_the_cache(monkeypatch):
+    cache = PlanCache()
+    cache.put("What time is it?", PLAN)
+
+    monkeypatch.setattr(agent.plan_cache, "get_locale_bundle", lambda: SimpleNamespace(key="rebuilt"))
+
+    assert cache.get("What time is it?", TOOLS) is None
+    assert cache.stats["invalidations"] == 1
+
+
+def test_cache_is_off_by_default(default_store):
+    from agent.graph import PlanAgent
+
+    assert PlanAgent("plan-cache-default").plan_cache is None
+
+
+def test_agents_share_plans_across_sessions_with_history(default_store):
+    from agent.graph import PlanAgent
+    from agent.runtime import AgentRuntime
+
+    runtime = AgentRuntime(use_plan_cache=True)
+    cache = runtime.plan_cache = PlanCache()
+
+    first = PlanAgent("plan-cache-a", runtime=runtime)
+    first.chat("What time is it?")
+    assert cache.stats["stores"] == 1
+
+    with_history = PlanAgent("plan-cache-b", runtime=runtime)
+    with_history.chat("Hello there")
+    with_history.chat("what time is it")
+    assert cache.stats["exact_hits"] == 1
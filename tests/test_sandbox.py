@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agent.sandbox import SandboxBusy, SandboxPool
+
+
+@pytest.fixture
+def pool():
+    pool = SandboxPool(size=1, max_runs=2, preload=[], max_workers=3, acquire_timeout=5)
+    yield pool
+    pool.close()
+
+
+def test_run_returns_output(pool):
+    assert pool.run("print(6 * 7)", timeout=5) == "42\n"
+
+
+def test_timeout_kills_the_worker(pool):
+    with pytest.raises(TimeoutError):
+        pool.run("while True: pass", timeout=0.3)
+
+    assert pool.stats["killed"] == 1
+    assert pool.run("print('next')", timeout=5) == "next\n"
+
+
+def test_worker_is_recycled_after_max_runs(pool):
+    pids = [pool.run("import os; print(os.getpid())", timeout=5) for _ in range(3)]
+
+    assert pids[0] == pids[1] != pids[2]
+    assert pool.stats["recycled"] == 1
+
+
+def test_module_state_stays_within_its_session(pool):
+    pool.run("import json; json.leftover = 1", timeout=5, session="a")
+
+    assert pool.run("import json; print(hasattr(json, 'leftover'))", timeout=5, session="b") == "False\n"
+    assert pool.run("import json; print(hasattr(json, 'leftover'))", timeout=5, session="a") == "True\n"
+
+
+def test_idle_worker_of_another_session_makes_room():
+    pool = SandboxPool(size=1, preload=[], max_workers=1, acquire_timeout=5)
+    try:
+        first = pool.run("import os; print(os.getpid())", timeout=5, session="a")
+        second = pool.run("import os; print(os.getpid())", timeout=5, session="b")
+
+        assert first != second
+        assert pool.stats["evicted"] == 1
+    finally:
+        pool.close()
+
+
+def test_callers_past_max_workers_wait_then_fail():
+    pool = SandboxPool(size=1, preload=[], max_workers=1, acquire_timeout=0.2)
+    try:
+        busy = threading.Thread(target=pool.run, args=("import time; time.sleep(1)", 5))
+        busy.start()
+        while pool._idle: # Until the thread holds the only worker
+            time.sleep(0.01)
+        with pytest.raises(SandboxBusy):
+            pool.run("print(1)", timeout=5)
+        busy.join()
+
+        assert pool.stats["busy"] == 1
+        assert pool.run("print(1)", timeout=5) == "1\n" # The freed worker is handed out again
+    finally:
+        pool.close()
+
+
+def test_waiting_caller_gets_the_freed_worker():
+    pool = SandboxPool(size=1, preload=[], max_workers=1, acquire_timeout=5)
+    try:
+        async def main():
+            return await asyncio.gather(*(pool.arun(f"print({i})", timeout=5) for i in range(3)))
+
+        assert asyncio.run(main()) == ["0\n", "1\n", "2\n"]
+        assert pool.stats["cold_starts"] == 0
+    finally:
+        pool.close()
@@ -0,0 +1,28 @@
+from agent.scratchpad import Scratchpad
+
+
+def test_text_is_the_lines_joined():
+    buffer = Scratchpad(["input", "attempt 1"])
+    buffer.append("plan")
+
+    assert buffer.text() == "input\nattempt 1\nplan"
+    assert buffer.message().content == buffer.text()
+
+
+def test_message_is_reused_until_the_next_append():
+    buffer = Scratchpad(["input"])
+    message = buffer.message()
+
+    assert buffer.message() is message
+    buffer.append("plan")
+    assert buffer.message() is not message
+    assert message.content == "input"
+
+
+def test_extra_lines_get_their_own_message():
+    buffer = Scratchpad(["input"])
+    base, extra = buffer.messages("step 1 output", "current tool")
+
+    assert base is buffer.message()
+    assert extra.content == "step 1 output\ncurrent tool"
+    assert len(buffer) == 1
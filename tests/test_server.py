@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+
+import agent.server
+from agent.server import SessionPool
+
+
+class _SlowAgent:
+    """Stands in for ``PlanAgent``: takes a while to load its memory and records where it was built."""
+    built = []
+
+    def __init__(self, session_id, runtime=None, **kwargs):
+        time.sleep(0.1)
+        _SlowAgent.built.append((session_id, threading.get_ident()))
+
+
+def test_first_requests_of_a_session_build_one_agent_off_the_loop(monkeypatch):
+    monkeypatch.setattr(agent.server, "PlanAgent", _SlowAgent)
+    _SlowAgent.built = []
+    pool = SessionPool(runtime=None)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        sessions = await asyncio.gather(*(pool.get(s) for s in ("a", "a", "a", "b")))
+        ticking.cancel()
+        return sessions, ticks, threading.get_ident()
+
+    sessions, ticks, loop_thread = asyncio.run(main())
+
+    assert sorted(s for s, _ in _SlowAgent.built) == ["a", "b"]
+    assert all(thread != loop_thread for _, thread in _SlowAgent.built)
+    assert sessions[0] is sessions[1] is sessions[2] is not sessions[3]
+    assert ticks >= 3 # The loop kept running while the agents were built
+    assert not pool._building
+
+
+def test_failed_build_lets_the_next_request_retry(monkeypatch):
+    calls = []
+
+    def flaky_agent(session_id, runtime=None, **kwargs):
+        calls.append(session_id)
+        if len(calls) == 1:
+            raise OSError("store unavailable")
+        return object()
+
+    monkeypatch.setattr(agent.server, "PlanAgent", flaky_agent)
+    pool = SessionPool(runtime=None)
+
+    async def main():
+        return await asyncio.gather(pool.get("a"), pool.get("a"), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+
+    assert isinstance(first, OSError)
+    assert second is pool._sessions["a"]
+    assert calls == ["a", "a"]
@@ -0,0 +1,58 @@
+import yaml
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+
+from agent.memory import Memory
+
+
+def _turn(i: int):
+    return [HumanMessage(f"question {i}"), AIMessage(f"answer {i}")]
+
+
+def _contents(messages):
+    return [m.content for m in messages]
+
+
+def _write_legacy(store, messages):
+    store.legacy_path.write_text(yaml.dump(messages_to_dict(messages), allow_unicode=True), encoding="utf-8")
+    store._has_legacy = True
+
+
+def test_saved_memory_is_loaded_in_order(store):
+    memory = Memory(session_id="s", store=store, is_background=False)
+    memory.extend(_turn(0))
+    memory.save_memory()
+    memory.extend(_turn(1))
+    memory.save_memory()
+    assert memory.flush(5)
+
+    reloaded = Memory(session_id="s", store=store, is_background=False)
+    assert _contents(reloaded.memory) == _contents(_turn(0) + _turn(1))
+
+
+def test_cleared_memory_stays_cleared_after_reload(store):
+    memory = Memory(session_id="s", store=store, is_background=False)
+    memory.extend(_turn(0))
+    memory.save_memory()
+    memory.clear_memory()
+    memory.extend(_turn(1))
+    memory.save_memory()
+    assert memory.flush(5)
+
+    assert _contents(Memory(session_id="s", store=store).memory) == _contents(_turn(1))
+
+
+def test_legacy_history_is_imported_once_into_an_empty_session(store):
+    _write_legacy(store, _turn(0))
+
+    assert _contents(Memory(session_id="first", store=store).memory) == _contents(_turn(0))
+    assert Memory(session_id="second", store=store).memory == []
+    assert not store.legacy_path.exists()
+    assert store.legacy_path.with_name("chat_memory.yaml.migrated").exists()
+
+
+def test_legacy_history_is_not_imported_into_a_session_with_messages(store):
+    store.append("s", _turn(1))
+    _write_legacy(store, _turn(0))
+
+    assert _contents(Memory(session_id="s", store=store).memory) == _contents(_turn(1))
+    assert store.legacy_path.exists()
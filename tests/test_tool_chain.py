@@ -0,0 +1,74 @@
+import pytest
+
+import agent.bundle
+from agent.chains import ToolChain
+from agent.tool_registry import tool_descriptor_index
+
+TOOL = "get_datetime"
+OTHER_TOOL = "web_search"
+
+
+def _system_prompt(chain) -> str:
+    return chain.bound.first.messages[0].content
+
+
+def _edit_tool_prompt(prompt_dir):
+    tool_yaml = prompt_dir / "tool.yaml"
+    tool_yaml.write_text(tool_yaml.read_text(encoding="utf-8").replace("You are the 'Tool' agent.", "You are the edited agent."), encoding="utf-8")
+
+
+@pytest.fixture
+def descriptor():
+    original = tool_descriptor_index[TOOL]
+    yield original
+    tool_descriptor_index[TOOL] = original
+
+
+def test_compiled_chain_is_reused():
+    chain = ToolChain()
+    compiled = chain._compile(TOOL)
+
+    assert chain._cached_chain(TOOL) is compiled
+
+
+def test_descriptor_change_recompiles_only_that_tool(descriptor):
+    chain = ToolChain()
+    chain._compile(TOOL)
+    other = chain._compile(OTHER_TOOL)
+
+    tool_descriptor_index[TOOL] = {**descriptor, "description": "Returns the time on the moon."}
+
+    assert chain._cached_chain(TOOL) is None
+    assert chain._cached_chain(OTHER_TOOL) is other
+    assert "Returns the time on the moon." in _system_prompt(chain._compile(TOOL))
+
+
+def test_invalidate_picks_up_an_edited_prompt(locale_copy):
+    chain = ToolChain()
+    chain._compile(TOOL)
+
+    _edit_tool_prompt(locale_copy)
+    chain.invalidate()
+
+    assert "You are the edited agent." in _system_prompt(chain._cached_chain(TOOL) or chain._compile(TOOL))
+
+
+def test_edited_prompt_is_picked_up_on_the_next_step(locale_copy, monkeypatch):
+    monkeypatch.setattr(agent.bundle, "BUNDLE_CHECK_INTERVAL", 0)
+    chain = ToolChain()
+    chain.invoke(TOOL, {"input": ["What time is it?"]})
+
+    _edit_tool_prompt(locale_copy)
+    chain.invoke(TOOL, {"input": ["What time is it?"]})
+
+    assert "You are the edited agent." in _system_prompt(chain._cached_chain(TOOL))
+
+
+def test_invoke_uses_the_current_descriptor(descriptor):
+    chain = ToolChain()
+    chain.invoke(TOOL, {"input": ["What time is it?"]})
+
+    tool_descriptor_index[TOOL] = {**descriptor, "description": "Returns the time on the moon."}
+    chain.invoke(TOOL, {"input": ["What time is it?"]})
+
+    assert "Returns the time on the moon." in _system_prompt(chain._cached_chain(TOOL))
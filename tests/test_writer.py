@@ -0,0 +1,91 @@
+import sqlite3
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.memory import Memory
+
+
+def _turn(i: int):
+    return [HumanMessage(f"question {i}"), AIMessage(f"answer {i}")]
+
+
+def _contents(messages):
+    return [m.content for m in messages]
+
+
+def _fail_writes(store, monkeypatch, times: int):
+    write = store.write
+    calls = []
+
+    def failing_write(ops):
+        calls.append(ops)
+        if len(calls) <= times:
+            raise sqlite3.OperationalError("database is locked")
+        write(ops)
+
+    monkeypatch.setattr(store, "write", failing_write)
+    return calls
+
+
+def test_writes_are_applied_in_submit_order(store):
+    writer = store.writer()
+    for i in range(5):
+        writer.submit("s", _turn(i))
+
+    assert writer.flush(5)
+    messages, _ = store.page("s", limit=100)
+    assert _contents(messages) == _contents([m for i in range(5) for m in _turn(i)])
+
+
+def test_clear_only_drops_what_was_submitted_before_it(store):
+    writer = store.writer()
+    writer.submit("s", _turn(0))
+    writer.submit("s", [], is_clear=True)
+    writer.submit("s", _turn(1))
+    writer.submit("other", _turn(2))
+
+    assert writer.flush(5)
+    assert _contents(store.page("s")[0]) == _contents(_turn(1))
+    assert _contents(store.page("other")[0]) == _contents(_turn(2))
+
+
+def test_flush_waits_for_batches_submitted_during_a_write(store):
+    writer = store.writer()
+    writer.batch_delay = 0.02
+    writer.submit("s", _turn(0))
+    writer.flush(5)
+    writer.submit("s", _turn(1))
+
+    assert writer.flush(5)
+    assert store.count("s") == 4
+
+
+def test_failed_batch_is_reported_and_retried(store, monkeypatch):
+    calls = _fail_writes(store, monkeypatch, times=1)
+    writer = store.writer()
+    writer.retry_delay = 0.2
+    writer.submit("s", _turn(0))
+
+    assert not writer.flush(5)
+    assert isinstance(writer.error, sqlite3.OperationalError)
+    writer.submit("s", _turn(1))
+
+    assert writer.flush(5) # Waits for the retry
+
+    assert writer.error is None
+    assert len(calls) == 2
+    assert _contents(store.page("s")[0]) == _contents(_turn(0) + _turn(1))
+
+
+def test_memory_reports_a_failing_save(store, monkeypatch):
+    _fail_writes(store, monkeypatch, times=1)
+    store.writer().retry_delay = 0.2
+    memory = Memory(session_id="s", store=store, is_background=False)
+    memory.extend(_turn(0))
+    memory.save_memory()
+
+    assert not memory.flush(5)
+    memory.extend(_turn(1))
+    assert "database is locked" in memory.save_memory()
+    assert memory.flush(5)
+    assert _contents(Memory(session_id="s", store=store).memory) == _contents(_turn(0) + _turn(1))